@@ -22,46 +22,55 @@ v.3 - Removed oltUp variable as it was causing issues with OLT boundaries with l
 '''
 
 def clear_scratch():
-    # add something to skip deleting these and transferring fcs in the fcs are already present (speeds up process)
-
-    arcpy.env.workspace = scratch
-    fc_list = arcpy.ListFeatureClasses()
-    fc_tables = arcpy.ListTables()
-    for fc in fc_list:
-        arcpy.Delete_management(fc)
-    for table in fc_tables:
-        arcpy.Delete_management(table)
+    # clear scratch, cached clarity fcs are kept so transfer_fcs() can skip them (see scratchCache.py)
+    clearScratch(scratch)
 
 def transfer_fcs():
-    # transfer clarity fcs to a scratch gdb
-    arcpy.env.workspace = input_gdb
-    for fc in clarity_features:
-        arcpy.FeatureClassToGeodatabase_conversion(fc, scratch)
+    # transfer clarity fcs to a scratch gdb, only the ones that are missing or changed in input_gdb get copied
+    syncScratch(scratch, [os.path.join(input_gdb, fc) for fc in clarity_features])
 
 
 # Need to add code here that will remove all features that reside in a DNB polygon.
 # Could either do it once a user selects the OLT boundary they want a BOM for (below the get_olt_features function), or just do it for the whole GDB first
 
-def get_olt_features(olt):
+def get_olt_features(olt, source=None):
     '''
     Transfer necessary fcs to a scratch.gdb workspace, then ingest an OLT string, pull all features contained within that OLT from parent Clarity GDB.
+    :param olt: OLT name
+    :param source: gdb holding the transferred clarity fcs, defaults to scratch. Outputs always go to scratch.
     :return:
     Create fiber (aerial and ug), strand/conduit, scs, peds, vaults, slackloops, and anchors fcs for use in below functions
     '''
 
     # get olt, pull just boundary
     arcpy.env.workspace = scratch
+    src = lambda fc: os.path.join(source or scratch, fc)
     olt_exp = "name = '{}'".format(olt)
-    arcpy.Select_analysis('OLT_Boundaries', 'olt', olt_exp)
+    arcpy.Select_analysis(src('OLT_Boundaries'), 'olt', olt_exp)
 
     # pull features within olt boundary
-    arcpy.Intersect_analysis(['FiberCable', 'olt'], 'olt_fiber', '', '', 'LINE')
-    arcpy.Intersect_analysis(['conduit', 'olt'], 'olt_conduit', '', '', 'LINE')
-    arcpy.Intersect_analysis(['Strand', 'olt'], 'olt_strand', '', '', 'LINE')
-    arcpy.SpatialJoin_analysis('Anchors', 'olt', 'olt_anchors', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
-    arcpy.SpatialJoin_analysis('Structures', 'olt', 'olt_structures', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
-    arcpy.SpatialJoin_analysis('SpliceClosure', 'olt', 'olt_scs', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
-    arcpy.SpatialJoin_analysis('Slackloops', 'olt', 'olt_slackloops', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
+    arcpy.Intersect_analysis([src('FiberCable'), 'olt'], 'olt_fiber', '', '', 'LINE')
+    arcpy.Intersect_analysis([src('conduit'), 'olt'], 'olt_conduit', '', '', 'LINE')
+    arcpy.Intersect_analysis([src('Strand'), 'olt'], 'olt_strand', '', '', 'LINE')
+    arcpy.SpatialJoin_analysis(src('Anchors'), 'olt', 'olt_anchors', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
+    arcpy.SpatialJoin_analysis(src('Structures'), 'olt', 'olt_structures', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
+    arcpy.SpatialJoin_analysis(src('SpliceClosure'), 'olt', 'olt_scs', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
+    arcpy.SpatialJoin_analysis(src('Slackloops'), 'olt', 'olt_slackloops', 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'COMPLETELY_WITHIN')
+
+def read_olt_tables():
+    '''
+    Dissolve the OLT's fiber once on the fields the fiber rules filter on and read it into memory, fiber() and strand_conduit()
+    then sum their footages from that table (bomRules.json) instead of a Select/Dissolve/AddGeometryAttributes per footage.
+    :return:
+    Sets olt_tables, {layer: DataFrame}
+    '''
+    global olt_tables
+    fields = ['subtypecode', 'fiber_built', 'strand_built']
+    dissolved = scratch + '\\' + 'olt_fiber_Dissolve'
+    arcpy.Dissolve_management(scratch + '\\' + 'olt_fiber', dissolved, fields)
+    arcpy.AddGeometryAttributes_management(dissolved, 'LENGTH_GEODESIC', 'FEET_US')
+    rows = [row for row in arcpy.da.SearchCursor(dissolved, fields + ['LENGTH_GEO'])]
+    olt_tables = {'olt_fiber': pd.DataFrame(rows, columns=fields + ['LENGTH_GEO'])}
 
 def fiber():
     '''
@@ -69,71 +78,18 @@ def fiber():
     :return:
     Write footage to template.
     '''
-
-    # UG
-    exp = "subtypecode = 1 AND fiber_built = 'N'"
-    ugFiber = scratch + '\\' + 'ug_fiber'
-    arcpy.Select_analysis(scratch + '\\' + 'olt_fiber', ugFiber, exp)
-    values = [row[0] for row in arcpy.da.SearchCursor(ugFiber, ['subtypecode'])]
-    if not values:
-        ws['B2'] = 0
-    else:
-        length = 0
-        arcpy.Dissolve_management(ugFiber, scratch + '\\' + 'ugFiber_Dissolve', 'subtypecode', )
-        arcpy.AddGeometryAttributes_management(scratch + '\\' + 'ugFiber_Dissolve', 'LENGTH_GEODESIC', 'FEET_US')
-        sum_length = [length + row[0] for row in arcpy.da.SearchCursor(scratch + '\\' + 'ugFiber_Dissolve', ['LENGTH_GEO'])]
-        ws['B2'] = sum_length[0]
-
-    # Aerial
-    exp = "subtypecode = 2 AND fiber_built = 'N'"
-    aerialFiber = scratch + '\\' + 'aerial_fiber'
-    arcpy.Select_analysis(scratch + '\\' + 'olt_fiber', aerialFiber, exp)
-    values = [row[0] for row in arcpy.da.SearchCursor(aerialFiber, ['subtypecode'])]
-    if not values:
-        ws['B3'] = 0
-    else:
-        length = 0
-        arcpy.Dissolve_management(aerialFiber, scratch + '\\' + 'Aerial_Dissolve', 'subtypecode', )
-        arcpy.AddGeometryAttributes_management(scratch + '\\' + 'Aerial_Dissolve', 'LENGTH_GEODESIC', 'FEET_US')
-        sum_length = [length + row[0] for row in arcpy.da.SearchCursor(scratch + '\\' + 'Aerial_Dissolve', ['LENGTH_GEO'])]
-        ws['B3'] = sum_length[0]
+    for cell, value in evaluateRules(rules, olt_tables, section='fiber').items():
+        ws[cell] = value
 
 def strand_conduit():
     '''
     Calculate footage for strand and conduit in requirement #2. Calculations are identical.
+    Strand is aerial fiber where strand_built = 'N', conduit is UG fiber where strand_built = 'N'.
     :return:
     Write footage to template
     '''
-
-    # Strand, calculated from fiber field where strand_built = 'N'
-    exp = "subtypecode = 2 AND strand_built = 'N'"
-    strandFiber = scratch + '\\' + 'strandFiber'
-    arcpy.Select_analysis(scratch + '\\' + 'olt_fiber', strandFiber, exp)
-    values = [row[0] for row in arcpy.da.SearchCursor(strandFiber, ['subtypecode'])]
-    if not values:
-        lenStrand = 0
-    else:
-        length = 0
-        arcpy.Dissolve_management(strandFiber, scratch + '\\' + 'strandFiber_Dissolve', 'subtypecode', )
-        arcpy.AddGeometryAttributes_management(scratch + '\\' + 'strandFiber_Dissolve', 'LENGTH_GEODESIC', 'FEET_US')
-        sum_length = [length + row[0] for row in arcpy.da.SearchCursor(scratch + '\\' + 'strandFiber_Dissolve', ['LENGTH_GEO'])]
-        lenStrand = sum_length[0]
-
-    # Conduit, calculate from ugFiber where strand_built = 'N'
-    exp = "subtypecode = 1 AND strand_built = 'N'"
-    strandConduit = scratch + '\\' + 'strandConduit'
-    arcpy.Select_analysis(scratch + '\\' + 'olt_fiber', strandConduit, exp)
-    values = [row[0] for row in arcpy.da.SearchCursor(strandConduit, ['subtypecode'])]
-    if not values:
-        lenConduit = 0
-    else:
-        length = 0
-        arcpy.Dissolve_management(strandConduit, scratch + '\\' + 'strandConduit_Dissolve', 'subtypecode', )
-        arcpy.AddGeometryAttributes_management(scratch + '\\' + 'strandConduit_Dissolve', 'LENGTH_GEODESIC', 'FEET_US')
-        sum_length = [length + row[0] for row in arcpy.da.SearchCursor(scratch + '\\' + 'strandConduit_Dissolve', ['LENGTH_GEO'])]
-        lenConduit = sum_length[0]
-
-    ws['B4'] = lenStrand + lenConduit
+    for cell, value in evaluateRules(rules, olt_tables, section='strand_conduit').items():
+        ws[cell] = value
 
 def naps():
     '''
@@ -181,8 +137,63 @@ def slack_anchors():
     ws['B8'] = slackCount[0]
     ws['B9'] = anchorCount[0]
 
-def main(input_olts):
+def run_olt(olt, source):
+    '''
+    Worker for main() with workers > 1. Runs get_olt_features -> slack_anchors for one OLT in a temporary scratch gdb of its own,
+    so workers never share output names, and records the cells instead of writing a workbook.
+    :param olt: OLT name
+    :param source: scratch gdb holding the transferred clarity fcs, only read from
+    :return:
+    (olt, {cell: value}) for the parent to write to the template
+    '''
+    global scratch, ws
+    workspace = tempfile.mkdtemp(prefix='clarity_')
+    try:
+        scratch = os.path.join(workspace, 'scratch.gdb')
+        arcpy.CreateFileGDB_management(workspace, 'scratch.gdb')
+        arcpy.env.overwriteOutput = True
+        ws = {}
+        print('Creating BOM for OLT: ' + olt + '\n')
+        get_olt_features(olt, source)
+        read_olt_tables()
+        fiber()
+        strand_conduit()
+        naps()
+        peds_vaults()
+        slack_anchors()
+        arcpy.ClearWorkspaceCache_management()
+        return olt, ws
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def main(input_olts, workers=1):
+    '''
+    Writes a BOM workbook per OLT to output.
+    :param input_olts: comma separated OLT names
+    :param workers: processes, one OLT each. 1 runs the OLTs one after another in this process
+    :return: None
+    '''
+    global wb, ws
+    wb, ws = load_template()
+    make_scratch()
     olts = input_olts.replace(' ', '').split(',')
+    workers = min(workers, len(olts), os.cpu_count() or 1)
+    if workers > 1:
+        # transfer once to the shared scratch, then one process per OLT reading from it
+        print('Prepping Workspace...\n')
+        clear_scratch()
+        transfer_fcs()
+        pool = multiprocessing.Pool(workers)
+        try:
+            for olt, cells in pool.imap_unordered(partial(run_olt, source=scratch), olts):
+                for cell, value in cells.items():
+                    ws[cell] = value
+                fn = output + "\\{0}_BOM_{1}.xlsx".format(olt, str(time.strftime("%Y%m%d")))
+                wb.save(fn)
+        finally:
+            pool.close()
+            pool.join()
+        return
     for olt in olts:
         print('Prepping Workspace...\n')
         clear_scratch()
@@ -190,6 +201,7 @@ def main(input_olts):
         print('\n')
         print('Creating BOM for OLT: ' + olt + '\n')
         get_olt_features(olt)
+        read_olt_tables()
         fiber()
         strand_conduit()
         naps()
@@ -199,7 +211,9 @@ def main(input_olts):
         wb.save(fn)
 
 if __name__ == '__main__':
-    # Created simple gui application for user ease of use. Initialized in config.py.
+    multiprocessing.freeze_support()
+    # Created simple gui application for user ease of use. Layout in config.py.
+    window = make_window()
     while True:
         try:
             event, values = window.Read()
@@ -208,7 +222,7 @@ if __name__ == '__main__':
             input_gdb = values[0]
             output = values[1]
             olts = values[2]
-            main(olts)
+            main(olts, workers=bomWorkers)
             sg.Popup('BOM(s) created.')
         except Exception as e:
             exc_type, exc_obj, exc_tb = sys.exc_info()
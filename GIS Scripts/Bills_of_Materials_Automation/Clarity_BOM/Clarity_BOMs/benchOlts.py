@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+import multiprocessing
+from openpyxl import load_workbook
+import Clarity_BOM_v3 as bom
+'''
+Script - benchOlts
+
+Description:
+    Measures the multi OLT speedup of Clarity_BOM_v3.main(): the same OLTs from a Clarity gdb run with 1 worker (one OLT after
+    another, the original path) and then with each count in --workers, timing each run.
+    Every run writes its workbooks to a folder of its own, and the BOM cells (B2:B9) of every OLT have to match the 1 worker
+    run. The script exits 1 if any differ.
+    Needs ArcGIS, run it from the Clarity_BOMs folder so the template is found.
+
+Usage:
+    python benchOlts.py --gdb C:\\path\\Clarity.gdb --olts OLT1,OLT2,OLT3,OLT4 [--workers 2,4,8]
+'''
+CELLS = ['B{}'.format(row) for row in range(2, 10)]
+
+def run(gdb, olts, workers):
+    '''
+    :return: (seconds, {olt: [cell values]})
+    '''
+    bom.input_gdb = gdb
+    bom.output = tempfile.mkdtemp(prefix='clarity_bench_')
+    start = time.time()
+    bom.main(olts, workers=workers)
+    elapsed = time.time() - start
+    cells = {}
+    for name in os.listdir(bom.output):
+        sheet = load_workbook(os.path.join(bom.output, name))['Sheet1']
+        cells[name.split('_BOM_')[0]] = [sheet[cell].value for cell in CELLS]
+    return elapsed, cells
+
+def main(gdb, olts, workerCounts):
+    serialTime, serial = run(gdb, olts, 1)
+    print('{:<12}{:9.1f} s'.format('1 worker', serialTime))
+    bad = 0
+    for workers in workerCounts:
+        elapsed, cells = run(gdb, olts, workers)
+        differ = [olt for olt in set(serial) | set(cells) if serial.get(olt) != cells.get(olt)]
+        bad += len(differ)
+        print('{:<12}{:9.1f} s  ({:.1f}x)  {} OLTs differ {}'.format('{} workers'.format(workers), elapsed,
+                                                                   serialTime / max(elapsed, 1e-9), len(differ), ', '.join(sorted(differ))))
+    return 1 if bad else 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gdb', required=True)
+    parser.add_argument('--olts', required=True, help='comma separated OLT names')
+    parser.add_argument('--workers', default='2,4,8')
+    args = parser.parse_args()
+    sys.exit(main(args.gdb, args.olts, [int(n) for n in args.workers.split(',') if n]))
@@ -2,10 +2,19 @@ import os
 from os import path
 import arcpy
 import getpass
+import time
+import sys
+import shutil
+import tempfile
+import multiprocessing
+import pandas as pd
+from functools import partial
 from openpyxl import load_workbook
 from pathlib import Path
 import PySimpleGUI as sg
 from site import addsitedir
+from scratchCache import *
+from bomRules import loadRules, evaluateRules
 from sys import executable
 
 
@@ -20,11 +29,16 @@ cur_dir = os.path.join(os.path.dirname('__file__'))
 # List of clarity features
 clarity_features = ['Anchors', 'FiberCable', 'conduit', 'OLT_Boundaries', 'Structures', 'SpliceClosure', 'Slackloops', 'Strand']
 
+# Cell rules for the fiber footages (bomRules.py)
+rules = loadRules(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bomRules.json'))
+
 # Workbook vars
 cwd = os.getcwd()
 template = os.path.join(cwd + '\\template', 'Clarity_BOM_Template.xlsx')
-wb = load_workbook(filename=template)
-ws = wb['Sheet1']
+
+# Processes for a multi OLT run, one OLT per process. Each runs its own geoprocessing, so more than a few mostly
+# contend for disk and licenses
+bomWorkers = 4
 
 # sg initialization
 interpreter = executable
@@ -32,19 +46,34 @@ path_to_interpreter = path.dirname(interpreter)
 sitepkg = path_to_interpreter + "\\site-packages"
 addsitedir(sitepkg)
 
-gui = [[sg.Text('Input GDB', size=(20, 1)), sg.InputText(size=(70, 1)), sg.FolderBrowse()],
-       [sg.Text('BOM Output Location:', size=(20, 1)), sg.InputText(size=(70, 1)), sg.FolderBrowse()],
-       [sg.Text('OLT(s) Comma Separated:', size=(20, 1)), sg.InputText(size=(70, 1))],
-       [sg.Submit(), sg.Exit()]]
+scratch = os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb')
 
-window = sg.Window('Clarity BOM (Simplified)').Layout(gui)
+# The template, the window and scratch.gdb are set up by the functions below, not at import. Worker processes
+# re-import this config and shouldn't load the workbook, build a window or touch scratch.gdb.
+def load_template():
+    '''
+    Loads the BOM template.
+    :return: (workbook, Sheet1)
+    '''
+    wb = load_workbook(filename=template)
+    return wb, wb['Sheet1']
 
-# check if scratch.gdb exists on users machine, if not make one.
-scratchExists = os.path.exists(os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb'))
-if scratchExists == False:
-    arcpy.CreateFileGDB_management(os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS'), 'scratch.gdb')
-else:
-    pass
-scratch = os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb')
+def make_window():
+    '''
+    Builds the input window.
+    :return: sg.Window
+    '''
+    gui = [[sg.Text('Input GDB', size=(20, 1)), sg.InputText(size=(70, 1)), sg.FolderBrowse()],
+           [sg.Text('BOM Output Location:', size=(20, 1)), sg.InputText(size=(70, 1)), sg.FolderBrowse()],
+           [sg.Text('OLT(s) Comma Separated:', size=(20, 1)), sg.InputText(size=(70, 1))],
+           [sg.Submit(), sg.Exit()]]
+    return sg.Window('Clarity BOM (Simplified)').Layout(gui)
+
+def make_scratch():
+    '''
+    Check if scratch.gdb exists on users machine, if not make one.
+    '''
+    if not os.path.exists(scratch):
+        arcpy.CreateFileGDB_management(os.path.dirname(scratch), 'scratch.gdb')
 
 
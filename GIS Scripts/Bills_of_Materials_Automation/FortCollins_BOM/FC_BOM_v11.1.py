@@ -15,6 +15,7 @@ v11 - Fixed an issue with a SplicePoint query that did not select features whose
 v11.1 - Added a line (164) to encode (utf-8) FDH strings as users were getting encoding errors. - cluttrell
 '''
 import time, os, sys, math, traceback, getpass
+import numpy as np
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import PatternFill, Font
 import PySimpleGUI27 as sg
@@ -31,14 +32,15 @@ sitepkg = path_to_interpreter + "\\site-packages"
 addsitedir(sitepkg)
 
 import arcpy
+from fc_engine import line_points, gapped_lines, trench_engine, feet_to_units
+from fc_cells import fiber_fields, con_fields, sc_fields, vault_fields, column_converter, bom_cells
 
-fiber_fields = ["fdhid", "cablename", "fibercount", "fdhcable", "length_geo"]
-con_fields = ["fdhid", "layer", "diameter", "mid_id", "length_geo", "shared", 'installmethod']
-sc_fields = ["fdhid", "locationdescription", "splice_type", "fcount", "splice_count", "fiber_assignments", "sc_size"]
-vault_fields = ["fdhid", "layer", "structure_type", "pvault", 'interconnect']
 trench_fields = ["fdhid", "length_geo"]
 loop_fields = ["fdhid", "designid", "p_hierarchy", "cablecapacity", "measuredlength"]
 
+# {(input gdb path, mtime): {domain name: {code: description}}}, see coded_domains()
+domain_cache = {}
+
 layout = [[sg.Text('Fill in the fields below', size=(45, 1))],
           [sg.Text('Input GDB:', size=(20, 1)), sg.InputText(size=(70, 1)), sg.FolderBrowse()],
           [sg.Text('Output Location:', size=(20, 1)), sg.InputText(size=(70, 1)), sg.FolderBrowse()],
@@ -67,6 +69,10 @@ def get_end_points(x, y, location):
     """
     This function is used to get the end points of the fibercable and then
     create a new feature class with all those points.
+    Vertices are read in one pass, the points are worked out by line_points() and written in one call.
+    Attributes of the lines are joined back on the source objectid (src_oid).
+    For MID, multipart lines with a gap between parts are read again as geometries to find their parts, so the
+    mid-point is measured along the parts only, same as positionAlongLine(0.50, True).
     PARAMETERS
     ----------
     x : feature class(complete path)
@@ -78,51 +84,59 @@ def get_end_points(x, y, location):
         'BOTH_ENDS' : If you need both the end points of a line, you can use this option
         'MID' : If you need just the mid-point of a line, you can use this option
     """
-
-    fiber = []
-    fieldnames = [field.name for field in arcpy.ListFields(x) if field.name not in ["shape_Length"]]
-    fieldnames.append("SHAPE@")
-    with arcpy.da.SearchCursor(x, fieldnames) as cur:
-        for row in cur:
-            temp = list(row)
-            fiber.append(temp)
-
-    cur_gdb, fc = os.path.split(y)
-    arcpy.CreateFeatureclass_management(cur_gdb, fc, "POINT", x, "", "", x)
-
-    insert_cursor = arcpy.da.InsertCursor(y, fieldnames)
-    index = 0
-    arrayObj = arcpy.Array()
-    for row in fiber:
-        if location == "BOTH_ENDS":
-            pntObj = arcpy.Point()
-            pntObj.ID = index
-            pntObj.X = row[-1].firstPoint.X
-            pntObj.Y = row[-1].firstPoint.Y
-            index += 1
-            temp = row[:]
-            temp[-1] = pntObj
-            insert_cursor.insertRow(temp)
-
-            pntObj = arcpy.Point()
-            pntObj.ID = index
-            pntObj.X = row[-1].lastPoint.X
-            pntObj.Y = row[-1].lastPoint.Y
-            index += 1
-            temp = row[:]
-            temp[-1] = pntObj
-            insert_cursor.insertRow(temp)
-        elif location == "MID":
-            pntObj = arcpy.Point()
-            pntObj.ID = index
-            pntObj.X = row[-1].positionAlongLine(0.50, True).firstPoint.X
-            pntObj.Y = row[-1].positionAlongLine(0.50, True).firstPoint.Y
-            index += 1
-            temp = row[:]
-            temp[-1] = pntObj
-            insert_cursor.insertRow(temp)
-
-    del insert_cursor
+    desc = arcpy.Describe(x)
+    vertices = arcpy.da.FeatureClassToNumPyArray(x, ["OID@", "SHAPE@X", "SHAPE@Y", "SHAPE@LENGTH"], explode_to_points=True)
+    parts = None
+    if location == "MID":
+        gapped = gapped_lines(vertices["OID@"], vertices["SHAPE@X"], vertices["SHAPE@Y"], vertices["SHAPE@LENGTH"])
+        if gapped:
+            parts = vertex_parts(x, desc.OIDFieldName, vertices["OID@"], gapped)
+    oids, xs, ys = line_points(vertices["OID@"], vertices["SHAPE@X"], vertices["SHAPE@Y"], location, parts)
+
+    points = np.empty(len(oids), dtype=[("src_oid", "<i4"), ("XY", "<f8", 2)])
+    points["src_oid"] = oids
+    points["XY"] = np.column_stack([xs, ys]) if len(oids) else np.empty((0, 2))
+    if arcpy.Exists(y):
+        arcpy.Delete_management(y)
+    arcpy.da.NumPyArrayToFeatureClass(points, y, ["XY"], desc.spatialReference)
+
+    fieldnames = [field.name for field in arcpy.ListFields(x) if field.type not in ["OID", "Geometry"] and
+                  field.name.lower() not in ["shape_length", "shape_area"]]
+    if fieldnames:
+        arcpy.JoinField_management(y, "src_oid", x, desc.OIDFieldName, fieldnames)
+
+
+def vertex_parts(x, oid_field, vertex_oids, oids, batch=1000):
+    """
+    This function gives the part index of every vertex, read from the geometries of the lines in oids.
+    Vertices of the other lines are all part 0.
+    PARAMETERS
+    ----------
+    x : feature class(complete path)
+    oid_field : string
+        objectid field of x
+    vertex_oids : numpy array
+        objectid of every vertex, as read with explode_to_points
+    oids : list
+        lines to read parts for
+    RETURNS
+    -------
+    numpy array of part indexes, one per vertex
+    """
+    counts = {}
+    for i in range(0, len(oids), batch):
+        where = "{0} IN ({1})".format(arcpy.AddFieldDelimiters(x, oid_field), ",".join(str(o) for o in oids[i:i + batch]))
+        with arcpy.da.SearchCursor(x, ["OID@", "SHAPE@"], where) as cursor:
+            for oid, shape in cursor:
+                counts[oid] = [part.count for part in shape]
+    parts = np.zeros(len(vertex_oids), dtype="<i4")
+    starts = np.flatnonzero(np.r_[True, vertex_oids[1:] != vertex_oids[:-1]])
+    for start in starts:
+        oid = vertex_oids[start]
+        if oid in counts:
+            sizes = counts[oid]
+            parts[start:start + sum(sizes)] = np.repeat(np.arange(len(sizes)), sizes)
+    return parts
 
 
 def prep_data(fdhs):
@@ -255,34 +269,39 @@ def prep_data(fdhs):
 
     arcpy.AddGeometryAttributes_management(scratch + "\\final_fiber", "LENGTH_GEODESIC", "FEET_US", "", crs)
 
-    arcpy.Select_analysis(scratch + "\\StructureLine", scratch + "\\all_con",
-                          "diameter = '2inch' or diameter = '1.25inch'")
-    arcpy.AddField_management(scratch + "\\all_con", "shared", "TEXT")
-    arcpy.CalculateField_management(scratch + "\\all_con", "shared", "'N'", "PYTHON_9.3", "")
-    arcpy.SplitLine_management(scratch + "\\all_con", scratch + "\\con_split")
-    get_end_points(scratch + "\\con_split", scratch + "\\con_mids", "MID")
-    arcpy.AddField_management(scratch + "\\con_mids", "trench", "SHORT")
-    arcpy.CalculateField_management(scratch + "\\con_mids", "trench", "1", "PYTHON_9.3", "")
-    arcpy.Buffer_analysis(scratch + "\\con_mids", scratch + "\\con_mid_buff", "1.5 FEET", "FULL", "ROUND")
-    arcpy.Dissolve_management(scratch + "\\con_mid_buff", scratch + "\\con_mid_diss", "", "", "SINGLE_PART", "")
-    arcpy.AddField_management(scratch + "\\con_mid_diss", "mid_id", "LONG")
-    arcpy.CalculateField_management(scratch + "\\con_mid_diss", "mid_id", "!objectid!", "PYTHON_9.3", "")
-    arcpy.SpatialJoin_analysis(scratch + "\\con_mid_buff", scratch + "\\con_mid_diss", scratch + "\\con_join_temp",
-                               "JOIN_ONE_TO_ONE", "KEEP_ALL", "", "INTERSECT", "")
-    arcpy.Dissolve_management(scratch + "\\con_join_temp", scratch + "\\con_mid_diss_temp", ["mid_id"],
-                              [["trench", "SUM"]], "SINGLE_PART", "")
-    arcpy.AlterField_management(scratch + "\\con_mid_diss_temp", "SUM_trench", "trench", "trench")
-    arcpy.SpatialJoin_analysis(scratch + "\\con_split", scratch + "\\con_mid_diss_temp", scratch + "\\con_join",
-                               "JOIN_ONE_TO_ONE", "KEEP_ALL", "", "INTERSECT", "")
-
-    arcpy.Select_analysis(scratch + "\\con_join", scratch + "\\con2", "diameter = '2inch'")
-    arcpy.Select_analysis(scratch + "\\con_join", scratch + "\\con125", "diameter = '1.25inch'")
-    arcpy.Buffer_analysis(scratch + "\\con2", scratch + "\\con2_buff", "2 FEET", "FULL", "ROUND", "ALL")
-    arcpy.MakeFeatureLayer_management(scratch + "\\con125", "con125")
-    arcpy.SelectLayerByLocation_management("con125", "WITHIN", scratch + "\\con2_buff", "", "NEW_SELECTION")
-    arcpy.CalculateField_management("con125", "shared", "'Y'", "PYTHON_9.3", "")
-    arcpy.SelectLayerByAttribute_management("con125", "CLEAR_SELECTION")
-    arcpy.Merge_management([scratch + "\\con2", "con125"], scratch + "\\final_con")
+    # Split the 2" and 1.25" conduit at its vertices, find the trench groups and shared 1.25" in memory,
+    # and write final_con (2" first, then 1.25") in one pass
+    con_fc = scratch + "\\StructureLine"
+    con_names = [field.name for field in arcpy.ListFields(con_fc) if field.type not in ["OID", "Geometry"] and
+                 field.name.lower() not in ["shape_length", "shape_area", "shared", "mid_id", "trench"]]
+    diameter = con_names.index("diameter")
+    segments = []
+    with arcpy.da.SearchCursor(con_fc, con_names + ["SHAPE@"], "diameter = '2inch' or diameter = '1.25inch'") as cur:
+        for row in cur:
+            if row[-1] is None:
+                continue
+            for part in row[-1]:
+                pts = [(pnt.X, pnt.Y) for pnt in part if pnt]
+                segments.extend((row[:-1], a, b) for a, b in zip(pts[:-1], pts[1:]) if a != b)
+    # the engine works in feet, the 1.5 FEET / 2 FEET of the old Buffer calls, whatever the conduit's coordinate units
+    sr = arcpy.Describe(con_fc).spatialReference
+    lat = sum(a[1] + b[1] for attrs, a, b in segments) / (2. * len(segments)) if segments else 0.
+    x_scale, y_scale = feet_to_units(sr, lat)
+    groups = trench_engine([(attrs[diameter], (a[0] / x_scale, a[1] / y_scale), (b[0] / x_scale, b[1] / y_scale))
+                            for attrs, a, b in segments])
+
+    arcpy.CreateFeatureclass_management(scratch, "final_con", "POLYLINE", con_fc, "", "", sr)
+    existing = [field.name for field in arcpy.ListFields(scratch + "\\final_con")]
+    for name, field_type in [("shared", "TEXT"), ("mid_id", "LONG"), ("trench", "SHORT")]:
+        if name not in existing:
+            arcpy.AddField_management(scratch + "\\final_con", name, field_type)
+    order = sorted(range(len(segments)), key=lambda k: segments[k][0][diameter] != "2inch")
+    with arcpy.da.InsertCursor(scratch + "\\final_con", con_names + ["shared", "mid_id", "trench", "SHAPE@"]) as cur:
+        for k in order:
+            attrs, a, b = segments[k]
+            mid_id, trench, shared = groups[k]
+            cur.insertRow(list(attrs) + [shared, mid_id, trench,
+                                         arcpy.Polyline(arcpy.Array([arcpy.Point(*a), arcpy.Point(*b)]), sr)])
     arcpy.AddGeometryAttributes_management(scratch + "\\final_con", "LENGTH_GEODESIC", "FEET_US", "", crs)
 
     arcpy.Dissolve_management(scratch + "\\final_con", scratch + "\\trench", ["fdhid"])
@@ -291,65 +310,75 @@ def prep_data(fdhs):
     print("DATA FILTERATION DONE..")
 
 
-def read_data(fdh):
+def gdb_mtime(gdb_path):
+    """
+    Latest modified time of the files in a file GDB, .lock files left out (ArcGIS touches them just by reading).
+    """
+    mtimes = [os.path.getmtime(os.path.join(folder, name)) for folder, dirs, names in os.walk(gdb_path)
+              for name in names if not name.endswith('.lock')]
+    return max(mtimes or [0])
+
+
+def coded_domains(gdb_path):
+    """
+    Coded value domains of the input GDB as {domain name: {code: description}}. The scratch copies carry the
+    input GDB's domains, so they are read from the input GDB and kept in domain_cache under its path and mtime.
+    A later run from the GUI against the same, unchanged GDB reuses them, a different or edited GDB is read again.
+    """
+    key = (os.path.normpath(gdb_path), gdb_mtime(gdb_path))
+    if key not in domain_cache:
+        domain_cache.clear()
+        domain_cache[key] = dict((d.name, d.codedValues) for d in arcpy.da.ListDomains(gdb_path)
+                                 if d.domainType == 'CodedValue')
+    return domain_cache[key]
+
+
+def read_data(fdhs, chunk_size=50):
     """
     Read all the data from all the final feature classes that are created from the
     data preparation part.
-    This function is called for each individual FDH Boundary at a time as opposed
-    to the data preparation part which is done for all the FDH Boundaries at a time
-    (Explanation for the lines 235 - 243)
-    Using Search Cursor, we iterate through all the features of a feature class
-    corresponding to a particular FDH.
+    FDHs are read in chunks of chunk_size. Each final feature class is scanned once per chunk
+    with a fdhid IN (...) query and its rows are partitioned by fdhid, so N FDHs cost
+    5 * N / chunk_size scans instead of 5 * N, and only one chunk of rows is held in memory
+    at a time, even when the FDH list covers a whole market.
     Any of the field value which is None replaced by empty space('') and the domain coded
     values are replaced by proper domain descriptions and if there are any text values
     that contain complete numerical values, those are converted to int.
-    Each output returned is a list of lists and each list contains
-    the data of a row(in a feature class)
+    PARAMETERS
+    ----------
+    fdhs : list
+        A list of FDH IDs for which you need the BOMs
+    chunk_size : int
+        Number of FDHs read per cursor pass
+    Yields (fdh, (fiber, scs, conduit, vaults, trench)) per FDH. Each of those is a list of lists
+    and each list contains the data of a row(in a feature class)
      """
     print("READING FILTERED DATA")
     arcpy.env.workspace = scratch
-    fiber = []
-    scs = []
-    conduit = []
-    vaults = []
-    trench = []
-
     fcs = ["final_fiber", "final_scs", "final_con", "final_vaults", "trench"]
     cur_fields = [fiber_fields, sc_fields, con_fields, vault_fields, trench_fields]
-    out_data = [fiber, scs, conduit, vaults, trench]
-    # out_data = []
-    i = 0
-    domains = arcpy.da.ListDomains(scratch)
-    for fc, req_fields, out_fc in zip(fcs, cur_fields, out_data):
-        # print "Read FINAL FC: {0}".format(fc)
-        out_data.append([])
-        allfields = arcpy.ListFields(fc)
-        field_map = {o.name.lower(): o for o in allfields}
-        fields = [field_map[x.lower()] for x in req_fields]
-        with arcpy.da.SearchCursor(scratch + "\\" + fc, [x.name for x in fields],
-                                   "fdhid like '{0}'".format(fdh)) as cursor:
-            for row in cursor:
-                print(row)
-                temp = ["" if x is None else (x if fields[ind].domain == "" else
-                                              [y for y in domains if y.name == fields[ind].domain][0].codedValues[x])
-                        for ind, x in enumerate(row)]
-                for i, z in enumerate(temp):
-                    try:
-                        temp[i] = float(z)
-                    except:
-                        temp[i] = z
-                out_fc.append(temp)
-        #print("Read FINAL FC: {0} len: {1}".format(fc, len(out_fc)))
-
-    return (fiber, scs, conduit, vaults, trench)
-
-
-def uptwelve(x, base=5):
-    """
-    This function is used for some mathematical calculation which is used to fill cell 'A35'
-    as per the BOM guidelines (which I'm not aware of at the moment)
-    """
-    return int(base * math.ceil(float(x) / base))
+    domains = coded_domains(gdb)
+    fdhs = [x for i, x in enumerate(fdhs) if x not in fdhs[:i]]
+
+    for start in range(0, len(fdhs), chunk_size):
+        chunk = fdhs[start:start + chunk_size]
+        blocks = dict((fdh, ([], [], [], [], [])) for fdh in chunk)
+        fdh_exp = "fdhid IN (" + ", ".join(["'{0}'".format(x) for x in chunk]) + ")"
+        for out_ind, (fc, req_fields) in enumerate(zip(fcs, cur_fields)):
+            allfields = arcpy.ListFields(fc)
+            field_map = {o.name.lower(): o for o in allfields}
+            fields = [field_map[x.lower()] for x in req_fields]
+            converters = [column_converter(x, domains) for x in fields]
+            with arcpy.da.SearchCursor(scratch + "\\" + fc, [x.name for x in fields], fdh_exp) as cursor:
+                rows = [row for row in cursor]
+            # convert whole columns at a time, then partition on the raw fdhid (first field of every final feature class)
+            columns = [list(map(convert, column)) for convert, column in zip(converters, zip(*rows))]
+            for row, temp in zip(rows, zip(*columns)):
+                block = blocks.get(row[0])
+                if block is not None:
+                    block[out_ind].append(list(temp))
+        for fdh in chunk:
+            yield fdh, blocks.pop(fdh)
 
 
 def createbom(fdh, fiber, scs, conduit, vaults, trench):
@@ -357,208 +386,8 @@ def createbom(fdh, fiber, scs, conduit, vaults, trench):
     ws = wb['AEG Units']
     print("Creating BOM for {0}".format(fdh))
 
-    '''
-    fiber_fields = ["fdhid", "cablename", "fibercount", "fdhcable", "length_geo"]
-    con_fields = ["fdhid", "layer", "diameter", "mid_id", "length_geo"]
-    sc_fields = ["fdhid", "locationdescription", "splice_type", "fcount", "splice_count", "fiber_assignments", "sc_size"]
-    vault_fields = ["fdhid", "layer", "structure_type", "pvault"]
-    trench_fields = ["fdhid", "length_geo"]
-    loop_fields = ["fdhid", "designid", "p_hierarchy", "cablecapacity", "measuredlength"]
-    '''
-
-    # Missile Bore - All 1.25" except where shared path with 2"
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
-                              x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch" and
-                              x[con_fields.index("installmethod")] == "Missile" and x[con_fields.index("installmethod")] != "Directional-Parallel"])))
-    # print('1.25 missle bore', temp)
-    ws['A7'] = temp
-
-    # Directional Bore - up to 2" Conduit = All 2" Conduit, plus shared path with 1.25"
-    seen = set()
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
-                              x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "2inch" or x[con_fields.index("installmethod")] == 'Directional-Parallel'])))
-    # print('directional, shared 1.25 and 2', temp)
-    ws['A8'] = temp  # number of conduit in trench?
-
-    # Low Density Downtown Bore
-    temp = 0  # int(math.ceil(sum([x[trench_fields.index("length_geo")] for x in trench if x[trench_fields.index("fdhid")] == fdh])))
-    ws['A10'] = temp
-
-    # High Density Downtown Open Cut
-    temp = 0
-    ws['A11'] = temp
-
-    # UG "Special Crossing" (RR, Interstate, Waterway) - individual xing pricing will vary
-    temp = 0
-    ws['A12'] = temp
-
-    # Conduit Adder in same trench (1st additional conduit - up to 2" Conduit) Parallel
-    seen = set()
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
-                              x[con_fields.index("fdhid")] == fdh and x[con_fields.index("installmethod")] == 'Directional-Parallel'])))
-    # print('Conduit adder in same trench, up to 2 inch parallel', temp)
-    ws['A13'] = temp
-
-    # Underground Rear Easement Adder - New Conduit
-    temp = 0
-    ws['A19'] = temp
-
-    # Install Vault (17x30x24)
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Small Vault" and
-                x[vault_fields.index("pvault")] == "N" and x[vault_fields.index('interconnect')] == ''])
-    ws['A20'] = temp
-
-    # Install Vault (24x36x24, intermediate)
-    temp = len([x for x in vaults if x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Intermediate Vault" and x[vault_fields.index('interconnect')] == ''])
-    ws['A21'] = temp
-
-    # Install Vault (30x48x36)
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Medium Vault" and
-                x[vault_fields.index("pvault")] == "N" and x[vault_fields.index('interconnect')] == ''])
-    ws['A22'] = temp
-
-    # Install Vault (36x60x36)
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Large Vault" and
-                x[vault_fields.index("pvault")] == "N" and x[vault_fields.index('interconnect')] == ''])
-    ws['A23'] = temp
-
-    # Install Flower Pot (10x10)
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Flower Pot" and x[vault_fields.index('interconnect')] == ''])
-    ws['A24'] = temp
-
-    # Install Vault (17x30x24) - adjacent to power vault
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Small Vault" and
-                x[vault_fields.index("pvault")] == "N" and x[vault_fields.index('interconnect')] == 'YES'])
-    ws['A25'] = temp
-
-    # Install Vault ((24x36x24, intermediate) - adjacent to power vault
-    temp = len([x for x in vaults if x[vault_fields.index('fdhid')] == fdh and x[vault_fields.index("structure_type")] == "Intermediate Vault" and
-                                       x[vault_fields.index('interconnect')] == 'YES'])
-    ws['A26'] = temp
-
-    # Install Vault (30x48x36) - adjacent to power vault
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Medium Vault" and
-                x[vault_fields.index("pvault")] == "N" and x[vault_fields.index('interconnect')] == 'YES'])
-    ws['A27'] = temp
-
-    # Install Vault (36x60x36) - adjacent to power vault
-    temp = len([x for x in vaults if
-                x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Large Vault" and
-                x[vault_fields.index("pvault")] == "N" and x[vault_fields.index('interconnect')] == 'YES'])
-    ws['A28'] = temp
-
-    # Install Flower Pot (10x10) - adjacent to power vault
-    temp = 0  # len([x for x in vaults if x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == "Flower Pot" and x[vault_fields.index("pvault")] == "Y" x[vault_fields.index('interconnect')] == 'YES'])
-    ws['A29'] = temp
-
-    # Underground Rear Easement Adder - New Vault
-    temp = 0
-    ws['A30'] = temp
-
-    # OTDR Testing and Documentation - Uni-directional LCP to NAP
-    # print([x[sc_fields.index("fiber_assignments")] for x in scs if x[sc_fields.index("fdhid")] == fdh])
-    try:
-        temp = max([(int(x[sc_fields.index("fiber_assignments")].split("-")[-1]) if x[sc_fields.index(
-            "fiber_assignments")] != 0 and
-                                                                                    x[sc_fields.index(
-                                                                                        "fiber_assignments")] and
-                                                                                    x[sc_fields.index(
-                                                                                        "fiber_assignments")] != '' else 0)
-                    for x in scs if x[sc_fields.index("fdhid")] == fdh])
-        temp = uptwelve(temp, 12) + 24
-    except:
-        temp = "None"
-    ws['A37'] = temp
-
-    # HANDLE THE CABLE LENGTH AND MULTIPLIER TABLE
-    range = ws['G40:L45']
-    csizes = [288, 144, 96, 48, 24, 12]
-    for row, csize in zip(range, csizes):
-        # print(csize)
-        seen = set()
-        row[0].value = len([x for x in fiber if
-                            x[fiber_fields.index("fdhid")] == fdh and x[fiber_fields.index("fdhcable")] == 'Y' and x[
-                                fiber_fields.index("fibercount")] == csize and x[
-                                fiber_fields.index("cablename")] not in seen and
-                            not seen.add(x[fiber_fields.index("cablename")])])
-
-        row[1].value = len([x for x in scs if
-                            x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("fcount")] == csize and "MCA" in x[
-                                sc_fields.index("splice_type")]])
-        row[2].value = len([x for x in scs if
-                            x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("fcount")] == csize and "NAP" in x[
-                                sc_fields.index("splice_type")] and "MCA" not in x[sc_fields.index("splice_type")]])
-        row[3].value = len([x for x in scs if
-                            x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("fcount")] == csize and "RE" in x[
-                                sc_fields.index("splice_type")]])
-        row[5].value = int(math.ceil(sum([x[fiber_fields.index("length_geo")] for x in fiber if
-                                          x[fiber_fields.index("fdhid")] == fdh and x[
-                                              fiber_fields.index("fibercount")] == csize])))
-        # print(row[5].value)
-    '''
-    #Parallel 1.25"
-    seen = set()
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch" and x[con_fields.index("shared")] <> 'Y' and
-                              ((x[con_fields.index("mid_id")] in seen and not seen.add(x[con_fields.index("mid_id")])) or seen.add(x[con_fields.index("mid_id")]))])))
-    ws['G46'] = temp
-    #SHARED 1.25" CONDUIT
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch" and x[con_fields.index("shared")] == 'Y'])))
-    ws['G47'] = temp
-    #Parallel 2"
-    seen = set()
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "2inch" and ((x[con_fields.index("mid_id")] in seen and not seen.add(x[con_fields.index("mid_id")])) or seen.add(x[con_fields.index("mid_id")]))])))
-    ws['G48'] = temp
-    '''
-    # 1.25 inch CONDUIT
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
-                              x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch"])))
-    # print('1.25 inch conduit', temp)
-    ws['G54'] = temp
-
-    # 2 inch CONDUIT
-
-    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
-                              x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "2inch"])))
-    # print('2 inch conduit', temp)
-    ws['G55'] = temp
-
-    # Heat Shrink Sleeves = 1 per splice
-    temp = int(math.ceil(sum(
-        [(int(x[sc_fields.index("splice_count")]) if x[sc_fields.index("splice_count")] != '' else 0) for x in scs if
-         x[sc_fields.index("fdhid")] == fdh])))
-    ws['A66'] = temp
-
-    # FOSC 450 A-Gel Splice Enclosure (used on 48F, 24F
-    temp = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[
-        sc_fields.index("sc_size")] == "Commscope FOSC 450 A-Gel" and "X" not in x[
-                    sc_fields.index("locationdescription")]])
-    ws['A67'] = temp
-
-    # FOSC 450 A-Gel (used at NAP Extender solution only)
-    temp = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[
-        sc_fields.index("sc_size")] == "Commscope FOSC 450 A-Gel" and "X" in x[sc_fields.index("locationdescription")]])
-    ws['A68'] = temp
-
-    # FOSC 450 B-Gel Splice Enclosure
-    temp = len([x for x in scs if
-                x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("sc_size")] == "Commscope FOSC 450 B-Gel"])
-    ws['A70'] = temp
-
-    # FOSC 450 C-Gel Splice Enclosure
-    temp = len([x for x in scs if
-                x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("sc_size")] == "Commscope FOSC 450 C-Gel"])
-    ws['A72'] = temp
-
-    # FOSC 450 D-Gel Splice Enclosure
-    temp = len([x for x in scs if
-                x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("sc_size")] == "Commscope FOSC 450 D-Gel"])
-    ws['A74'] = temp
+    for cell, value in bom_cells(fiber, scs, conduit, vaults).items():
+        ws[cell] = value
 
     fn = Output_Location + "\\{0}_BOM_{1}.xlsx".format(fdh, str(time.strftime("%Y%m%d")))
     if os.path.exists(fn):
@@ -573,9 +402,8 @@ def main():
     # All the data corresponding to these FDHs is pulled and processes
     prep_data(fdhs)
 
-    # Data for each individual FDH is gathered and BOM is created(one at a time)
-    for fdh in fdhs:
-        (fiber, scs, conduit, vaults, trench) = read_data(fdh)
+    # Data for all FDHs is read in bulk, then BOMs are created one FDH at a time
+    for fdh, (fiber, scs, conduit, vaults, trench) in read_data(fdhs):
         createbom(fdh, fiber, scs, conduit, vaults, trench)
 
     print("BOMS CREATED. HIT EXIT TO QUIT OR PUT IN NEW INFORMATION TO RUN DIFFERENT SHEETS")
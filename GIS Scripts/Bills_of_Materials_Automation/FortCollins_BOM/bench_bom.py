@@ -0,0 +1,136 @@
+"""
+Parity check and benchmark for fc_cells.bom_cells(), the indexed cells createbom() writes, against the old createbom()
+that rescanned the rows of every feature class once per cell (and looked up every field offset with list.index()).
+
+The fixture is one synthetic FDH of --rows rows split over fiber, splice points, conduit and vaults, with values shaped
+like read_data() yields them: numbers as float, None as '', domain codes decoded. Every cell has to match the old
+createbom(), the script exits 1 if one differs.
+
+Usage:
+    python bench_bom.py [--rows 50000] [--seed 0]
+"""
+import sys
+import math
+import time
+import random
+import argparse
+from fc_cells import fiber_fields, con_fields, sc_fields, vault_fields, uptwelve, bom_cells
+
+FDH = "DIX101a-F02"
+CSIZES = [288., 144., 96., 48., 24., 12., 6.]
+SPLICE_TYPES = ["MCA", "NAP", "MCA NAP", "RE", "RE NAP", "Butt", ""]
+SC_SIZES = ["Commscope FOSC 450 A-Gel", "Commscope FOSC 450 B-Gel", "Commscope FOSC 450 C-Gel",
+            "Commscope FOSC 450 D-Gel", ""]
+STRUCTURES = ["Small Vault", "Intermediate Vault", "Medium Vault", "Large Vault", "Flower Pot", "Handhole"]
+METHODS = ["Missile", "Directional", "Directional-Parallel", ""]
+
+
+def fixture(rows, rng):
+    """
+    (fiber, scs, conduit, vaults) of one FDH, rows shared out 30/20/30/20.
+    """
+    fiber = [[FDH, "CABLE-{0}".format(rng.randint(0, rows // 20)), rng.choice(CSIZES), rng.choice(["Y", "N", ""]),
+              rng.uniform(0, 2000)] for i in range(rows * 3 // 10)]
+    scs = [[FDH, rng.choice(["SP-{0}".format(i), "SP-{0}X".format(i), ""]), rng.choice(SPLICE_TYPES),
+            rng.choice(CSIZES), rng.choice([float(rng.randint(0, 48)), ""]),
+            rng.choice(["1-{0}".format(rng.randint(1, 288)), ""]), rng.choice(SC_SIZES)] for i in range(rows // 5)]
+    conduit = [[FDH, "FC_Conduit", rng.choice(["1.25inch", "2inch", ""]), float(rng.randint(0, rows)),
+                rng.uniform(0, 500), rng.choice(["Y", "N"]), rng.choice(METHODS)] for i in range(rows * 3 // 10)]
+    vaults = [[FDH, "FC_Structure", rng.choice(STRUCTURES), rng.choice(["Y", "N", ""]), rng.choice(["YES", ""])]
+              for i in range(rows // 5)]
+    return fiber, scs, conduit, vaults
+
+
+def old_cells(fdh, fiber, scs, conduit, vaults):
+    """
+    The cells of the old createbom(), one scan of the rows per cell, written to a dict instead of the worksheet.
+    """
+    ws = {}
+    ws['A7'] = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
+                                  x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch" and
+                                  x[con_fields.index("installmethod")] == "Missile" and x[con_fields.index("installmethod")] != "Directional-Parallel"])))
+    ws['A8'] = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
+                                  x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "2inch" or x[con_fields.index("installmethod")] == 'Directional-Parallel'])))
+    ws['A10'] = ws['A11'] = ws['A12'] = ws['A19'] = ws['A29'] = ws['A30'] = 0
+    ws['A13'] = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
+                                   x[con_fields.index("fdhid")] == fdh and x[con_fields.index("installmethod")] == 'Directional-Parallel'])))
+
+    def vault_cell(structure_type, interconnect, check_pvault=True):
+        return len([x for x in vaults if
+                    x[vault_fields.index("fdhid")] == fdh and x[vault_fields.index("structure_type")] == structure_type and
+                    (not check_pvault or x[vault_fields.index("pvault")] == "N") and x[vault_fields.index('interconnect')] == interconnect])
+    ws['A20'] = vault_cell("Small Vault", '')
+    ws['A21'] = vault_cell("Intermediate Vault", '', False)
+    ws['A22'] = vault_cell("Medium Vault", '')
+    ws['A23'] = vault_cell("Large Vault", '')
+    ws['A24'] = vault_cell("Flower Pot", '', False)
+    ws['A25'] = vault_cell("Small Vault", 'YES')
+    ws['A26'] = vault_cell("Intermediate Vault", 'YES', False)
+    ws['A27'] = vault_cell("Medium Vault", 'YES')
+    ws['A28'] = vault_cell("Large Vault", 'YES')
+    try:
+        temp = max([(int(x[sc_fields.index("fiber_assignments")].split("-")[-1]) if x[sc_fields.index("fiber_assignments")] != 0 and
+                     x[sc_fields.index("fiber_assignments")] and x[sc_fields.index("fiber_assignments")] != '' else 0)
+                    for x in scs if x[sc_fields.index("fdhid")] == fdh])
+        temp = uptwelve(temp, 12) + 24
+    except:
+        temp = "None"
+    ws['A37'] = temp
+
+    for row, csize in zip(range(40, 46), [288, 144, 96, 48, 24, 12]):
+        seen = set()
+        ws['G{0}'.format(row)] = len([x for x in fiber if
+                                      x[fiber_fields.index("fdhid")] == fdh and x[fiber_fields.index("fdhcable")] == 'Y' and
+                                      x[fiber_fields.index("fibercount")] == csize and x[fiber_fields.index("cablename")] not in seen and
+                                      not seen.add(x[fiber_fields.index("cablename")])])
+        ws['H{0}'.format(row)] = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("fcount")] == csize and
+                                      "MCA" in x[sc_fields.index("splice_type")]])
+        ws['I{0}'.format(row)] = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("fcount")] == csize and
+                                      "NAP" in x[sc_fields.index("splice_type")] and "MCA" not in x[sc_fields.index("splice_type")]])
+        ws['J{0}'.format(row)] = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("fcount")] == csize and
+                                      "RE" in x[sc_fields.index("splice_type")]])
+        ws['L{0}'.format(row)] = int(math.ceil(sum([x[fiber_fields.index("length_geo")] for x in fiber if
+                                                    x[fiber_fields.index("fdhid")] == fdh and x[fiber_fields.index("fibercount")] == csize])))
+    ws['G54'] = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
+                                   x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch"])))
+    ws['G55'] = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if
+                                   x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "2inch"])))
+    ws['A66'] = int(math.ceil(sum([(int(x[sc_fields.index("splice_count")]) if x[sc_fields.index("splice_count")] != '' else 0)
+                                   for x in scs if x[sc_fields.index("fdhid")] == fdh])))
+    ws['A67'] = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("sc_size")] == "Commscope FOSC 450 A-Gel" and
+                     "X" not in x[sc_fields.index("locationdescription")]])
+    ws['A68'] = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and x[sc_fields.index("sc_size")] == "Commscope FOSC 450 A-Gel" and
+                     "X" in x[sc_fields.index("locationdescription")]])
+    for cell, size in [('A70', "B"), ('A72', "C"), ('A74', "D")]:
+        ws[cell] = len([x for x in scs if x[sc_fields.index("fdhid")] == fdh and
+                        x[sc_fields.index("sc_size")] == "Commscope FOSC 450 {0}-Gel".format(size)])
+    return ws
+
+
+def main(rows, seed):
+    fiber, scs, conduit, vaults = fixture(rows, random.Random(seed))
+    print("{0} rows: {1} fiber, {2} splice points, {3} conduit, {4} vaults".format(
+        rows, len(fiber), len(scs), len(conduit), len(vaults)))
+    start = time.time()
+    old = old_cells(FDH, fiber, scs, conduit, vaults)
+    old_time = time.time() - start
+    start = time.time()
+    new = bom_cells(fiber, scs, conduit, vaults)
+    new_time = time.time() - start
+    print("{0:<28}{1:9.3f} s".format("old createbom() cells", old_time))
+    print("{0:<28}{1:9.3f} s  ({2:.1f}x)".format("bom_cells()", new_time, old_time / max(new_time, 1e-9)))
+    bad = 0
+    for cell in sorted(set(old) | set(new)):
+        if old.get(cell) != new.get(cell):
+            bad += 1
+            print("  {0}: old {1!r}, bom_cells {2!r}  <- differs".format(cell, old.get(cell), new.get(cell)))
+    print("{0} cells, {1} differ".format(len(new), bad))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.seed))
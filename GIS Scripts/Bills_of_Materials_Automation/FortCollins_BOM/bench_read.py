@@ -0,0 +1,113 @@
+"""
+Parity check and benchmark for the read_data() value conversion: fc_cells.column_converter() picked once per field and
+mapped over whole columns, against the old per cell loop that searched the GDB's domain list for every coded cell and
+then tried float() on every cell.
+
+The fixture is a --rows row table with the splice point fields plus a double and a coded integer field (text, coded
+text, coded numbers, None and numbers stored as text) in a GDB with --domains coded value domains. Every converted
+row has to match the old loop, the script exits 1 if one differs.
+
+Usage:
+    python bench_read.py [--rows 100000] [--domains 200] [--seed 0]
+"""
+import sys
+import time
+import random
+import argparse
+from collections import namedtuple
+from fc_cells import column_converter
+
+# stand-ins for arcpy's Field and Domain, with only the attributes read_data() uses
+Field = namedtuple("Field", ["name", "type", "domain"])
+Domain = namedtuple("Domain", ["name", "domainType", "codedValues"])
+
+FIELDS = [Field("fdhid", "String", ""),
+          Field("locationdescription", "String", ""),
+          Field("splice_type", "String", "SpliceType"),
+          Field("fcount", "String", "FiberCount"),
+          Field("splice_count", "String", ""),
+          Field("fiber_assignments", "String", ""),
+          Field("sc_size", "String", "EnclosureSize"),
+          Field("length_geo", "Double", ""),
+          Field("installed", "SmallInteger", "YesNo")]
+
+
+def fixture(rows, domain_count, rng):
+    """
+    (domains as arcpy.da.ListDomains() gives them, rows as a SearchCursor gives them). The domains the fields use are
+    last in the list, behind domain_count others, so the old search walks the whole list.
+    """
+    domains = [Domain("Other{0}".format(i), "CodedValue", dict(("C{0}".format(k), "Value {0}".format(k)) for k in range(20)))
+               for i in range(domain_count)]
+    domains += [Domain("SpliceType", "CodedValue", {"MCA": "MCA", "NAP": "NAP", "RE": "RE Splice", "BT": "Butt"}),
+                Domain("FiberCount", "CodedValue", dict((str(n), str(n)) for n in [288, 144, 96, 48, 24, 12])),
+                Domain("EnclosureSize", "CodedValue", dict(("FOSC{0}".format(g), "Commscope FOSC 450 {0}-Gel".format(g))
+                                                           for g in "ABCD")),
+                Domain("YesNo", "CodedValue", {0: "N", 1: "Y"})]
+    table = []
+    for i in range(rows):
+        table.append(("DIX101a-F{0:02d}".format(rng.randint(0, 20)),
+                      rng.choice(["SP-{0}".format(i), "SP-{0}X".format(i), None]),
+                      rng.choice(["MCA", "NAP", "RE", "BT", None]),
+                      rng.choice(["288", "144", "96", "48", "24", "12", None]),
+                      rng.choice([str(rng.randint(0, 48)), None]),
+                      rng.choice(["1-{0}".format(rng.randint(1, 288)), "", None]),
+                      rng.choice(["FOSC{0}".format(g) for g in "ABCD"] + [None]),
+                      rng.choice([rng.uniform(0, 500), None]),
+                      rng.choice([0, 1, None])))
+    return domains, table
+
+
+def old_rows(fields, domains, rows):
+    """
+    The old read_data() loop, per cell.
+    """
+    out = []
+    for row in rows:
+        temp = ["" if x is None else (x if fields[ind].domain == "" else
+                                      [y for y in domains if y.name == fields[ind].domain][0].codedValues[x])
+                for ind, x in enumerate(row)]
+        for i, z in enumerate(temp):
+            try:
+                temp[i] = float(z)
+            except:
+                temp[i] = z
+        out.append(temp)
+    return out
+
+
+def new_rows(fields, domains, rows):
+    """
+    The read_data() conversion: domains to a dict once (coded_domains()), a converter per field, applied per column.
+    """
+    coded = dict((d.name, d.codedValues) for d in domains if d.domainType == 'CodedValue')
+    converters = [column_converter(x, coded) for x in fields]
+    columns = [list(map(convert, column)) for convert, column in zip(converters, zip(*rows))]
+    return [list(temp) for temp in zip(*columns)]
+
+
+def main(rows, domain_count, seed):
+    domains, table = fixture(rows, domain_count, random.Random(seed))
+    print("{0} rows x {1} fields, {2} domains in the GDB".format(len(table), len(FIELDS), len(domains)))
+    start = time.time()
+    old = old_rows(FIELDS, domains, table)
+    old_time = time.time() - start
+    start = time.time()
+    new = new_rows(FIELDS, domains, table)
+    new_time = time.time() - start
+    print("{0:<28}{1:9.3f} s".format("old per cell loop", old_time))
+    print("{0:<28}{1:9.3f} s  ({2:.1f}x)".format("column converters", new_time, old_time / max(new_time, 1e-9)))
+    bad = sum(1 for a, b in zip(old, new) if a != b) + abs(len(old) - len(new))
+    for a, b in [(a, b) for a, b in zip(old, new) if a != b][:5]:
+        print("  old {0!r}\n  new {1!r}  <- differs".format(a, b))
+    print("{0} rows differ".format(bad))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--domains", type=int, default=200, help="other coded value domains in the GDB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.domains, args.seed))
@@ -0,0 +1,236 @@
+"""
+Parity check and scaling benchmark for fc_engine.trench_engine(), the in memory replacement of the SplitLine, midpoint,
+1.5 FEET Buffer, Dissolve, SpatialJoin, Dissolve, SpatialJoin and 2 FEET Buffer / WITHIN chain in prep_data().
+
+The fixture is conduit runs laid out in feet: lone 2inch and 1.25inch runs, 1.25inch runs 1 ft off a 2inch run
+(same trench, shared) and 5 ft off one (own trench, not shared). It is converted to the units of --sr before the
+engine sees it and scaled back with feet_to_units(), the same way prep_data() does it, so a metre or degree
+spatial reference has to give the same answer as a foot one.
+
+Parity is checked against a shapely rebuild of the old chain (buffer, union, within), or with --arcpy against the
+old geoprocessing chain itself run in in_memory. Trench groups are compared as groups (mid_id numbering differs),
+trench counts and shared flags row by row.
+
+Also checks line_points() MID on random single and multipart lines (parts with gaps between them) against
+shapely's interpolate(0.5, normalized=True), which like positionAlongLine(0.50, True) measures along the parts only.
+
+Usage:
+    python bench_trench.py [--parity-size 5000] [--sizes 1000,10000,100000,1000000] [--sr feet|meters|degrees] [--arcpy]
+"""
+import sys
+import math
+import time
+import random
+import argparse
+from collections import namedtuple
+from fc_engine import line_points, gapped_lines, trench_engine, feet_to_units, FOOT, EARTH_RADIUS
+
+SpatialRef = namedtuple("SpatialRef", ["type", "metersPerUnit", "radiansPerUnit"])
+SPATIAL_REFS = {"feet": SpatialRef("Projected", FOOT, None),
+                "meters": SpatialRef("Projected", 1., None),
+                "degrees": SpatialRef("Geographic", None, math.pi / 180.)}
+# fixture origin for the degree case, Fort Collins
+ORIGIN = (-105.08, 40.58)
+
+
+def fixture(count, rng, spacing=200.):
+    """
+    About count two point segments in feet as (diameter, (x0, y0), (x1, y1)), runs on a spacing ft grid so runs
+    never reach each other.
+    """
+    segments = []
+    cells = int(math.ceil(math.sqrt(count / 6.)))
+    for cell in range(cells * cells):
+        if len(segments) >= count:
+            break
+        x0, y0 = (cell % cells) * spacing, (cell // cells) * spacing
+        angle = rng.uniform(0, math.pi)
+        ux, uy = math.cos(angle), math.sin(angle)
+        # bends every segment a little, vertices stay 20-30 ft apart so neighbouring midpoints never touch
+        points = [(x0, y0)]
+        for k in range(6):
+            step = rng.uniform(20, 30)
+            turn = rng.uniform(-0.2, 0.2)
+            ux, uy = ux * math.cos(turn) - uy * math.sin(turn), ux * math.sin(turn) + uy * math.cos(turn)
+            points.append((points[-1][0] + ux * step, points[-1][1] + uy * step))
+        kind = rng.choice(["2inch", "1.25inch", "shared", "apart"])
+        main = "1.25inch" if kind == "1.25inch" else "2inch"
+        segments.extend((main, a, b) for a, b in zip(points[:-1], points[1:]))
+        if kind in ("shared", "apart"):
+            offset = 1. if kind == "shared" else 5.
+            # offset perpendicular to the run's first heading, runs bend little enough to stay parallel
+            nx, ny = -math.sin(angle) * offset, math.cos(angle) * offset
+            moved = [(x + nx, y + ny) for x, y in points]
+            segments.extend(("1.25inch", a, b) for a, b in zip(moved[:-1], moved[1:]))
+    return segments
+
+
+def to_units(segments, sr):
+    """
+    Fixture feet to the coordinates of a spatial reference.
+    """
+    if sr.type == "Geographic":
+        per_foot_y = FOOT / (EARTH_RADIUS * sr.radiansPerUnit)
+        per_foot_x = per_foot_y / math.cos(ORIGIN[1] * sr.radiansPerUnit)
+
+        def move(p):
+            return ORIGIN[0] + p[0] * per_foot_x, ORIGIN[1] + p[1] * per_foot_y
+    else:
+        def move(p):
+            return p[0] * FOOT / sr.metersPerUnit, p[1] * FOOT / sr.metersPerUnit
+    return [(d, move(a), move(b)) for d, a, b in segments]
+
+
+def engine_run(segments, sr):
+    """
+    trench_engine() on coordinates in sr units, scaled to feet the way prep_data() does it.
+    """
+    lat = sum(a[1] + b[1] for d, a, b in segments) / (2. * len(segments)) if segments else 0.
+    x_scale, y_scale = feet_to_units(sr, lat)
+    return trench_engine([(d, (a[0] / x_scale, a[1] / y_scale), (b[0] / x_scale, b[1] / y_scale))
+                          for d, a, b in segments])
+
+
+def shapely_run(segments):
+    """
+    The old chain rebuilt with shapely on fixture feet: 1.5 ft midpoint buffers unioned into trench polygons,
+    1.25inch segments within the union of 2 ft buffers around the 2inch segments.
+    """
+    from shapely.geometry import LineString, Point
+    from shapely.ops import unary_union
+    from shapely.strtree import STRtree
+    mids = [Point((a[0] + b[0]) / 2., (a[1] + b[1]) / 2.) for d, a, b in segments]
+    merged = unary_union([mid.buffer(1.5, 64) for mid in mids])
+    polygons = list(getattr(merged, "geoms", [merged]))
+    tree = STRtree(polygons)
+    group = [int(tree.query(mid, predicate="within")[0]) for mid in mids]
+    counts = {}
+    for g in group:
+        counts[g] = counts.get(g, 0) + 1
+    two = unary_union([LineString([a, b]).buffer(2., 64) for d, a, b in segments if d == "2inch"])
+    shared = ["Y" if d == "1.25inch" and LineString([a, b]).within(two) else "N" for d, a, b in segments]
+    return [(g + 1, counts[g], flag) for g, flag in zip(group, shared)]
+
+
+def arcpy_run(segments, sr_name):
+    """
+    The old geoprocessing chain on the fixture in in_memory, in a spatial reference with the fixture's units.
+    """
+    import arcpy
+    sr = arcpy.SpatialReference({"feet": 2231, "meters": 26913, "degrees": 4269}[sr_name])
+    ws = "in_memory"
+    arcpy.env.overwriteOutput = True
+    arcpy.CreateFeatureclass_management(ws, "bench_con", "POLYLINE", spatial_reference=sr)
+    arcpy.AddField_management(ws + "\\bench_con", "diameter", "TEXT")
+    arcpy.AddField_management(ws + "\\bench_con", "seg", "LONG")
+    arcpy.AddField_management(ws + "\\bench_con", "shared", "TEXT")
+    arcpy.CreateFeatureclass_management(ws, "bench_mids", "POINT", spatial_reference=sr)
+    arcpy.AddField_management(ws + "\\bench_mids", "trench", "SHORT")
+    with arcpy.da.InsertCursor(ws + "\\bench_con", ["diameter", "seg", "shared", "SHAPE@"]) as cur:
+        for k, (d, a, b) in enumerate(segments):
+            cur.insertRow([d, k, "N", arcpy.Polyline(arcpy.Array([arcpy.Point(*a), arcpy.Point(*b)]), sr)])
+    with arcpy.da.InsertCursor(ws + "\\bench_mids", ["trench", "SHAPE@XY"]) as cur:
+        for d, a, b in segments:
+            cur.insertRow([1, ((a[0] + b[0]) / 2., (a[1] + b[1]) / 2.)])
+    arcpy.Buffer_analysis(ws + "\\bench_mids", ws + "\\bench_mid_buff", "1.5 FEET", "FULL", "ROUND")
+    arcpy.Dissolve_management(ws + "\\bench_mid_buff", ws + "\\bench_mid_diss", "", "", "SINGLE_PART", "")
+    arcpy.AddField_management(ws + "\\bench_mid_diss", "mid_id", "LONG")
+    arcpy.CalculateField_management(ws + "\\bench_mid_diss", "mid_id", "!OBJECTID!", "PYTHON_9.3", "")
+    arcpy.SpatialJoin_analysis(ws + "\\bench_mid_buff", ws + "\\bench_mid_diss", ws + "\\bench_join_temp",
+                               "JOIN_ONE_TO_ONE", "KEEP_ALL", "", "INTERSECT", "")
+    arcpy.Dissolve_management(ws + "\\bench_join_temp", ws + "\\bench_diss_temp", ["mid_id"], [["trench", "SUM"]],
+                              "SINGLE_PART", "")
+    arcpy.SpatialJoin_analysis(ws + "\\bench_con", ws + "\\bench_diss_temp", ws + "\\bench_join", "JOIN_ONE_TO_ONE",
+                               "KEEP_ALL", "", "INTERSECT", "")
+    arcpy.Select_analysis(ws + "\\bench_join", ws + "\\bench_con2", "diameter = '2inch'")
+    arcpy.Buffer_analysis(ws + "\\bench_con2", ws + "\\bench_con2_buff", "2 FEET", "FULL", "ROUND", "ALL")
+    arcpy.MakeFeatureLayer_management(ws + "\\bench_join", "bench_con125", "diameter = '1.25inch'")
+    arcpy.SelectLayerByLocation_management("bench_con125", "WITHIN", ws + "\\bench_con2_buff", "", "NEW_SELECTION")
+    arcpy.CalculateField_management("bench_con125", "shared", "'Y'", "PYTHON_9.3", "")
+    arcpy.SelectLayerByAttribute_management("bench_con125", "CLEAR_SELECTION")
+    rows = dict((row[0], row[1:]) for row in arcpy.da.SearchCursor(ws + "\\bench_join", ["seg", "mid_id", "SUM_trench", "shared"]))
+    return [rows[k] for k in range(len(segments))]
+
+
+def check_mid_points(rng, lines=2000):
+    """
+    line_points() MID against shapely for random lines of 1-3 parts, parts placed apart from each other. Also checks
+    gapped_lines() picks out exactly the lines with a gap.
+    RETURNS
+    -------
+    number of mismatches
+    """
+    from shapely.geometry import LineString, MultiLineString
+    oids, xs, ys, parts, lengths, expected, multi = [], [], [], [], [], [], []
+    for oid in range(lines):
+        geoms = []
+        for part in range(rng.choice([1, 1, 2, 3])):
+            x, y = rng.uniform(0, 1000), rng.uniform(0, 1000)
+            coords = [(x, y)]
+            for k in range(rng.randint(1, 5)):
+                coords.append((coords[-1][0] + rng.uniform(-50, 50), coords[-1][1] + rng.uniform(-50, 50)))
+            geoms.append(LineString(coords))
+            for cx, cy in coords:
+                oids.append(oid)
+                xs.append(cx)
+                ys.append(cy)
+                parts.append(part)
+        shape = MultiLineString(geoms) if len(geoms) > 1 else geoms[0]
+        lengths.extend([shape.length] * sum(len(g.coords) for g in geoms))
+        mid = shape.interpolate(0.5, normalized=True)
+        expected.append((mid.x, mid.y))
+        if len(geoms) > 1:
+            multi.append(oid)
+    found_oids, found_x, found_y = line_points(oids, xs, ys, "MID", parts)
+    bad = sum(1 for (ex, ey), fx, fy in zip(expected, found_x, found_y) if math.hypot(ex - fx, ey - fy) > 1e-6)
+    bad += len(set(gapped_lines(oids, xs, ys, lengths)) ^ set(multi))
+    return bad
+
+
+def compare(engine, reference):
+    """
+    Number of segments whose trench group, trench count or shared flag disagree. Groups are matched as sets,
+    the ids themselves are numbered differently.
+    """
+    pairs, bad = {}, 0
+    for (e_id, e_count, e_shared), (r_id, r_count, r_shared) in zip(engine, reference):
+        if pairs.setdefault(e_id, r_id) != r_id or e_count != r_count or e_shared != r_shared:
+            bad += 1
+    if len(set(pairs.values())) != len(pairs):
+        bad += len(pairs) - len(set(pairs.values()))
+    return bad
+
+
+def main(parity_size, sizes, sr_name, use_arcpy, seed):
+    rng = random.Random(seed)
+    sr = SPATIAL_REFS[sr_name]
+    segments = fixture(parity_size, rng)
+    placed = to_units(segments, sr)
+    engine = engine_run(placed, sr)
+    reference = arcpy_run(placed, sr_name) if use_arcpy else shapely_run(segments)
+    bad = compare(engine, reference)
+    print("parity ({0}, {1} segments, against {2}): {3} segments differ".format(
+        sr_name, len(segments), "arcpy chain" if use_arcpy else "shapely rebuild", bad))
+    print("  trenches {0}, shared 1.25in {1}".format(len(set(e[0] for e in engine)), sum(e[2] == "Y" for e in engine)))
+    if not use_arcpy:
+        misses = check_mid_points(rng)
+        print("line_points() MID on multipart lines: {0} mismatches against shapely".format(misses))
+        bad += misses
+    for size in sizes:
+        placed = to_units(fixture(size, rng), sr)
+        start = time.time()
+        engine_run(placed, sr)
+        elapsed = time.time() - start
+        print("{0:>9} segments {1:9.2f} s {2:12.0f} segments/s".format(len(placed), elapsed, len(placed) / max(elapsed, 1e-9)))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parity-size", type=int, default=5000)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--sr", choices=sorted(SPATIAL_REFS), default="feet")
+    parser.add_argument("--arcpy", action="store_true", help="compare against the old geoprocessing chain (needs ArcGIS)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.parity_size, [int(x) for x in args.sizes.split(",") if x], args.sr, args.arcpy, args.seed))
@@ -0,0 +1,234 @@
+"""
+Rows and BOM cells for FC_BOM: how read_data() converts the values it reads, the records its rows are wrapped in and
+the values createbom() writes into the template.
+Only needs the standard library, no arcpy, openpyxl or GUI, so it can be run and checked on its own (see bench_bom.py
+and bench_read.py).
+"""
+import math
+from collections import namedtuple
+
+fiber_fields = ["fdhid", "cablename", "fibercount", "fdhcable", "length_geo"]
+con_fields = ["fdhid", "layer", "diameter", "mid_id", "length_geo", "shared", 'installmethod']
+sc_fields = ["fdhid", "locationdescription", "splice_type", "fcount", "splice_count", "fiber_assignments", "sc_size"]
+vault_fields = ["fdhid", "layer", "structure_type", "pvault", 'interconnect']
+
+numeric_types = ['Double', 'Single', 'Integer', 'SmallInteger', 'OID']
+
+# Records with fixed field offsets for the rows read_data() returns
+Fiber = namedtuple('Fiber', fiber_fields)
+Conduit = namedtuple('Conduit', con_fields)
+Splice = namedtuple('Splice', sc_fields)
+Vault = namedtuple('Vault', vault_fields)
+
+
+def to_float(z):
+    try:
+        return float(z)
+    except (ValueError, TypeError):
+        return z
+
+
+def column_converter(field, domains):
+    """
+    This function picks the converter for one column of read_data(), once per field instead of once per cell.
+    None becomes '', domain codes become their descriptions and text that holds a number becomes float.
+    PARAMETERS
+    ----------
+    field : arcpy Field
+        field the column is read from
+    domains : dict
+        output of coded_domains()
+    """
+    if field.domain in domains:
+        decoded = dict((code, to_float(desc)) for code, desc in domains[field.domain].items())
+        return lambda x: "" if x is None else decoded.get(x, to_float(x))
+    if field.type in numeric_types:
+        return lambda x: "" if x is None else float(x)
+    seen = {}
+
+    def convert(x):
+        if x is None:
+            return ""
+        if x not in seen:
+            seen[x] = to_float(x)
+        return seen[x]
+    return convert
+
+
+def uptwelve(x, base=5):
+    """
+    This function is used for some mathematical calculation which is used to fill cell 'A35'
+    as per the BOM guidelines (which I'm not aware of at the moment)
+    """
+    return int(base * math.ceil(float(x) / base))
+
+
+def group_by(rows, key, value=None):
+    """
+    Single pass group by used to build the bom_cells() lookup indexes.
+    PARAMETERS
+    ----------
+    rows : list
+        records of one FDH
+    key : function
+        returns the group key of a record
+    value : function
+        returns the value to sum for a record, None to count records instead
+    Returns a dict of {group key: count or summed value}
+    """
+    groups = {}
+    for row in rows:
+        k = key(row)
+        groups[k] = groups.get(k, 0) + (1 if value is None else value(row))
+    return groups
+
+
+def bom_cells(fiber, scs, conduit, vaults):
+    """
+    This function computes the cells createbom() fills for one FDH.
+    read_data() already limits rows to one FDH, so rows are wrapped in records with fixed field offsets
+    and grouped once. Each cell is then a lookup into one of these indexes instead of a rescan of the rows.
+    PARAMETERS
+    ----------
+    fiber, scs, conduit, vaults : list
+        rows of one FDH as read_data() yields them, in the order of fiber_fields, sc_fields, con_fields, vault_fields
+    RETURNS
+    -------
+    {cell: value}, e.g. {'A7': 120, ..., 'G40': 1, ...}
+    """
+    fiber = [Fiber(*x) for x in fiber]
+    scs = [Splice(*x) for x in scs]
+    conduit = [Conduit(*x) for x in conduit]
+    vaults = [Vault(*x) for x in vaults]
+
+    con_length = group_by(conduit, lambda x: (x.diameter, x.installmethod), lambda x: x.length_geo)
+    vault_count = group_by(vaults, lambda x: (x.structure_type, x.pvault, x.interconnect))
+    sc_count = group_by(scs, lambda x: (x.fcount, x.splice_type))
+    sc_size_count = group_by(scs, lambda x: (x.sc_size, "X" in str(x.locationdescription)))
+    fiber_length = group_by(fiber, lambda x: x.fibercount, lambda x: x.length_geo)
+    fdh_cables = {}
+    for x in fiber:
+        if x.fdhcable == 'Y':
+            fdh_cables.setdefault(x.fibercount, set()).add(x.cablename)
+
+    def con_sum(test):
+        return int(math.ceil(sum(v for (diameter, method), v in con_length.items() if test(diameter, method))))
+
+    def vaults_of(structure_type, interconnect, pvault="N"):
+        # pvault=None counts every pvault value
+        return sum(v for (t, p, i), v in vault_count.items()
+                   if t == structure_type and i == interconnect and (pvault is None or p == pvault))
+
+    cells = {}
+
+    # Missile Bore - All 1.25" except where shared path with 2"
+    cells['A7'] = con_sum(lambda d, m: d == "1.25inch" and m == "Missile")
+
+    # Directional Bore - up to 2" Conduit = All 2" Conduit, plus shared path with 1.25"
+    cells['A8'] = con_sum(lambda d, m: d == "2inch" or m == 'Directional-Parallel')  # number of conduit in trench?
+
+    # Low Density Downtown Bore
+    cells['A10'] = 0  # int(math.ceil(sum([x[trench_fields.index("length_geo")] for x in trench if x[trench_fields.index("fdhid")] == fdh])))
+
+    # High Density Downtown Open Cut
+    cells['A11'] = 0
+
+    # UG "Special Crossing" (RR, Interstate, Waterway) - individual xing pricing will vary
+    cells['A12'] = 0
+
+    # Conduit Adder in same trench (1st additional conduit - up to 2" Conduit) Parallel
+    cells['A13'] = con_sum(lambda d, m: m == 'Directional-Parallel')
+
+    # Underground Rear Easement Adder - New Conduit
+    cells['A19'] = 0
+
+    # Install Vault (17x30x24)
+    cells['A20'] = vaults_of("Small Vault", '')
+
+    # Install Vault (24x36x24, intermediate)
+    cells['A21'] = vaults_of("Intermediate Vault", '', pvault=None)
+
+    # Install Vault (30x48x36)
+    cells['A22'] = vaults_of("Medium Vault", '')
+
+    # Install Vault (36x60x36)
+    cells['A23'] = vaults_of("Large Vault", '')
+
+    # Install Flower Pot (10x10)
+    cells['A24'] = vaults_of("Flower Pot", '', pvault=None)
+
+    # Install Vault (17x30x24) - adjacent to power vault
+    cells['A25'] = vaults_of("Small Vault", 'YES')
+
+    # Install Vault ((24x36x24, intermediate) - adjacent to power vault
+    cells['A26'] = vaults_of("Intermediate Vault", 'YES', pvault=None)
+
+    # Install Vault (30x48x36) - adjacent to power vault
+    cells['A27'] = vaults_of("Medium Vault", 'YES')
+
+    # Install Vault (36x60x36) - adjacent to power vault
+    cells['A28'] = vaults_of("Large Vault", 'YES')
+
+    # Install Flower Pot (10x10) - adjacent to power vault
+    cells['A29'] = 0  # vaults_of("Flower Pot", 'YES', pvault="Y")
+
+    # Underground Rear Easement Adder - New Vault
+    cells['A30'] = 0
+
+    # OTDR Testing and Documentation - Uni-directional LCP to NAP
+    try:
+        temp = max([(int(x.fiber_assignments.split("-")[-1]) if x.fiber_assignments != 0 and x.fiber_assignments and
+                     x.fiber_assignments != '' else 0) for x in scs])
+        temp = uptwelve(temp, 12) + 24
+    except:
+        temp = "None"
+    cells['A37'] = temp
+
+    # HANDLE THE CABLE LENGTH AND MULTIPLIER TABLE (G40:L45, K is left alone)
+    csizes = [288, 144, 96, 48, 24, 12]
+    for row, csize in zip(range(40, 46), csizes):
+        types = [(str(t), v) for (f, t), v in sc_count.items() if f == csize]
+        cells['G{0}'.format(row)] = len(fdh_cables.get(csize, ()))
+        cells['H{0}'.format(row)] = sum(v for t, v in types if "MCA" in t)
+        cells['I{0}'.format(row)] = sum(v for t, v in types if "NAP" in t and "MCA" not in t)
+        cells['J{0}'.format(row)] = sum(v for t, v in types if "RE" in t)
+        cells['L{0}'.format(row)] = int(math.ceil(fiber_length.get(csize, 0)))
+
+    '''
+    #Parallel 1.25"
+    seen = set()
+    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch" and x[con_fields.index("shared")] <> 'Y' and
+                              ((x[con_fields.index("mid_id")] in seen and not seen.add(x[con_fields.index("mid_id")])) or seen.add(x[con_fields.index("mid_id")]))])))
+    ws['G46'] = temp
+    #SHARED 1.25" CONDUIT
+    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "1.25inch" and x[con_fields.index("shared")] == 'Y'])))
+    ws['G47'] = temp
+    #Parallel 2"
+    seen = set()
+    temp = int(math.ceil(sum([x[con_fields.index("length_geo")] for x in conduit if x[con_fields.index("fdhid")] == fdh and x[con_fields.index("diameter")] == "2inch" and ((x[con_fields.index("mid_id")] in seen and not seen.add(x[con_fields.index("mid_id")])) or seen.add(x[con_fields.index("mid_id")]))])))
+    ws['G48'] = temp
+    '''
+    # 1.25 inch CONDUIT
+    cells['G54'] = con_sum(lambda d, m: d == "1.25inch")
+
+    # 2 inch CONDUIT
+    cells['G55'] = con_sum(lambda d, m: d == "2inch")
+
+    # Heat Shrink Sleeves = 1 per splice
+    cells['A66'] = int(math.ceil(sum((int(x.splice_count) if x.splice_count != '' else 0) for x in scs)))
+
+    # FOSC 450 A-Gel Splice Enclosure (used on 48F, 24F
+    cells['A67'] = sc_size_count.get(("Commscope FOSC 450 A-Gel", False), 0)
+
+    # FOSC 450 A-Gel (used at NAP Extender solution only)
+    cells['A68'] = sc_size_count.get(("Commscope FOSC 450 A-Gel", True), 0)
+
+    # FOSC 450 B-Gel Splice Enclosure
+    cells['A70'] = sum(v for (size, x), v in sc_size_count.items() if size == "Commscope FOSC 450 B-Gel")
+
+    # FOSC 450 C-Gel Splice Enclosure
+    cells['A72'] = sum(v for (size, x), v in sc_size_count.items() if size == "Commscope FOSC 450 C-Gel")
+
+    # FOSC 450 D-Gel Splice Enclosure
+    cells['A74'] = sum(v for (size, x), v in sc_size_count.items() if size == "Commscope FOSC 450 D-Gel")
+    return cells
@@ -0,0 +1,264 @@
+"""
+Geometry for FC_BOM: end/mid points of lines (get_end_points()) and the conduit trench/shared engine (prep_data()).
+Only needs numpy, no arcpy or GUI, so it can be run and checked on its own (see bench_trench.py).
+"""
+import math
+import numpy as np
+
+FOOT = 0.3048
+EARTH_RADIUS = 6378137.0
+
+
+def line_points(oids, xs, ys, location, parts=None):
+    """
+    This function finds the end points or mid-points of lines from their vertices, all lines at once.
+    It only needs numpy, so it can be checked without arcpy.
+    PARAMETERS
+    ----------
+    oids, xs, ys : array like
+        One entry per vertex, vertices of a line are consecutive and in order
+        (what FeatureClassToNumPyArray with explode_to_points gives).
+    location : string
+        'BOTH_ENDS' or 'MID', same as get_end_points()
+    parts : array like, optional
+        Part index of every vertex. MID only measures along the parts, not across the gap from the end of one part
+        to the start of the next, and lands on a part. Without it every line is taken as single part.
+    RETURNS
+    -------
+    (oids, xs, ys) of the points. BOTH_ENDS gives first then last point of every line, MID gives the point
+    halfway along the line, same as positionAlongLine(0.50, True).
+    """
+    oids = np.asarray(oids)
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    if not len(oids):
+        return oids, xs, ys
+    starts = np.flatnonzero(np.r_[True, oids[1:] != oids[:-1]])
+    ends = np.r_[starts[1:], len(oids)] - 1
+
+    if location == "BOTH_ENDS":
+        idx = np.column_stack([starts, ends]).ravel()
+        return oids[idx], xs[idx], ys[idx]
+
+    # Cumulative length over every vertex, with no length between the last vertex of a line (or part) and the first of the next
+    seg = np.hypot(np.diff(xs), np.diff(ys))
+    seg[ends[:-1]] = 0
+    if parts is not None:
+        parts = np.asarray(parts)
+        seg[parts[1:] != parts[:-1]] = 0
+    cum = np.r_[0., np.cumsum(seg)]
+    target = (cum[starts] + cum[ends]) / 2.
+    # side="left" puts a target right on a gap at the end of the part before it
+    hi = np.clip(np.searchsorted(cum, target, side="left"), starts, ends)
+    lo = np.maximum(hi - 1, starts)
+    span = cum[hi] - cum[lo]
+    frac = np.where(span > 0, (target - cum[lo]) / np.where(span > 0, span, 1.), 0.)
+    return oids[starts], xs[lo] + frac * (xs[hi] - xs[lo]), ys[lo] + frac * (ys[hi] - ys[lo])
+
+
+def gapped_lines(oids, xs, ys, lengths):
+    """
+    This function finds the lines whose vertex chain is longer than the line itself, multipart lines with a gap
+    between parts, the only ones whose MID needs their parts (line_points()).
+    PARAMETERS
+    ----------
+    oids, xs, ys : array like
+        Vertices as for line_points()
+    lengths : array like
+        Length of the line at every vertex (SHAPE@LENGTH)
+    RETURNS
+    -------
+    list of oids
+    """
+    oids = np.asarray(oids)
+    if not len(oids):
+        return []
+    starts = np.flatnonzero(np.r_[True, oids[1:] != oids[:-1]])
+    ends = np.r_[starts[1:], len(oids)] - 1
+    seg = np.hypot(np.diff(np.asarray(xs, dtype=float)), np.diff(np.asarray(ys, dtype=float)))
+    seg[ends[:-1]] = 0
+    cum = np.r_[0., np.cumsum(seg)]
+    chain = cum[ends] - cum[starts]
+    length = np.asarray(lengths, dtype=float)[starts]
+    return oids[starts][chain > length * (1 + 1e-9) + 1e-9].tolist()
+
+
+def feet_to_units(sr, lat=0.):
+    """
+    Coordinate units per foot for a spatial reference, so the 1.5 FEET / 2 FEET distances of the old geoprocessing
+    chain can be applied to raw coordinates.
+    PARAMETERS
+    ----------
+    sr : arcpy SpatialReference (or anything with type, metersPerUnit and radiansPerUnit)
+    lat : float
+        latitude (in the spatial reference's angular unit) the scale is taken at, geographic references only
+    RETURNS
+    -------
+    (x units, y units) per foot. Projected references scale both axes the same, geographic ones shrink x with
+    the cosine of the latitude.
+    """
+    if sr.type == "Geographic":
+        per_foot = FOOT / (EARTH_RADIUS * sr.radiansPerUnit)
+        return per_foot / math.cos(lat * sr.radiansPerUnit), per_foot
+    per_foot = FOOT / sr.metersPerUnit
+    return per_foot, per_foot
+
+
+def str_tree(boxes, node_size=16):
+    """
+    This function builds a Sort-Tile-Recursive packed R-tree, used by trench_engine() for radius queries.
+    PARAMETERS
+    ----------
+    boxes : list
+        (xmin, ymin, xmax, ymax) per item
+    node_size : int
+        children per node
+    RETURNS
+    -------
+    (boxes, levels) for str_query(). levels[0] are the leaves, each level is a list of (box, children)
+    """
+    levels = []
+    level_boxes = boxes
+    while True:
+        count = len(level_boxes)
+        slabs = int(math.ceil(math.sqrt(math.ceil(count / float(node_size)))))
+        per_slab = max(slabs, 1) * node_size
+        order = sorted(range(count), key=lambda k: level_boxes[k][0] + level_boxes[k][2])
+        nodes = []
+        for start in range(0, count, per_slab):
+            slab = sorted(order[start:start + per_slab], key=lambda k: level_boxes[k][1] + level_boxes[k][3])
+            for first in range(0, len(slab), node_size):
+                kids = slab[first:first + node_size]
+                nodes.append(((min(level_boxes[k][0] for k in kids), min(level_boxes[k][1] for k in kids),
+                               max(level_boxes[k][2] for k in kids), max(level_boxes[k][3] for k in kids)), kids))
+        levels.append(nodes)
+        if len(nodes) <= 1:
+            return boxes, levels
+        level_boxes = [box for box, kids in nodes]
+
+
+def str_query(tree, box):
+    """
+    Indexes of the boxes in a str_tree() that overlap box.
+    """
+    boxes, levels = tree
+
+    def overlaps(a):
+        return a[0] <= box[2] and a[2] >= box[0] and a[1] <= box[3] and a[3] >= box[1]
+
+    found = []
+    stack = [(len(levels) - 1, k) for k in range(len(levels[-1]))]
+    while stack:
+        depth, k = stack.pop()
+        node_box, kids = levels[depth][k]
+        if not overlaps(node_box):
+            continue
+        if depth == 0:
+            found.extend(kid for kid in kids if overlaps(boxes[kid]))
+        else:
+            stack.extend((depth - 1, kid) for kid in kids)
+    return found
+
+
+def capsule_interval(p, q, a, b, r):
+    """
+    Part of segment p-q (as t from 0 to 1) that lies within r of segment a-b, or None.
+    The area within r of a-b is convex, so the answer is one interval: the span of the rectangle along a-b
+    and the two end circles.
+    """
+    dx, dy = q[0] - p[0], q[1] - p[1]
+    spans = []
+    for c in (a, b):
+        # |p + t*d - c|^2 <= r^2
+        fx, fy = p[0] - c[0], p[1] - c[1]
+        qa, qb, qc = dx * dx + dy * dy, 2 * (fx * dx + fy * dy), fx * fx + fy * fy - r * r
+        if qa == 0:
+            if qc <= 0:
+                spans.append((0., 1.))
+            continue
+        disc = qb * qb - 4 * qa * qc
+        if disc >= 0:
+            root = math.sqrt(disc)
+            spans.append(((-qb - root) / (2 * qa), (-qb + root) / (2 * qa)))
+    length = math.hypot(b[0] - a[0], b[1] - a[1])
+    if length > 0:
+        ex, ey = (b[0] - a[0]) / length, (b[1] - a[1]) / length
+        lo, hi = 0., 1.
+        # along a-b within [0, length], across a-b within [-r, r]
+        for ux, uy, low, high in ((ex, ey, 0., length), (-ey, ex, -r, r)):
+            c0 = (p[0] - a[0]) * ux + (p[1] - a[1]) * uy
+            c1 = dx * ux + dy * uy
+            if c1 == 0:
+                if not low <= c0 <= high:
+                    lo, hi = 1., 0.
+            else:
+                t0, t1 = sorted(((low - c0) / c1, (high - c0) / c1))
+                lo, hi = max(lo, t0), min(hi, t1)
+        if lo <= hi:
+            spans.append((lo, hi))
+    if not spans:
+        return None
+    lo, hi = max(min(x[0] for x in spans), 0.), min(max(x[1] for x in spans), 1.)
+    return (lo, hi) if lo <= hi else None
+
+
+def trench_engine(segments, radius=1.5, shared_buffer=2.0):
+    """
+    This function works out the trench groups and shared 1.25" conduit for conduit segments, all in memory.
+    It gives the same answers as the old chain of SplitLine, midpoints, 1.5 FEET Buffer, Dissolve, SpatialJoin,
+    Dissolve, SpatialJoin and the 2 FEET Buffer / WITHIN selection, without writing anything to scratch.
+    PARAMETERS
+    ----------
+    segments : list
+        (diameter, (x0, y0), (x1, y1)) per two point segment (what SplitLine gives), coordinates in feet
+        (see feet_to_units())
+    radius : float
+        midpoint buffer in feet, midpoints whose buffers touch (2 * radius apart or less) are in the same trench
+    shared_buffer : float
+        a 1.25inch segment lying entirely within this many feet of the 2inch conduit is shared
+    RETURNS
+    -------
+    list of (mid_id, trench, shared) per segment. mid_id numbers the trench groups from 1 in order of first
+    appearance, trench is the number of segments in the group and shared is 'Y' or 'N'
+    """
+    mids = [((a[0] + b[0]) / 2., (a[1] + b[1]) / 2.) for diameter, a, b in segments]
+
+    # Union midpoints within 2 * radius of each other
+    parent = list(range(len(mids)))
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    tree = str_tree([(x - radius, y - radius, x + radius, y + radius) for x, y in mids])
+    for n, (x, y) in enumerate(mids):
+        for m in str_query(tree, (x - radius, y - radius, x + radius, y + radius)):
+            if m > n and math.hypot(mids[m][0] - x, mids[m][1] - y) <= 2 * radius:
+                parent[find(m)] = find(n)
+    roots = [find(k) for k in range(len(mids))]
+    mid_ids, trench = {}, {}
+    for root in roots:
+        mid_ids.setdefault(root, len(mid_ids) + 1)
+        trench[root] = trench.get(root, 0) + 1
+
+    # 1.25inch segments covered by the capsules around the 2inch segments
+    two = [seg for seg in segments if seg[0] == "2inch"]
+    tree = str_tree([(min(a[0], b[0]) - shared_buffer, min(a[1], b[1]) - shared_buffer,
+                      max(a[0], b[0]) + shared_buffer, max(a[1], b[1]) + shared_buffer) for diameter, a, b in two])
+    shared = []
+    for diameter, p, q in segments:
+        if diameter != "1.25inch":
+            shared.append("N")
+            continue
+        box = (min(p[0], q[0]), min(p[1], q[1]), max(p[0], q[0]), max(p[1], q[1]))
+        spans = sorted(x for x in (capsule_interval(p, q, two[k][1], two[k][2], shared_buffer)
+                                   for k in str_query(tree, box)) if x is not None)
+        reached = 0.
+        for lo, hi in spans:
+            if lo > reached + 1e-9:
+                break
+            reached = max(reached, hi)
+        shared.append("Y" if reached >= 1 - 1e-9 else "N")
+    return [(mid_ids[root], trench[root], flag) for root, flag in zip(roots, shared)]
@@ -18,7 +18,8 @@ Notes:
 ############# Data Download and Transfer to root/scratch.gdb ################
 def downloadGDB():
     '''
-    Downloads daily RDOF gdb from Google Drive location. The file token.pickle stores the user's access and
+    Downloads daily RDOF gdb from Google Drive location and extracts it to /input while it downloads, skipped if the
+    extracted copy is already current. The file token.pickle stores the user's access and
     refresh tokens, and is completed automatically when the auth flow completes the first time (if not already present).
     :return: None
     '''
@@ -38,66 +39,35 @@ def downloadGDB():
         with open(os.path.join(root,'token.pickle'), 'wb') as token:
             pickle.dump(creds, token)
 
-    # build service instance, look for today's RDOF Design gdb file id.
-    service = build('drive', 'v3', credentials=creds)
-    pageToken = None
-    # loop through drive to find today's gdb
-    while True:
-        response = service.files().list(driveId='0ALWJmYKL39C_Uk9PVA',
-                                        includeItemsFromAllDrives=True,
-                                        corpora='drive',
-                                        fields='files(id, name)',
-                                        supportsAllDrives=True).execute()
-        for file in response.get('files', []):
-            if gdb in file.get('name'):
-                fileId = file.get('id')
-                print("Today's RDOF GDB found...")
-        pageToken = response.get('nextPageToken', None)
-        if pageToken is None:
-            break
-        return fileId
-
-    # once file is found, download to /input
-    request = service.files().get_media(fileId=fileId)
-    fh = io.FileIO(os.path.join(inputs, gdb),'wb')
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-        print('Downloading progress -> %d%% ' % int(status.progress() * 100))
-    print('Download Complete \n')
+    # look for today's RDOF Design zip by name server-side, then stream it down and extract it as it arrives (driveFetch.py)
+    session = AuthorizedSession(creds)
+    file = findFile(session, gdb, driveId=driveId, since=datetime.utcnow() - timedelta(days=1))
+    if file is None:
+        raise FileNotFoundError("Today's RDOF GDB ({}) was not found on Drive".format(gdb))
+    print("Today's RDOF GDB found...")
+    fetchZip(session, file, inputs, check=lambda: os.path.exists(gdbpath))
 def unzip():
     '''
-    Unzip daily RDOF gdb in /input
+    Unzip daily RDOF gdb in /input, only needed for a zip put there by hand (downloadGDB() extracts as it downloads)
     :return: None
     '''
     with zipfile.ZipFile(os.path.join(inputs, gdb), 'r') as zipref:
         zipref.extractall(inputs)
 def clear_gdb():
     '''
-    Clear contents of scratch.gdb.
+    Clear contents of scratch.gdb, keeping cached copies of the RDOF_Design layers (see scratchCache.py).
     :return: None
     '''
-    arcpy.env.workspace = scratch
     print('Clearing Workspace...')
-    fc_list = arcpy.ListFeatureClasses()
-    fc_tables = arcpy.ListTables()
-    try:
-        for fc in fc_list:
-           arcpy.Delete_management(scratch + '\\' + fc)
-        for table in fc_tables:
-            arcpy.Delete_management(scratch + '\\' + table)
-    except TypeError:
-        pass
+    clearScratch(scratch)
 def transfer():
     '''
     Transfer layers needed from RDOF_Design.gdb to scratch.gdb. If span layer is present in RDOF_Design, remove it so updated span can be added.
+    Layers already in scratch from the same RDOF_Design are only copied again if they changed.
     :return: None
     '''
     print('Transferring files from gdb to scratch...\n')
-    arcpy.env.workspace = datasetPath
-    for fc in necessaryFCs:
-        arcpy.FeatureClassToGeodatabase_conversion(join(datasetPath, fc), scratch)
+    syncScratch(scratch, [join(datasetPath, fc) for fc in necessaryFCs])
     print('\n')
 ############# Start BOM calcs and exports #############
 def getLCPFeatures(lcp, lcpNameFixed):
@@ -163,26 +133,25 @@ def addresses(lcpNameFixed):
     # get total 'designed to' served addresses in a LCP boundary
     boundaryAdds = arcpy.Intersect_analysis([f'{lcpNameFixed}_Total_Adds', 'DropFiber'], f'{lcpNameFixed}_DesignedToAdds','','','POINT')
 
-    # get cbg served address points within lcp boundary (for cell D4)
-    arcpy.SpatialJoin_analysis(f'{lcpNameFixed}_Total_Adds', 'RDOF_CBG', f'{lcpNameFixed}_CBG_Adds', 'JOIN_ONE_TO_ONE','KEEP_COMMON', '', 'WITHIN')
-    cbgAdds = arcpy.Intersect_analysis([f'{lcpNameFixed}_CBG_Adds', 'DropFiber'],f'{lcpNameFixed}_DesignedToAdds_inCBGs', '', '', 'POINT')
-    cbgAddsCount = arcpy.GetCount_management(cbgAdds)
-    ws['D4'] = int(cbgAddsCount[0])
+    # classify the designed to addresses against the CBG and overbuild polygons, indexed once per run (polygonIndex.py)
+    cbgs, overbuild = cachedIndex(join(scratch, 'RDOF_CBG')), cachedIndex(join(scratch, 'OVERBUILD_POLY'))
+    inCBG = cbgs.contains(layerXY(boundaryAdds, cbgs.sr))
+    inOverbuild = overbuild.contains(layerXY(boundaryAdds, overbuild.sr))
+
+    # cbg served address points within lcp boundary (for cell D4)
+    cbgAddsCount = int(inCBG.sum())
+    ws['D4'] = cbgAddsCount
 
-    # get LCP served addresses that are within an overbuild polygon (for cell D6)
-    arcpy.SpatialJoin_analysis(f'{lcpNameFixed}_Total_Adds', 'OVERBUILD_POLY', f'{lcpNameFixed}_Overbuild_Adds','JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'WITHIN')
-    overbuildAdds = arcpy.Intersect_analysis([f'{lcpNameFixed}_Overbuild_Adds', 'DropFiber'], f'{lcpNameFixed}_OverbuildDesignedToAdds','','','POINT')
-    overbuildAddsCount = arcpy.GetCount_management(overbuildAdds)
-    ws['D6'] = int(overbuildAddsCount[0])
+    # LCP served addresses that are within an overbuild polygon (for cell D6)
+    overbuildAddsCount = int(inOverbuild.sum())
+    ws['D6'] = overbuildAddsCount
 
-    # get served addresses that are not in CBGs and not in an overbuild polygon (for cell D5)
-    arcpy.Erase_analysis(boundaryAdds, overbuildAdds, f'{lcpNameFixed}_ErasedOverbuild')
-    erasedTot = arcpy.Erase_analysis(f'{lcpNameFixed}_ErasedOverbuild', cbgAdds, f'{lcpNameFixed}_TotalErased_D5')
-    erasedTotCount = arcpy.GetCount_management(erasedTot)
-    ws['D5'] = int(erasedTotCount[0])
+    # served addresses that are not in CBGs and not in an overbuild polygon (for cell D5)
+    erasedTotCount = int((~inCBG & ~inOverbuild).sum())
+    ws['D5'] = erasedTotCount
 
     # Get total adds passed (designed to), and olt commissioning calculation
-    totalAddsPassed = int(cbgAddsCount[0]) + int(overbuildAddsCount[0]) + int(erasedTotCount[0])
+    totalAddsPassed = cbgAddsCount + overbuildAddsCount + erasedTotCount
     ws['D7'] = totalAddsPassed
     # OLT Commissioning (for cell E153)
     ws['E153'] = math.ceil(totalAddsPassed / 496)
@@ -206,149 +175,65 @@ def dropFiber(lcpNameFixed):
     allDropLengths = [row[0] for row in cur]
     avgDropLength = math.ceil(int(sum(allDropLengths) / len(allDropLengths)))
     ws['D28'] = avgDropLength
-def conduit(lcpNameFixed):
+def readLCPTables(lcpNameFixed):
     '''
-    Calculations for various stats for conduit. Directional Bore, Plow, UG special crossings, adder in same trench, 1.25" & 2" lengths.
+    Reads each LCP feature class from getLCPFeatures() once into an in memory table. conduit(), spliceClosures(), structures()
+    and the strand/lashing cells of fiber() then compute their cells as grouped/vectorized aggregations over these tables, instead of a SelectLayerByAttribute_management
+    plus GetCount_management/sumField() round trip per cell.
     :param lcpNameFixed: LCP name that removes any illegal chars (- particularly) done in main()
     :return: None
     '''
-    print('Fetching conduit...')
+    print('Reading LCP features into memory...')
+    global lcpTables
     arcpy.env.workspace = scratch
     arcpy.env.overwriteOutput = True
 
-    # Get all conduit/ug fiber within LCP boundary of interest
+    # Plow is the only table that still needs geometry, UG fiber not in conduit.
     totalUGFiber = arcpy.SelectLayerByAttribute_management(totalFiber, 'NEW_SELECTION', "placementtype = 'UG'")
-
-    # Get conduit that is only for drops (for cell E65)
-    onlyDrops = arcpy.SelectLayerByAttribute_management(totalConduit, 'NEW_SELECTION', "dropsonly = 'Y'")
-    ws['E65'] = sumField(onlyDrops, 'LENGTH_GEO')
-
-    # Missile Bore	(for cell E66). Pending attribution in database.
-
-    # Directional bore, up to 2" conduit. Meaning total footage of conduit (for cell E67).
-    ws['E67'] = sumField(totalConduit, 'LENGTH_GEO')
-
-    # Plow - direct bury armored cable or up to 2" conduit = total UG fiber not in conduit (for cell E68)
     initialPlow = arcpy.Erase_analysis(totalUGFiber, totalConduit, f'{lcpNameFixed}_Plow')
-    ws['E68'] = sumField(initialPlow, 'LENGTH_GEO')
-
-    # Get all 1.25" conduit x 1.07 (for cell E118)
-    oneInch = arcpy.SelectLayerByAttribute_management(totalConduit, 'NEW_SELECTION', "duct_diameter = 1")
-    ws['E118'] = math.ceil(sumField(oneInch, 'LENGTH_GEO') * 1.07)
-
-    # Get all 2" conduit x 1.07 (for cell E119)
-    twoInch = arcpy.SelectLayerByAttribute_management(totalConduit, 'NEW_SELECTION', "duct_diameter = 2")
-    ws['E119'] = math.ceil(sumField(twoInch, 'LENGTH_GEO') * 1.07)
 
-    # Get conduit adder in same trench , i.e. parallel conduit (for cell E72). Pending attribution in database.
-
-def spliceClosures(lcpNameFixed):
+    lcpTables = {'Conduit': readTable(totalConduit, layerSpecs['Conduit']['fields'] + ['LENGTH_GEO']),
+                 'FiberCable': readTable(totalFiber, layerSpecs['FiberCable']['fields'] + ['LENGTH_GEO']),
+                 'Plow': readTable(initialPlow, ['LENGTH_GEO']),
+                 'SpliceClosure': readTable(lcpSplices, layerSpecs['SpliceClosure']['fields'] + ['SHAPE@XY']),
+                 'FiberEquipment': readTable(lcpEquipment, layerSpecs['FiberEquipment']['fields'] + ['SHAPE@XY']),
+                 'Structure': readTable(lcpStructures, layerSpecs['Structure']['fields']),
+                 'SlackLoop': readTable(slackLoops, layerSpecs['SlackLoop']['fields']),
+                 'Riser': readTable(lcpRisers, ['OID@']),
+                 'Proposed_Cabinets': readTable(lcpCabs, layerSpecs['Proposed_Cabinets']['fields'])}
+    # 1x32 splitters sitting on a G5N splice (for cell E125), within the xy tolerance like the batch path's location selection
+    splices = lcpTables['SpliceClosure']
+    tolerance = arcpy.Describe(lcpSplices).spatialReference.XYTolerance
+    lcpTables['FiberEquipment']['on_g5n'] = coincident(lcpTables['FiberEquipment'], splices[splices['splicesize'] == 'G5N'], tolerance)
+def writeCells(cells):
+    '''
+    Writes {cell: value} to the BOM template sheet.
+    :return: None
+    '''
+    for cell, value in cells.items():
+        ws[cell] = value
+def conduit():
+    '''
+    Calculations for various stats for conduit. Directional Bore, Plow, UG special crossings, adder in same trench, 1.25" & 2" lengths.
+    Missile Bore (E66) and conduit adder in same trench (E72) are pending attribution in database.
+    :return: None
+    '''
+    print('Fetching conduit...')
+    writeCells(evaluateRules(rules, lcpTables, section='conduit'))
+def spliceClosures():
     '''
     Various calculations for splice closures.
-    :param lcpNameFixed: LCP name that removes any illegal chars (- particularly) done in main()
     :return: None
     '''
     print('Fetching splices...')
-    arcpy.env.workspace = scratch
-    arcpy.env.overwriteOutput = True
-
-    # Get all splice closures and fiber equipment within LCP boundary of interest (for cell E90)
-    ws['E90'] = int(arcpy.GetCount_management(lcpSplices)[0])
-
-    # Single Fusion Fiber Splicing - Total cable size for all RE, MCA, and NAPMCA type splices + # of HHP's from all NAP splices. (for cell E91)
-    noNaps = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "spliceenclosuretype <> 'NAP'")
-    noNapsSum = sumField(noNaps, 'cable_size')
-    onlyNaps = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "spliceenclosuretype = 'NAP'")
-    NapsSum = sumField(onlyNaps, 'hhp_count')
-    ws['E91'] = noNapsSum + NapsSum
-
-    # Channell F1 Intercept Enclosure (Green Hornet G6, (4) 24ct splice trays) = total G6 sized splice enclosure that's type RE or MCA or NAPMCA (for cell E124)
-    g6Splices = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "splicesize='G6' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')")
-    ws['E124'] = int(arcpy.GetCount_management(g6Splices)[0])
-
-    # Channell Primary Splitter Enclosure (Green Hornet G5, (3) 24ct splice trays, (1) 1x32 splitter bare leads) (for cell E125)
-    g5Splices = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "splicesize = 'G5N'")
-    spliceEquipment = arcpy.SelectLayerByAttribute_management(lcpEquipment, 'NEW_SELECTION', "equipment_type = 32") # gets only 1x32 splitters
-    intersectedEquipment = arcpy.Intersect_analysis([spliceEquipment, g5Splices], f'{lcpNameFixed}_1x32_G5N_Splitters','','','POINT')
-    ws['E125'] = int(arcpy.GetCount_management(intersectedEquipment)[0])
-
-    # Channell Reel End Enclosure (Green Hornet G5, (4) 24ct splice trays) - total G5 sized splice enclosures with type RE, MCA, or NAP MCA (for cell E126)
-    g5SplicesPared = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "splicesize = 'G5N' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')")
-    ws['E126'] = int(arcpy.GetCount_management(g5SplicesPared)[0])
-
-    # Channell Drop Terminal Enclosure (Green Hornet G5 (1) 24ct splice tray) - total G5 enclosures with type NAP (for cell E127)
-    g5SplicesNAP= arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "splicesize = 'G5N' AND spliceenclosuretype = 'NAP'")
-    ws['E127'] = int(arcpy.GetCount_management(g5SplicesNAP)[0])
-
-    # Aerial Hanging Bracket for G5/G6 Enclosure - total splice enclosures that have environment aerial (for cell E128)
-    aerSplices = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "placementtype = 'AER'")
-    ws['E128'] = int(arcpy.GetCount_management(aerSplices)[0])
-
-    # Pole Mount Bracket for FOSC 450 - total qty of FOSC450 enclosures with enviroment aerial (for cell E131)
-    ws['E131'] = 0 # don't believe this is attributed correctly yet
+    writeCells(evaluateRules(rules, lcpTables, section='splices'))
 def structures():
     '''
-    Various calculations for structures.
-    :param lcpNameFixed: LCP name that removes any illegal chars (- particularly) done in main()
+    Various calculations for structures. Communications huts (E88) are pending attribution in database.
     :return: None
     '''
     print('Fetching structures...')
-    arcpy.env.workspace = scratch
-    arcpy.env.overwriteOutput = True
-
-    # Get all risers within LCP boundary of interest (for cell E53)
-    ws['E53'] = int(arcpy.GetCount_management(lcpRisers)[0])
-
-    # Install Cable Marker = to qty of all vaults + all splice closures marked as RE, MCA, and MCANAP that are underground environment (for cell E80)
-    allVaults = arcpy.SelectLayerByAttribute_management(lcpStructures, 'NEW_SELECTION', "structure_size = '2'")
-    allUGSplices = arcpy.SelectLayerByAttribute_management(lcpSplices, 'NEW_SELECTION', "placementtype = 'UG' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')")
-    ws['E80'] = math.ceil(int(arcpy.GetCount_management(allVaults)[0]) + int(arcpy.GetCount_management(allUGSplices)[0]))
-
-    # Install Communications Hut = total # of huts proposed in this cabinet area (for cell E88). Pending attribution in database.
-
-    # Install Active 24RU/17RU or GPON Cabinet - total # of cabinets proposed in this area (for cell E89)
-    ws['E89'] = int(arcpy.GetCount_management(lcpCabs)[0])
-
-    # Channell Pedestal 12x12x25" - Total of Medium peds (for cell E110)
-    mediumPeds = arcpy.SelectLayerByAttribute_management(lcpStructures, 'NEW_SELECTION', "structuretype = 'MP'")
-    ws['E110'] = int(arcpy.GetCount_management(mediumPeds)[0])
-
-    # Channell Pedestal 12x12x34" - Total of Large Peds (for cell E111)
-    largePeds = arcpy.SelectLayerByAttribute_management(lcpStructures, 'NEW_SELECTION', "structuretype = 'LP'")
-    ws['E111'] = int(arcpy.GetCount_management(largePeds)[0])
-
-    # Channell Pedestal 14x20x40" (for cell E112). No direction yet on this line item.
-
-    # Get total count of small vaults in the LCP boundary of interest (for cell E113)
-    smallVaults = arcpy.SelectLayerByAttribute_management(lcpStructures, 'NEW_SELECTION', "structuretype = 'SV'") # No features currently, and is not a domain value yet. Assume SV will denote small vaults.
-    ws['E113'] = int(arcpy.GetCount_management(smallVaults)[0])
-
-    # Get total count of medium vaults in the LCP boundary of interest (for cell E114)
-    mediumVaults = arcpy.SelectLayerByAttribute_management(lcpStructures, 'NEW_SELECTION', "structuretype = 'MV'")
-    ws['E114'] = int(arcpy.GetCount_management(mediumVaults)[0])
-
-    # Vault 30x48x36 - 1 per 17RU cabinet (for cell E115)
-    cab17RU = arcpy.SelectLayerByAttribute_management(lcpCabs, 'NEW_SELECTION', "comments = '17 RU'") # have a feeling this attribute will move to a new field in the future.
-    ws['E115'] = int(arcpy.GetCount_management(cab17RU)[0])
-
-    # Vault 36x60x36 - 1 per 24RU cabinet (for cell E116)
-    cab24RU = arcpy.SelectLayerByAttribute_management(lcpCabs, 'NEW_SELECTION',"comments = '24 RU'")
-    ws['E116'] = int(arcpy.GetCount_management(cab24RU)[0])
-
-    # Flower Pot pedestrian (10x10) - total of Drop Vault or Flower Pot (for cell E117)
-    ws['E117'] = 0 # attribution does not seem to be available for this yet.
-
-    # Vertiv OLT Cabinet with Battery and Generator Port (Medium Cabinet) = total qty of 17RU sized cabinets (for cell E137)
-    ws['E137'] = int(arcpy.GetCount_management(cab17RU)[0]) # keeping this the same value as E114 for now, until further direction.
-
-    # American Production (Large Cabinet) = Total qty of 24RU sized cabinets (for cell E138)
-    ws['E138'] = int(arcpy.GetCount_management(cab24RU)[0]) # keeping this the same value as E115 for now, until further direction.
-
-    # 1x16 Optical Splitter with SC/APC pigtails attached, only at passive cabinet = These are only for passive cabinets. We haven't nailed down quite how these will look so let's leave these at 0 (for cell E142)
-    ws['E142'] = 0
-
-    # 1x32 Optical Splitter with SC/APC pigtails attached, only at passive cabinet = These are only for passive cabinets. We haven't nailed down quite how these will look so let's leave these at 0 (for cell E143)
-    ws['E143'] = 0
+    writeCells(evaluateRules(rules, lcpTables, section='structures'))
 def fiber(lcpNameFixed):
     '''
     Various calculations for fiber features within LCP boundary of interest.
@@ -368,13 +253,9 @@ def fiber(lcpNameFixed):
     vaults = arcpy.SelectLayerByAttribute_management(lcpStructures, 'NEW_SELECTION', "structuretype = 'LV' OR structuretype = 'MV'")
 
     # Aerial placement of strand (new strand + overhead guy) = total aerial fiber footage * 1.05 + qty of down guys + total overhead guy length (for cell E42).
-    aerFiber = arcpy.SelectLayerByAttribute_management(totalFiber, 'NEW_SELECTION', "placementtype = 'AE'")
-    # will add the other summations here when downguys and overhead guys are added to the db.
-    ws['E42'] = math.ceil(float(sumField(aerFiber, 'LENGTH_GEO') *1.05))
-
+    # will add the other summations to bomRules.json when downguys and overhead guys are added to the db.
     # Lashing Fiber - total all aerial fiber footages * 1.05 + total aerial storage loops length (for cell E44)
-    aerLoops = arcpy.SelectLayerByAttribute_management(slackLoops, 'NEW_SELECTION', "placement = 'AE'")
-    ws['E44'] = math.ceil((sumField(aerFiber, 'LENGTH_GEO') * 1.05) + sumField(aerLoops, 'loop_length'))
+    writeCells(evaluateRules(rules, lcpTables, section='fiber'))
 
 
     # Cable sizes (24, 48, 96, 144, 288, etc) (for cells E102 - E107)
@@ -482,31 +363,52 @@ def fiberCalcs(fibersize):
             return result
         except ZeroDivisionError:
             return 0
+############# Batch BOMs #############
+def batchBOMs(lcps, backend=None):
+    '''
+    Single pass alternative to running getLCPFeatures() per LCP. Every layer is joined against all requested LCP boundaries at once,
+    tagged with its cab_id, and each LCP's cells are computed from that one partitioned result (see bomEngine.py).
+    :param lcps: list of raw lcp names
+    :param backend: geometry backend, defaults to arcpy against scratch.gdb
+    :return: None
+    '''
+    print(f'Collecting features for {len(lcps)} LCPs...')
+    backend = backend or arcpyBackend(scratch)
+    allCells = batchCells(backend, lcps)
+    for lcp, cells in allCells.items():
+        print(f'Writing {lcp} BOM')
+        writeCells(cells)
+        outfile = f"{outpath}\\{lcp}_BOM_{date.strftime('%Y%m%d')}.xlsx"
+        wb.save(outfile)
+    print('\n')
 ############# Main #############
-def main(): # lcp will need to be var in main to pass through script.
+def main(batch=False): # lcp will need to be var in main to pass through script.
     start = time.time()
     # prep functions
     # downloadGDB()
-    # unzip()
     # clear_gdb()
     # transfer()
     # Create BOMs
     lcps = ['ESC-C02', 'ESC-C04']
-    for lcp in lcps:
-        print(f'Starting {lcp} BOM Creation')
-        print('--------------')
-        lcpNameFixed = lcp.replace('-', '_')
-        getLCPFeatures(lcp, lcpNameFixed)
-        addresses(lcpNameFixed)
-        dropFiber(lcpNameFixed)
-        conduit(lcpNameFixed)
-        spliceClosures(lcpNameFixed)
-        structures()
-        fiber(lcpNameFixed)
-        # Save outfile, exports to outpath location
-        outfile = f"{outpath}\\{lcp}_BOM_{date.strftime('%Y%m%d')}.xlsx"
-        wb.save(outfile)
-        print('\n')
+    if batch:
+        batchBOMs(lcps)
+    else:
+        for lcp in lcps:
+            print(f'Starting {lcp} BOM Creation')
+            print('--------------')
+            lcpNameFixed = lcp.replace('-', '_')
+            getLCPFeatures(lcp, lcpNameFixed)
+            addresses(lcpNameFixed)
+            dropFiber(lcpNameFixed)
+            readLCPTables(lcpNameFixed)
+            conduit()
+            spliceClosures()
+            structures()
+            fiber(lcpNameFixed)
+            # Save outfile, exports to outpath location
+            outfile = f"{outpath}\\{lcp}_BOM_{date.strftime('%Y%m%d')}.xlsx"
+            wb.save(outfile)
+            print('\n')
     end = time.time()
     print(f'Total Script Duration (minutes) = {(end - start) / 60}')
 if __name__ == '__main__':
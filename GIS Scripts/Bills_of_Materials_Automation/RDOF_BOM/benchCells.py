@@ -0,0 +1,261 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+from collections import Counter
+import pandas as pd
+from bomRules import loadRules, evaluateRules
+from bomEngine import coincident
+'''
+Script - benchCells
+
+Description:
+    Old vs new check of the RDOF_BOM conduit/splices/structures cells and the fiber() strand/lashing cells on synthetic
+    LCP tables.
+        old - conduit(), spliceClosures(), structures() and fiber() as they were written by hand before bomRules.json: the same
+              SQL, the same sumField() truncation, math.ceil(sumField(...) * 1.07) for E118/E119, E80 as the ceil of the
+              vault count plus the UG splice count, E125 as the count of the Intersect of 1x32 splitters with G5N
+              splices and E42/E44 as the ceil of aerial fiber x 1.05 (plus aerial slack loops for E44). Written out here as plain row passes, or with --arcpy run as the real SelectLayerByAttribute /
+              GetCount / Intersect calls on the synthetic tables written to in_memory.
+              Nothing in the old path reads bomRules.json, so a cell copied into the JSON wrong shows up as a difference.
+        new - evaluateRules() over the in memory tables, with on_g5n from coincident(), what readLCPTables() feeds.
+    The tables are built from the values the old SQL tests for plus values it doesn't (other codes, nulls), not from
+    the rules. Splices sit on distinct points, splitters either exactly on a splice or well away from all of them, so a
+    splitter meets at most one G5N splice and the Intersect pair count is a splitter count.
+    Cells have to match exactly, the script exits 1 if any differ.
+    Also checks coincident() (E125, splitters on G5N splices) against a brute force distance check, with pairs placed just
+    inside and just outside the tolerance and across grid cell edges.
+
+Usage:
+    python benchCells.py [--rows 20000] [--seed 0] [--arcpy]
+'''
+SECTIONS = ('conduit', 'splices', 'structures', 'fiber')
+rules = [rule for rule in loadRules(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bomRules.json'))
+         if rule.get('section') in SECTIONS]
+# default XYTolerance of a geographic spatial reference, in degrees
+TOLERANCE = 8.983152841195215e-09
+
+def syntheticTables(rows, rng):
+    '''
+    {layer: DataFrame} of rows rows per layer, lengths and sizes are random with a few nulls. SpliceClosure and
+    FiberEquipment carry SHAPE@XY.
+    '''
+    def pick(choices):
+        return [rng.choice(choices) for i in range(rows)]
+    def amounts(high):
+        return [None if rng.random() < 0.02 else round(rng.uniform(0, high), 2) for i in range(rows)]
+    splices = [(-100. + (i % 1000) * 0.01, 30. + (i // 1000) * 0.01) for i in range(rows)]
+    equipment = [splices[rng.randrange(rows)] if rng.random() < 0.5 else (rng.uniform(-110, -105), rng.uniform(40, 45))
+                 for i in range(rows)]
+    return {
+        'Conduit': pd.DataFrame({'dropsonly': pick(['Y', 'N', None]), 'duct_diameter': pick([1, 2, 3, None]),
+                                 'LENGTH_GEO': amounts(500)}),
+        'Plow': pd.DataFrame({'LENGTH_GEO': amounts(500)}),
+        'FiberCable': pd.DataFrame({'placementtype': pick(['AE', 'AER', 'UG', None]), 'LENGTH_GEO': amounts(500)}),
+        'SlackLoop': pd.DataFrame({'placement': pick(['AE', 'UG', None]), 'loop_length': amounts(100)}),
+        'SpliceClosure': pd.DataFrame({'spliceenclosuretype': pick(['NAP', 'NAPMCA', 'RE', 'MCA', 'BUTT', None]),
+                                       'splicesize': pick(['G5N', 'G6', 'G4', None]),
+                                       'placementtype': pick(['UG', 'AER', 'AE', None]),
+                                       'cable_size': amounts(288), 'hhp_count': amounts(32), 'SHAPE@XY': splices}),
+        'FiberEquipment': pd.DataFrame({'equipment_type': pick([32, 16, 8, None]), 'SHAPE@XY': equipment}),
+        'Riser': pd.DataFrame({'riser_type': pick(['POLE', None])}),
+        'Structure': pd.DataFrame({'structure_size': pick(['2', '1', None]),
+                                   'structuretype': pick(['MP', 'LP', 'SV', 'MV', 'LV', 'HH', None])}),
+        'Proposed_Cabinets': pd.DataFrame({'comments': pick(['17 RU', '24 RU', 'GPON', '', None])}),
+    }
+def sumField(rows, field):
+    '''
+    RDOF_BOM.sumField() over row dicts: nulls skipped, the total truncated.
+    '''
+    return math.ceil(int(sum(row[field] for row in rows if not pd.isna(row[field]))))
+def oldCells(tables):
+    '''
+    The hand written conduit(), spliceClosures(), structures() and fiber() with each SelectLayerByAttribute as a row filter.
+    SQL comparisons never pass on null, so every test below is False for None.
+    '''
+    t = dict((layer, df.to_dict('records')) for layer, df in tables.items())
+    conduit, splices, equipment = t['Conduit'], t['SpliceClosure'], t['FiberEquipment']
+    structures, cabs = t['Structure'], t['Proposed_Cabinets']
+    ws = {}
+    # conduit()
+    ws['E65'] = sumField([x for x in conduit if x['dropsonly'] == 'Y'], 'LENGTH_GEO')
+    ws['E67'] = sumField(conduit, 'LENGTH_GEO')
+    ws['E68'] = sumField(t['Plow'], 'LENGTH_GEO')
+    ws['E118'] = math.ceil(sumField([x for x in conduit if x['duct_diameter'] == 1], 'LENGTH_GEO') * 1.07)
+    ws['E119'] = math.ceil(sumField([x for x in conduit if x['duct_diameter'] == 2], 'LENGTH_GEO') * 1.07)
+    # spliceClosures()
+    ws['E90'] = len(splices)
+    # "spliceenclosuretype <> 'NAP'"
+    noNaps = [x for x in splices if not pd.isna(x['spliceenclosuretype']) and x['spliceenclosuretype'] != 'NAP']
+    onlyNaps = [x for x in splices if x['spliceenclosuretype'] == 'NAP']
+    ws['E91'] = sumField(noNaps, 'cable_size') + sumField(onlyNaps, 'hhp_count')
+    # "splicesize='G6' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')"
+    ws['E124'] = len([x for x in splices if x['splicesize'] == 'G6' and (x['spliceenclosuretype'] == 'NAPMCA' or
+                                                                         x['spliceenclosuretype'] == 'RE' or x['spliceenclosuretype'] == 'MCA')])
+    # Intersect_analysis([equipment_type = 32, splicesize = 'G5N'], 'POINT'), one output point per coincident pair
+    g5n = Counter(x['SHAPE@XY'] for x in splices if x['splicesize'] == 'G5N')
+    ws['E125'] = sum(g5n[x['SHAPE@XY']] for x in equipment if x['equipment_type'] == 32)
+    # "splicesize = 'G5N' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')"
+    ws['E126'] = len([x for x in splices if x['splicesize'] == 'G5N' and (x['spliceenclosuretype'] == 'NAPMCA' or
+                                                                          x['spliceenclosuretype'] == 'RE' or x['spliceenclosuretype'] == 'MCA')])
+    ws['E127'] = len([x for x in splices if x['splicesize'] == 'G5N' and x['spliceenclosuretype'] == 'NAP'])
+    ws['E128'] = len([x for x in splices if x['placementtype'] == 'AER'])
+    ws['E131'] = 0
+    # structures()
+    ws['E53'] = len(t['Riser'])
+    allVaults = [x for x in structures if x['structure_size'] == '2']
+    allUGSplices = [x for x in splices if x['placementtype'] == 'UG' and (x['spliceenclosuretype'] == 'NAPMCA' or
+                                                                         x['spliceenclosuretype'] == 'RE' or x['spliceenclosuretype'] == 'MCA')]
+    ws['E80'] = math.ceil(len(allVaults) + len(allUGSplices))
+    ws['E89'] = len(cabs)
+    ws['E110'] = len([x for x in structures if x['structuretype'] == 'MP'])
+    ws['E111'] = len([x for x in structures if x['structuretype'] == 'LP'])
+    ws['E113'] = len([x for x in structures if x['structuretype'] == 'SV'])
+    ws['E114'] = len([x for x in structures if x['structuretype'] == 'MV'])
+    cab17RU = [x for x in cabs if x['comments'] == '17 RU']
+    cab24RU = [x for x in cabs if x['comments'] == '24 RU']
+    ws['E115'] = len(cab17RU)
+    ws['E116'] = len(cab24RU)
+    ws['E117'] = 0
+    ws['E137'] = len(cab17RU)
+    ws['E138'] = len(cab24RU)
+    ws['E142'] = 0
+    ws['E143'] = 0
+    # fiber()
+    aerFiber = [x for x in t['FiberCable'] if x['placementtype'] == 'AE']
+    aerLoops = [x for x in t['SlackLoop'] if x['placement'] == 'AE']
+    ws['E42'] = math.ceil(float(sumField(aerFiber, 'LENGTH_GEO') * 1.05))
+    ws['E44'] = math.ceil((sumField(aerFiber, 'LENGTH_GEO') * 1.05) + sumField(aerLoops, 'loop_length'))
+    return ws
+def newCells(tables):
+    '''
+    readLCPTables() + evaluateRules(): on_g5n from coincident(), then every section in one grouped scan per layer.
+    '''
+    tables = dict(tables)
+    splices = tables['SpliceClosure']
+    tables['FiberEquipment'] = tables['FiberEquipment'].assign(
+        on_g5n=coincident(tables['FiberEquipment'], splices[splices['splicesize'] == 'G5N'], TOLERANCE))
+    return evaluateRules(rules, tables)
+def writeTables(tables):
+    '''
+    Writes the synthetic tables to in_memory for the --arcpy run, SHAPE@XY layers as point feature classes in WGS84.
+    '''
+    import arcpy
+    paths = {}
+    for layer, df in tables.items():
+        name = 'bench_' + layer
+        path = 'in_memory\\' + name
+        if arcpy.Exists(path):
+            arcpy.Delete_management(path)
+        if 'SHAPE@XY' in df.columns:
+            arcpy.CreateFeatureclass_management('in_memory', name, 'POINT', spatial_reference=arcpy.SpatialReference(4326))
+        else:
+            arcpy.CreateTable_management('in_memory', name)
+        fields = [f for f in df.columns if f != 'SHAPE@XY']
+        for field in fields:
+            values = [v for v in df[field] if not pd.isna(v)]
+            arcpy.AddField_management(path, field, 'DOUBLE' if values and isinstance(values[0], (int, float)) else 'TEXT')
+        with arcpy.da.InsertCursor(path, list(df.columns)) as cursor:
+            for row in df.itertuples(index=False):
+                cursor.insertRow([None if not isinstance(v, tuple) and pd.isna(v) else v for v in row])
+        paths[layer] = path
+    return paths
+def arcpyCells(paths):
+    '''
+    The hand written conduit(), spliceClosures(), structures() and fiber() calls on the in_memory tables.
+    '''
+    import arcpy
+    arcpy.env.overwriteOutput = True
+    def view(layer):
+        return arcpy.MakeTableView_management(paths[layer], 'bench_view_' + layer) if layer not in ('SpliceClosure', 'FiberEquipment') \
+            else arcpy.MakeFeatureLayer_management(paths[layer], 'bench_view_' + layer)
+    def select(layer, where):
+        return arcpy.SelectLayerByAttribute_management(views[layer], 'NEW_SELECTION', where)
+    def sumField(fc, field):
+        return math.ceil(int(sum(row[0] for row in arcpy.da.SearchCursor(fc, [field]) if row[0] is not None)))
+    def count(fc):
+        return int(arcpy.GetCount_management(fc)[0])
+    views = dict((layer, view(layer)) for layer in paths)
+    totalConduit, lcpSplices, lcpEquipment = views['Conduit'], views['SpliceClosure'], views['FiberEquipment']
+    ws = {}
+    ws['E65'] = sumField(select('Conduit', "dropsonly = 'Y'"), 'LENGTH_GEO')
+    ws['E67'] = sumField(paths['Conduit'], 'LENGTH_GEO')
+    ws['E68'] = sumField(paths['Plow'], 'LENGTH_GEO')
+    ws['E118'] = math.ceil(sumField(select('Conduit', "duct_diameter = 1"), 'LENGTH_GEO') * 1.07)
+    ws['E119'] = math.ceil(sumField(select('Conduit', "duct_diameter = 2"), 'LENGTH_GEO') * 1.07)
+    ws['E90'] = count(paths['SpliceClosure'])
+    noNapsSum = sumField(select('SpliceClosure', "spliceenclosuretype <> 'NAP'"), 'cable_size')
+    NapsSum = sumField(select('SpliceClosure', "spliceenclosuretype = 'NAP'"), 'hhp_count')
+    ws['E91'] = noNapsSum + NapsSum
+    ws['E124'] = count(select('SpliceClosure', "splicesize='G6' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')"))
+    g5Splices = select('SpliceClosure', "splicesize = 'G5N'")
+    spliceEquipment = select('FiberEquipment', "equipment_type = 32")
+    ws['E125'] = count(arcpy.Intersect_analysis([spliceEquipment, g5Splices], 'in_memory\\bench_1x32_G5N_Splitters', '', '', 'POINT'))
+    ws['E126'] = count(select('SpliceClosure', "splicesize = 'G5N' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')"))
+    ws['E127'] = count(select('SpliceClosure', "splicesize = 'G5N' AND spliceenclosuretype = 'NAP'"))
+    ws['E128'] = count(select('SpliceClosure', "placementtype = 'AER'"))
+    ws['E131'] = 0
+    ws['E53'] = count(paths['Riser'])
+    allVaults = count(select('Structure', "structure_size = '2'"))
+    allUGSplices = count(select('SpliceClosure', "placementtype = 'UG' AND (spliceenclosuretype = 'NAPMCA' OR spliceenclosuretype = 'RE' OR spliceenclosuretype = 'MCA')"))
+    ws['E80'] = math.ceil(allVaults + allUGSplices)
+    ws['E89'] = count(paths['Proposed_Cabinets'])
+    for cell, code in [('E110', 'MP'), ('E111', 'LP'), ('E113', 'SV'), ('E114', 'MV')]:
+        ws[cell] = count(select('Structure', "structuretype = '{}'".format(code)))
+    ws['E115'] = ws['E137'] = count(select('Proposed_Cabinets', "comments = '17 RU'"))
+    ws['E116'] = ws['E138'] = count(select('Proposed_Cabinets', "comments = '24 RU'"))
+    ws['E117'] = ws['E142'] = ws['E143'] = 0
+    aerFiber = select('FiberCable', "placementtype = 'AE'")
+    ws['E42'] = math.ceil(float(sumField(aerFiber, 'LENGTH_GEO') * 1.05))
+    aerLoops = select('SlackLoop', "placement = 'AE'")
+    ws['E44'] = math.ceil((sumField(aerFiber, 'LENGTH_GEO') * 1.05) + sumField(aerLoops, 'loop_length'))
+    return ws
+def checkCoincident(rng, pairs=2000, tolerance=0.001):
+    '''
+    coincident() vs a brute force distance check. Half the points sit just inside the tolerance of a splice, half just
+    outside, at random positions so plenty straddle grid cell (and rounding) edges.
+    :return: number of mismatches
+    '''
+    splices, points = [], []
+    for i in range(pairs):
+        x, y = rng.uniform(-100, -90), rng.uniform(30, 40)
+        angle = rng.uniform(0, 2 * math.pi)
+        reach = tolerance * (0.99 if i % 2 else 1.01)
+        splices.append((x, y))
+        points.append((x + reach * math.cos(angle), y + reach * math.sin(angle)))
+    found = coincident(pd.DataFrame({'SHAPE@XY': points}), pd.DataFrame({'SHAPE@XY': splices}), tolerance)
+    brute = [any(math.hypot(p[0] - s[0], p[1] - s[1]) <= tolerance for s in splices) for p in points]
+    return sum(1 for a, b in zip(found, brute) if a != b)
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+def main(rows, seed, useArcpy):
+    rng = random.Random(seed)
+    tables = syntheticTables(rows, rng)
+    print('{} rows per layer, {} layers, {} rules'.format(rows, len(tables), len(rules)))
+    if useArcpy:
+        old, oldTime = timed(arcpyCells, writeTables(tables))
+        label = 'old (hand written selections, GetCount/sumField)'
+    else:
+        old, oldTime = timed(oldCells, tables)
+        label = 'old (hand written cells, one row pass each)'
+    new, newTime = timed(newCells, tables)
+    print('{:<58}{:8.3f} s'.format(label, oldTime))
+    print('{:<58}{:8.3f} s  ({:.1f}x)'.format('new (evaluateRules, one grouped scan per layer)', newTime, oldTime / max(newTime, 1e-9)))
+    differ = sorted(cell for cell in set(old) | set(new) if old.get(cell) != new.get(cell))
+    for cell in differ:
+        print('  {} old {} new {}'.format(cell, old.get(cell), new.get(cell)))
+    print('cells: {} checked, {} differ'.format(len(set(old) | set(new)), len(differ)))
+    misses = checkCoincident(rng)
+    print('coincident(): {} mismatches against brute force'.format(misses))
+    return 1 if differ or misses else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--arcpy', action='store_true', help='run the real per cell geoprocessing calls (needs ArcGIS)')
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.seed, args.arcpy))
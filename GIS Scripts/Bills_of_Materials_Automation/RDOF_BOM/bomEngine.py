@@ -0,0 +1,446 @@
+import os
+import math
+import pandas as pd
+from bomRules import loadRules, evaluateRules
+from polygonIndex import cachedIndex, layerXY
+try:
+    import arcpy
+except ImportError:  # memoryBackend runs without ArcGIS, i.e. synthetic fixtures on a linux box
+    arcpy = None
+
+'''
+Batch BOM engine for RDOF_BOM. Instead of re-running getLCPFeatures() per LCP, every layer is joined against all of the
+requested Proposed_OLT_LCP_Boundaries at once, each feature is tagged with its cab_id, and every LCP's cell values are
+computed from that one partitioned result.
+
+Geometry work sits behind a backend with a single partition() method:
+    arcpyBackend - runs the joins in scratch.gdb, one overlay per layer for the whole batch.
+    memoryBackend - pure python point/line overlay over in-memory fixtures, so the cell math can be checked off of ArcGIS.
+'''
+
+PLANNED = ('P', 'Planned')
+
+# How each layer is pulled into an LCP, mirrors getLCPFeatures().
+#   where: attribute filter, {field: value or tuple of values}
+#   match: CLIP (lines cut to the boundary) or a SpatialJoin match option for whole features
+#   flags: extra boolean columns, {column: (layer, where, relation)} -> True where the feature has that relation to the layer
+#   erase: (layer, where) removed from the source before the boundary overlay
+layerSpecs = {
+    'ServedAddress': {'match': 'WITHIN', 'fields': [],
+                      'flags': {'in_cbg': ('RDOF_CBG', None, 'WITHIN'),
+                                'in_overbuild': ('OVERBUILD_POLY', None, 'WITHIN'),
+                                'designed': ('DropFiber', None, 'INTERSECT')}},
+    'DropFiber': {'match': 'HAVE_THEIR_CENTER_IN', 'fields': [], 'length': True},
+    'Conduit': {'where': {'inventory_status_code': PLANNED}, 'match': 'CLIP', 'length': True,
+                'fields': ['dropsonly', 'duct_diameter']},
+    'FiberCable': {'where': {'inventory_status_code': PLANNED}, 'match': 'CLIP', 'length': True,
+                   'fields': ['placementtype', 'fibercount', 'cable_name']},
+    'Plow': {'source': 'FiberCable', 'where': {'inventory_status_code': PLANNED, 'placementtype': 'UG'},
+             'erase': ('Conduit', {'inventory_status_code': PLANNED}), 'match': 'CLIP', 'length': True, 'fields': []},
+    'SpliceClosure': {'where': {'inventory_status_code': PLANNED}, 'match': 'WITHIN',
+                      'fields': ['spliceenclosuretype', 'splicesize', 'placementtype', 'cable_size', 'hhp_count']},
+    'FiberEquipment': {'where': {'inventory_status_code': 'P'}, 'match': 'WITHIN', 'fields': ['equipment_type'],
+                       'flags': {'on_g5n': ('SpliceClosure', {'inventory_status_code': PLANNED, 'splicesize': 'G5N'}, 'INTERSECT')}},
+    'Structure': {'where': {'inventorystatuscode': 'P'}, 'match': 'WITHIN', 'fields': ['structuretype', 'structure_size']},
+    'SlackLoop': {'where': {'inventory_status_code': PLANNED}, 'match': 'HAVE_THEIR_CENTER_IN', 'fields': ['placement', 'loop_length']},
+    'Riser': {'where': {'inventory_status_code': PLANNED}, 'match': 'WITHIN', 'fields': []},
+    'Proposed_Cabinets': {'match': 'WITHIN', 'fields': ['comments']},
+}
+
+############# Filters #############
+def quote(value):
+    return "'{}'".format(value) if isinstance(value, str) else str(value)
+def whereClause(filters):
+    '''
+    Renders a {field: value or tuple of values} filter as an arcpy where clause.
+    :param filters: filter dict, or None
+    :return: SQL where clause, '' if no filter
+    '''
+    if not filters:
+        return ''
+    clauses = []
+    for field, value in filters.items():
+        if isinstance(value, tuple):
+            clauses.append('{} IN ({})'.format(field, ', '.join(quote(v) for v in value)))
+        else:
+            clauses.append('{} = {}'.format(field, quote(value)))
+    return ' AND '.join(clauses)
+def matches(feature, filters):
+    '''
+    Python side of whereClause(), True if a feature dict passes the filter.
+    '''
+    if not filters:
+        return True
+    for field, value in filters.items():
+        values = value if isinstance(value, tuple) else (value,)
+        if feature.get(field) not in values:
+            return False
+    return True
+############# Tables #############
+def readTable(fc, fields):
+    '''
+    Reads a feature class into a DataFrame with a single cursor pass, nulls kept as None/NaN.
+    :param fc: feature class, layer or tool result
+    :param fields: cursor fields, tokens like SHAPE@XY allowed
+    :return: DataFrame with one column per field
+    '''
+    return pd.DataFrame([row for row in arcpy.da.SearchCursor(fc, fields)], columns=fields)
+def coincident(points, others, tolerance):
+    '''
+    In memory Intersect_analysis(..., 'POINT') / SelectLayerByLocation INTERSECT, True where a point is within tolerance
+    of one of others. Others are hashed into a grid of tolerance sized cells, so each point only measures against the
+    points in its own and the 8 neighbouring cells.
+    :param points: DataFrame with a SHAPE@XY column
+    :param others: DataFrame with a SHAPE@XY column, same spatial reference as points
+    :param tolerance: match distance in the layers' units, the spatial reference's XYTolerance
+    :return: boolean Series aligned to points
+    '''
+    size = tolerance if tolerance > 0 else 1.
+    grid = {}
+    for xy in others['SHAPE@XY']:
+        if xy is not None:
+            grid.setdefault((math.floor(xy[0] / size), math.floor(xy[1] / size)), []).append(xy)
+    def near(xy):
+        if xy is None:
+            return False
+        col, row = math.floor(xy[0] / size), math.floor(xy[1] / size)
+        for i in (col - 1, col, col + 1):
+            for j in (row - 1, row, row + 1):
+                for other in grid.get((i, j), ()):
+                    if math.hypot(xy[0] - other[0], xy[1] - other[1]) <= tolerance:
+                        return True
+        return False
+    return points['SHAPE@XY'].map(near).astype(bool)
+############# Backends #############
+class arcpyBackend():
+    def __init__(self, scratch):
+        '''
+        :param scratch: path to scratch.gdb holding the transferred RDOF_Design layers
+        '''
+        self.scratch = scratch
+        self.boundaries = None
+    def prepBoundaries(self, cabIds):
+        '''
+        Queries out every requested LCP boundary into one fc, and copies cab_id to bom_cab_id so the tag survives joins
+        against layers that carry their own cab_id field.
+        :param cabIds: list of raw LCP names
+        :return: None
+        '''
+        arcpy.env.workspace = self.scratch
+        arcpy.env.overwriteOutput = True
+        self.boundaries = 'Batch_Boundaries'
+        arcpy.FeatureClassToFeatureClass_conversion('Proposed_OLT_LCP_Boundaries', self.scratch, self.boundaries, whereClause({'cab_id': tuple(cabIds)}))
+        arcpy.AddField_management(self.boundaries, 'bom_cab_id', 'TEXT')
+        arcpy.CalculateField_management(self.boundaries, 'bom_cab_id', '!cab_id!', 'PYTHON3')
+    def partition(self, name, spec, cabIds):
+        '''
+        Joins one layer against all batch boundaries in a single overlay.
+        :param name: layer name in layerSpecs
+        :param spec: layer spec
+        :param cabIds: list of raw LCP names
+        :return: DataFrame of the layer's features with a cab_id column
+        '''
+        if self.boundaries is None:
+            self.prepBoundaries(cabIds)
+        arcpy.env.workspace = self.scratch
+        arcpy.env.overwriteOutput = True
+        source = arcpy.MakeFeatureLayer_management(spec.get('source', name), f'{name}_Batch_Source', whereClause(spec.get('where')))
+        if 'erase' in spec:
+            eraseLayer, eraseWhere = spec['erase']
+            eraser = arcpy.MakeFeatureLayer_management(eraseLayer, f'{name}_Batch_Eraser', whereClause(eraseWhere))
+            source = arcpy.Erase_analysis(source, eraser, f'Batch_{name}_Erased')
+        out = f'Batch_{name}'
+        if spec['match'] == 'CLIP':
+            arcpy.Intersect_analysis([source, self.boundaries], out, '', '', 'LINE')
+        else:
+            arcpy.SpatialJoin_analysis(source, self.boundaries, out, 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', spec['match'])
+        fields = ['OID@', 'bom_cab_id'] + spec['fields']
+        if spec.get('length'):
+            arcpy.AddGeometryAttributes_management(out, 'LENGTH_GEODESIC', 'FEET_US')
+            fields.append('LENGTH_GEO')
+        df = readTable(out, fields).rename(columns={'OID@': 'oid', 'bom_cab_id': 'cab_id'})
+        for flag, (flagLayer, flagWhere, relation) in spec.get('flags', {}).items():
+            df[flag] = df['oid'].isin(self.selectOIDs(out, flagLayer, flagWhere, relation))
+        return df
+    def selectOIDs(self, target, flagLayer, flagWhere, relation):
+        '''
+        Object ids in target that have the given spatial relation to flagLayer. WITHIN on points is answered by a
+        polygon index (polygonIndex.py, built once per run) instead of a location selection.
+        :return: set of OIDs
+        '''
+        if relation == 'WITHIN' and arcpy.Describe(target).shapeType == 'Point':
+            index = cachedIndex(os.path.join(self.scratch, flagLayer), where=whereClause(flagWhere) or None)
+            oids = [row[0] for row in arcpy.da.SearchCursor(target, ['OID@'])]
+            inside = index.contains(layerXY(target, index.sr))
+            return {oid for oid, hit in zip(oids, inside) if hit}
+        targetLayer = arcpy.MakeFeatureLayer_management(target, f'{target}_Flag')
+        flagged = arcpy.MakeFeatureLayer_management(flagLayer, f'{flagLayer}_Flag', whereClause(flagWhere))
+        arcpy.SelectLayerByLocation_management(targetLayer, relation, flagged)
+        return {row[0] for row in arcpy.da.SearchCursor(targetLayer, ['OID@'])}
+class memoryBackend():
+    def __init__(self, layers, tolerance=0.01):
+        '''
+        Pure python backend over in-memory fixtures.
+        :param layers: {layer name: [feature dicts]}. Each feature holds its attributes plus 'shape', which is (x, y) for
+                       points, [(x, y), ...] for lines, and a closed ring [(x, y), ...] or a list of rings for polygons.
+                       A list of rings holds every part's outer ring and hole, like the rings of an arcpy Polygon, and is
+                       read even-odd. Lengths are planar, in fixture units.
+        :param tolerance: snapping distance used for INTERSECT flags and erase
+        '''
+        self.layers = layers
+        self.tolerance = tolerance
+    def partition(self, name, spec, cabIds):
+        '''
+        Same contract as arcpyBackend.partition(). Clipped lines get one row per boundary they cross, whole features go
+        to the first boundary they match. Flags are evaluated for point features only.
+        '''
+        boundaries = [(f['cab_id'], f['shape']) for f in self.layers['Proposed_OLT_LCP_Boundaries'] if f['cab_id'] in cabIds]
+        features = [f for f in self.layers.get(spec.get('source', name), []) if matches(f, spec.get('where'))]
+        if 'erase' in spec:
+            eraseLayer, eraseWhere = spec['erase']
+            erasers = [f['shape'] for f in self.layers.get(eraseLayer, []) if matches(f, eraseWhere)]
+            features = [dict(f, shape=piece) for f in features for piece in eraseLine(f['shape'], erasers, self.tolerance)]
+        rows = []
+        flagShapes = {}
+        for oid, feature in enumerate(features):
+            shape = feature['shape']
+            for cabId, boundary in boundaries:
+                if spec['match'] == 'CLIP':
+                    pieces = clipLine(shape, boundary)
+                    if not pieces:
+                        continue
+                    length = sum(lineLength(piece) for piece in pieces)
+                elif spec['match'] == 'HAVE_THEIR_CENTER_IN' and not isPoint(shape):
+                    if not pointInPolygon(lineCenter(shape), boundary):
+                        continue
+                    length = lineLength(shape)
+                else:
+                    if not pointInPolygon(shape if isPoint(shape) else lineCenter(shape), boundary):
+                        continue
+                    length = 0 if isPoint(shape) else lineLength(shape)
+                row = [oid, cabId] + [feature.get(field) for field in spec['fields']]
+                if spec.get('length'):
+                    row.append(length)
+                rows.append(row)
+                flagShapes[oid] = shape
+                if spec['match'] != 'CLIP':
+                    break
+        columns = ['oid', 'cab_id'] + spec['fields'] + (['LENGTH_GEO'] if spec.get('length') else [])
+        df = pd.DataFrame(rows, columns=columns)
+        for flag, (flagLayer, flagWhere, relation) in spec.get('flags', {}).items():
+            others = [f['shape'] for f in self.layers.get(flagLayer, []) if matches(f, flagWhere)]
+            hits = {oid for oid, shape in flagShapes.items() if self.related(shape, others, relation)}
+            df[flag] = df['oid'].isin(hits)
+        return df
+    def related(self, point, others, relation):
+        for other in others:
+            if relation == 'WITHIN':
+                if pointInPolygon(point, other):
+                    return True
+            elif isPoint(other):
+                if math.hypot(point[0] - other[0], point[1] - other[1]) <= self.tolerance:
+                    return True
+            elif pointLineDistance(point, other) <= self.tolerance:
+                return True
+        return False
+############# Geometry helpers (memoryBackend) #############
+def isPoint(shape):
+    return isinstance(shape[0], (int, float))
+def lineLength(coords):
+    return sum(math.hypot(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(coords, coords[1:]))
+def lineCenter(coords):
+    '''
+    Point halfway along a line.
+    '''
+    half = lineLength(coords) / 2
+    walked = 0
+    for (x1, y1), (x2, y2) in zip(coords, coords[1:]):
+        seg = math.hypot(x2 - x1, y2 - y1)
+        if seg and walked + seg >= half:
+            t = (half - walked) / seg
+            return (x1 + (x2 - x1) * t, y1 + (y2 - y1) * t)
+        walked += seg
+    return coords[-1]
+def polygonEdges(polygon):
+    '''
+    Every edge of a polygon, over all of its rings.
+    :param polygon: a closed ring [(x, y), ...] or a list of rings (parts and holes)
+    '''
+    for ring in ([polygon] if isPoint(polygon[0]) else polygon):
+        for edge in zip(ring, ring[1:] + ring[:1]):
+            yield edge
+def pointInPolygon(point, polygon):
+    '''
+    Ray casting test over every ring, so a point in a hole is outside and a point in any part is inside. Points on the
+    boundary may land either way.
+    '''
+    x, y = point
+    inside = False
+    for (x1, y1), (x2, y2) in polygonEdges(polygon):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+def segmentCrossings(p1, p2, polygon):
+    '''
+    Parameters along p1->p2 where the segment crosses a polygon edge, holes and other parts included.
+    '''
+    crossings = []
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    for (x1, y1), (x2, y2) in polygonEdges(polygon):
+        ex, ey = x2 - x1, y2 - y1
+        denom = dx * ey - dy * ex
+        if denom == 0:
+            continue
+        t = ((x1 - p1[0]) * ey - (y1 - p1[1]) * ex) / denom
+        u = ((x1 - p1[0]) * dy - (y1 - p1[1]) * dx) / denom
+        if 0 < t < 1 and 0 <= u <= 1:
+            crossings.append(t)
+    return crossings
+def clipLine(coords, polygon):
+    '''
+    Cuts a line to a polygon, the in-memory Intersect_analysis(..., 'LINE'). Pieces in a hole are dropped and a line
+    running across several parts comes back as one piece per part.
+    :return: list of line pieces inside the polygon
+    '''
+    pieces = []
+    current = []
+    for p1, p2 in zip(coords, coords[1:]):
+        ts = [0] + sorted(segmentCrossings(p1, p2, polygon)) + [1]
+        for t1, t2 in zip(ts, ts[1:]):
+            a = (p1[0] + (p2[0] - p1[0]) * t1, p1[1] + (p2[1] - p1[1]) * t1)
+            b = (p1[0] + (p2[0] - p1[0]) * t2, p1[1] + (p2[1] - p1[1]) * t2)
+            if pointInPolygon(((a[0] + b[0]) / 2, (a[1] + b[1]) / 2), polygon):
+                if not current:
+                    current = [a]
+                current.append(b)
+            elif current:
+                pieces.append(current)
+                current = []
+    if current:
+        pieces.append(current)
+    return pieces
+def pointLineDistance(point, coords):
+    best = float('inf')
+    px, py = point
+    for (x1, y1), (x2, y2) in zip(coords, coords[1:]):
+        dx, dy = x2 - x1, y2 - y1
+        seg = dx * dx + dy * dy
+        t = 0 if seg == 0 else max(0, min(1, ((px - x1) * dx + (py - y1) * dy) / seg))
+        best = min(best, math.hypot(px - (x1 + t * dx), py - (y1 + t * dy)))
+    return best
+def eraseLine(coords, erasers, tolerance):
+    '''
+    Segment level Erase_analysis: drops segments whose both ends lie on an eraser line.
+    :return: list of remaining line pieces
+    '''
+    pieces = []
+    current = []
+    for p1, p2 in zip(coords, coords[1:]):
+        covered = any(pointLineDistance(p1, e) <= tolerance and pointLineDistance(p2, e) <= tolerance for e in erasers)
+        if covered:
+            if current:
+                pieces.append(current)
+                current = []
+        else:
+            if not current:
+                current = [p1]
+            current.append(p2)
+    if current:
+        pieces.append(current)
+    return pieces
+############# Cell calculations #############
+# Plain count/sum cells are declared in bomRules.json and evaluated by bomRules.py. The cells below are formulas
+# over other cells or need more than a filtered count/sum.
+rules = loadRules(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bomRules.json'))
+
+def sumInt(df, field):
+    '''
+    Sums a column ignoring nulls, truncated like sumField().
+    '''
+    if df.empty:
+        return 0
+    return math.ceil(int(pd.to_numeric(df[field], errors='coerce').fillna(0).sum()))
+def addressCells(cells):
+    '''
+    Total adds passed (D7) and OLT commissioning (E153), from the D4 - D6 rule cells.
+    '''
+    totalAddsPassed = cells['D4'] + cells['D5'] + cells['D6']
+    return {'D7': totalAddsPassed, 'E153': math.ceil(totalAddsPassed / 496)}
+def dropCells(drops):
+    '''
+    Average drop length (D28).
+    '''
+    lengths = pd.to_numeric(drops['LENGTH_GEO'], errors='coerce')
+    return {'D28': math.ceil(int(lengths.sum() / len(lengths))) if len(lengths) else 0}
+def fiberSizeCells(f, vaults, largePeds, mediumPeds):
+    '''
+    E102 - E107 cable size footages, same formulas as fiberCalcs().
+    :param f: {fiber count: summed length}
+    :return: dict of cell values, 0 where a formula divides by zero
+    '''
+    formulas = {'E102': lambda: f[288] * 1.07 + (((f[288] / (f[144] + f[288])) * vaults) * 100),
+                'E103': lambda: f[144] * 1.07 + (((f[144] / (f[144] + f[288])) * vaults) * 100),
+                'E104': lambda: f[96] * 1.07 + (largePeds * 50),
+                'E105': lambda: f[48] * 1.07 + (((f[48] / (f[48] + f[24]) + f[12]) * mediumPeds) * 50),
+                'E106': lambda: f[24] * 1.07 + (((f[24] / (f[48] + f[24]) + f[12]) * mediumPeds) * 50),
+                'E107': lambda: f[12] * 1.07 + (((f[12] / (f[48] + f[24]) + f[12]) * mediumPeds) * 50)}
+    cells = {}
+    for cell, formula in formulas.items():
+        try:
+            cells[cell] = math.ceil(formula())
+        except ZeroDivisionError:
+            cells[cell] = 0
+    return cells
+def fiberCells(fiber, structures):
+    '''
+    Cable size footages (E102 - E107) and ground rods & clamps, unique cable names x 2 (E132).
+    '''
+    counts = pd.to_numeric(fiber['fibercount'], errors='coerce')
+    sizes = {size: sumInt(fiber[counts == size], 'LENGTH_GEO') for size in (12, 24, 48, 96, 144, 288)}
+    types = structures['structuretype']
+    cells = {'E132': int(fiber['cable_name'].nunique(dropna=False) * 2)}
+    cells.update(fiberSizeCells(sizes, int(types.isin(['LV', 'MV']).sum()), int((types == 'LP').sum()), int((types == 'MP').sum())))
+    return cells
+def formulaCells(cells, t):
+    '''
+    Every non rule cell for one LCP.
+    :param cells: rule cells already evaluated for the LCP
+    :param t: {layer name: DataFrame of that LCP's features}
+    :return: {cell: value}
+    '''
+    formulas = {}
+    formulas.update(addressCells(cells))
+    formulas.update(dropCells(t['DropFiber']))
+    formulas.update(fiberCells(t['FiberCable'], t['Structure']))
+    return formulas
+def lcpCells(t):
+    '''
+    Every BOM cell for one LCP.
+    :param t: {layer name: DataFrame of that LCP's features}
+    :return: {cell: value}
+    '''
+    cells = evaluateRules(rules, t)
+    cells.update(formulaCells(cells, t))
+    return cells
+############# Batch #############
+def partitionLayers(backend, cabIds, specs=layerSpecs):
+    '''
+    Runs one overlay per layer for the whole batch.
+    :return: {layer name: DataFrame tagged with cab_id}
+    '''
+    return {name: backend.partition(name, spec, cabIds) for name, spec in specs.items()}
+def batchCells(backend, cabIds):
+    '''
+    Partitions every layer once, evaluates the rule cells for all LCPs in one grouped scan per layer, then adds each
+    LCP's formula cells from its slice of the result.
+    :param backend: arcpyBackend or memoryBackend
+    :param cabIds: list of raw LCP names
+    :return: {cab_id: {cell: value}}
+    '''
+    tables = partitionLayers(backend, cabIds)
+    cells = evaluateRules(rules, tables, by='cab_id', keys=cabIds)
+    groups = {name: dict(tuple(df.groupby('cab_id'))) for name, df in tables.items()}
+    for cabId in cabIds:
+        lcp = {name: groups[name].get(cabId, df.iloc[0:0]) for name, df in tables.items()}
+        cells[cabId].update(formulaCells(cells[cabId], lcp))
+    return cells
@@ -0,0 +1,150 @@
+import json
+import math
+import pandas as pd
+
+'''
+Declarative BOM cell rules and their evaluator. A rule file is JSON with a list of rules, one per cell contribution:
+    cell        - template cell to write, e.g. "E124"
+    section     - BOM section the rule belongs to (addresses, conduit, splices...), lets a script evaluate one section at a time
+    layer       - table the rule reads from
+    where       - optional filter, {field: test}. A test is a value, a list of values, {"not": value(s)} or a range
+                  {"gt"/"ge"/"lt"/"le": number}. Nulls never pass a "not" test, same as SQL <>.
+    aggregate   - "count" rows or "sum" a field
+    field       - field summed by "sum"
+    truncate    - int() the aggregate before the multiplier, the way sumField() always has
+    multiplier  - optional factor applied to the aggregate
+    round       - optional "ceil" or "int" applied to the finished cell
+    value       - constant cell value instead of an aggregate
+    description - free text, what the line item is
+Rules that share a cell are added together, so a cell like E80 (vaults + UG splices) is two rules.
+
+Evaluation is compiled per layer: every rule for a layer is folded into one grouped scan, keyed on the fields the rules
+filter on, with row counts and summed fields per group. Rules are then evaluated against that group table, which is a
+handful of rows, so a layer costs O(rows) once instead of O(rules x rows).
+
+Each script folder that uses it keeps its own copy next to its own bomRules.json, the same way logging_decorator.py is
+shared.
+'''
+
+RANGES = {'gt': lambda col, n: col > n, 'ge': lambda col, n: col >= n,
+          'lt': lambda col, n: col < n, 'le': lambda col, n: col <= n}
+
+def loadRules(path):
+    '''
+    Reads a rule file.
+    :param path: path to rules .json
+    :return: list of rule dicts
+    '''
+    with open(path) as f:
+        return json.load(f)['rules']
+def isRange(test):
+    return isinstance(test, dict) and any(op in test for op in RANGES)
+def keyName(field, test):
+    '''
+    Group key for a where item. Value tests group on the raw field, range tests on a boolean column of their own.
+    '''
+    if isRange(test):
+        return '{} {}'.format(field, ' '.join('{} {}'.format(op, n) for op, n in sorted(test.items())))
+    return field
+def isIn(col, values):
+    '''
+    col.isin(values), comparing numerically when the rule values are numbers.
+    '''
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return pd.to_numeric(col, errors='coerce').isin(values)
+    return col.isin(values)
+def testColumn(col, test):
+    '''
+    Boolean mask for one where item over a group table column.
+    '''
+    if isRange(test):
+        return col == True
+    if isinstance(test, dict):
+        values = test['not'] if isinstance(test['not'], list) else [test['not']]
+        return col.notna() & ~isIn(col, values)
+    return isIn(col, test if isinstance(test, list) else [test])
+def compileLayer(df, rules, by=None):
+    '''
+    Folds every rule for one layer into a single grouped scan.
+    :param df: layer table
+    :param rules: rules that read this layer
+    :param by: optional extra group key, e.g. cab_id to evaluate many LCPs at once
+    :return: group table with the key columns, a _count column and one column per summed field
+    '''
+    work = df.copy()
+    keys = [by] if by else []
+    for rule in rules:
+        for field, test in rule.get('where', {}).items():
+            key = keyName(field, test)
+            if key in keys:
+                continue
+            if isRange(test):
+                values = pd.to_numeric(work[field], errors='coerce')
+                work[key] = pd.Series(True, index=work.index)
+                for op, n in test.items():
+                    work[key] &= RANGES[op](values, n)
+            keys.append(key)
+    sumFields = sorted({rule['field'] for rule in rules if rule.get('aggregate') == 'sum'})
+    for field in sumFields:
+        work[field] = pd.to_numeric(work[field], errors='coerce').fillna(0)
+    if not keys:
+        table = pd.DataFrame({'_count': [len(work)]})
+        for field in sumFields:
+            table[field] = [work[field].sum()]
+        return table
+    grouped = work.groupby(keys, dropna=False)
+    table = grouped.size().rename('_count').to_frame()
+    for field in sumFields:
+        table[field] = grouped[field].sum()
+    return table.reset_index()
+def finish(value, rule):
+    if rule.get('truncate'):
+        value = math.ceil(int(value))
+    if 'multiplier' in rule:
+        value = value * rule['multiplier']
+    return value
+def evaluateRules(rules, tables, section=None, by=None, keys=None):
+    '''
+    Evaluates rules against in memory layer tables.
+    :param rules: list of rule dicts
+    :param tables: {layer: DataFrame}
+    :param section: only evaluate rules in this section
+    :param by: optional column to split results on, e.g. cab_id
+    :param keys: values of by to report, missing ones come back with zeroed cells
+    :return: {cell: value}, or {key: {cell: value}} when by is given
+    '''
+    rules = [rule for rule in rules if section is None or rule.get('section') == section]
+    keys = keys if by else [None]
+    totals = {key: {} for key in keys}
+    rounding = {}
+    layers = {}
+    for rule in rules:
+        layers.setdefault(rule.get('layer'), []).append(rule)
+        if 'round' in rule:
+            rounding[rule['cell']] = rule['round']
+    for layer, layerRules in layers.items():
+        table = compileLayer(tables[layer], layerRules, by) if layer else None
+        for rule in layerRules:
+            for key in keys:
+                totals[key].setdefault(rule['cell'], 0)
+            if 'value' in rule:
+                for key in keys:
+                    totals[key][rule['cell']] += rule['value']
+                continue
+            mask = pd.Series(True, index=table.index)
+            for field, test in rule.get('where', {}).items():
+                mask &= testColumn(table[keyName(field, test)], test)
+            column = '_count' if rule['aggregate'] == 'count' else rule['field']
+            if by:
+                values = table.loc[mask].groupby(by)[column].sum()
+                for key in keys:
+                    totals[key][rule['cell']] += finish(values.get(key, 0), rule)
+            else:
+                totals[None][rule['cell']] += finish(table.loc[mask, column].sum(), rule)
+    for cells in totals.values():
+        for cell, value in cells.items():
+            if rounding.get(cell) == 'ceil':
+                cells[cell] = math.ceil(value)
+            elif rounding.get(cell) == 'int' or float(value).is_integer():
+                cells[cell] = int(value)
+    return totals if by else totals[None]
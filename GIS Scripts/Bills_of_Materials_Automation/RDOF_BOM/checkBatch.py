@@ -0,0 +1,206 @@
+import sys
+import math
+import time
+import random
+import argparse
+import pandas as pd
+from shapely.geometry import Point, LineString, Polygon, MultiPolygon
+from shapely.ops import unary_union
+from shapely.strtree import STRtree
+from bomEngine import (layerSpecs, memoryBackend, batchCells, lcpCells, coincident, matches, pointInPolygon, clipLine,
+                       lineLength)
+'''
+Script - checkBatch
+
+Description:
+    Runs the batch BOM engine on synthetic layers through memoryBackend, no ArcGIS needed, and checks every LCP's cells
+    against the per LCP path.
+        batch   - batchCells(memoryBackend(layers)), one partition per layer for every LCP at once.
+        per LCP - what getLCPFeatures() + readLCPTables() build for one LCP at a time, with shapely doing the overlays
+                  (within/covered by, line intersection, erase within the tolerance, center of line), on_g5n from
+                  coincident() against the LCP's G5N splices, then lcpCells().
+    The LCP boundaries cover the shapes the single ring overlay got wrong: an LCP with a hole and a second LCP sitting
+    in that hole, and a multipart LCP whose second part has its own hole. The CBG layer is multipart with holes too.
+    Lines wander across the parts, holes and gaps, some fiber runs down conduit for part of its length (plow), splitters
+    sit on splices and drops start on addresses.
+    A few hand worked cases (points in holes and parts, a line across a hole and a gap) are checked first.
+    The script exits 1 if a case or a cell differs.
+
+Usage:
+    python checkBatch.py [--features 400] [--seed 0]
+'''
+SIZE = 5000.
+TOLERANCE = 1e-6
+def square(x1, y1, x2, y2):
+    return [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+# {cab_id: [(outer ring, [hole rings]), ...]}
+BOUNDARIES = {
+    'ESC-C01': [(square(0, 0, SIZE, SIZE), [square(0.4 * SIZE, 0.4 * SIZE, 0.6 * SIZE, 0.6 * SIZE)])],
+    'ESC-C02': [(square(0.4 * SIZE, 0.4 * SIZE, 0.6 * SIZE, 0.6 * SIZE), [])],
+    'ESC-C03': [(square(SIZE, 0, 2 * SIZE, 0.45 * SIZE), []),
+                (square(SIZE, 0.55 * SIZE, 2 * SIZE, SIZE), [square(1.4 * SIZE, 0.7 * SIZE, 1.6 * SIZE, 0.8 * SIZE)])],
+    'ESC-C04': [(square(2 * SIZE, 0, 3 * SIZE, SIZE), [])],
+}
+CBGS = [(square(0.2 * SIZE, 0.2 * SIZE, 1.5 * SIZE, 0.9 * SIZE), [square(0.5 * SIZE, 0.3 * SIZE, 1.2 * SIZE, 0.5 * SIZE)]),
+        (square(2.2 * SIZE, 0.1 * SIZE, 2.8 * SIZE, 0.6 * SIZE), [])]
+OVERBUILD = [(square(0.7 * SIZE, 0.6 * SIZE, 2.5 * SIZE, 0.95 * SIZE), [])]
+def rings(parts):
+    '''
+    memoryBackend polygon, every outer ring and hole in one list.
+    '''
+    return [ring for outer, holes in parts for ring in [outer] + holes]
+def shapelyPolygon(parts):
+    return MultiPolygon([Polygon(outer, holes) for outer, holes in parts])
+def geometryCases():
+    '''
+    Hand worked pointInPolygon()/clipLine() results on the holed and multipart boundaries.
+    :return: list of (case, got, expected)
+    '''
+    donut, multipart = rings(BOUNDARIES['ESC-C01']), rings(BOUNDARIES['ESC-C03'])
+    acrossHole = [(0.1 * SIZE, 0.5 * SIZE), (0.9 * SIZE, 0.5 * SIZE)]
+    acrossGap = [(1.5 * SIZE, 0.1 * SIZE), (1.5 * SIZE, 0.65 * SIZE)]
+    return [('point in the hole of ESC-C01', pointInPolygon((0.5 * SIZE, 0.5 * SIZE), donut), False),
+            ('point in the ring of ESC-C01', pointInPolygon((0.3 * SIZE, 0.5 * SIZE), donut), True),
+            ('point in the 2nd part of ESC-C03', pointInPolygon((1.2 * SIZE, 0.9 * SIZE), multipart), True),
+            ('point in the gap between ESC-C03 parts', pointInPolygon((1.5 * SIZE, 0.5 * SIZE), multipart), False),
+            ('point in the hole of the 2nd part', pointInPolygon((1.5 * SIZE, 0.75 * SIZE), multipart), False),
+            ('line across the hole, pieces', len(clipLine(acrossHole, donut)), 2),
+            ('line across the hole, length', round(sum(lineLength(p) for p in clipLine(acrossHole, donut)), 6), 0.6 * SIZE),
+            ('line across the gap, pieces', len(clipLine(acrossGap, multipart)), 2),
+            ('line across the gap, length', round(sum(lineLength(p) for p in clipLine(acrossGap, multipart)), 6), 0.45 * SIZE)]
+def syntheticLayers(count, rng):
+    '''
+    {layer: [feature dicts]} in memoryBackend's format, count features per layer.
+    '''
+    def point():
+        return (rng.uniform(-0.1 * SIZE, 3.1 * SIZE), rng.uniform(-0.1 * SIZE, 1.1 * SIZE))
+    def walk(start, steps, reach):
+        coords = [start]
+        for i in range(steps):
+            angle = rng.uniform(0, 2 * math.pi)
+            coords.append((coords[-1][0] + reach * math.cos(angle), coords[-1][1] + reach * math.sin(angle)))
+        return coords
+    status = ['P', 'Planned', 'A', None]
+    layers = {'Proposed_OLT_LCP_Boundaries': [{'cab_id': cabId, 'shape': rings(parts)} for cabId, parts in BOUNDARIES.items()],
+              'RDOF_CBG': [{'shape': rings([part])} for part in CBGS],
+              'OVERBUILD_POLY': [{'shape': rings(OVERBUILD)}]}
+    layers['ServedAddress'] = [{'shape': point()} for i in range(count)]
+    # most addresses get a drop starting on them, a few drops start nowhere
+    layers['DropFiber'] = [{'shape': walk(a['shape'] if rng.random() < 0.9 else point(), rng.randint(1, 3), rng.uniform(50, 400))}
+                           for a in layers['ServedAddress'][:int(count * 0.8)]]
+    layers['Conduit'] = [{'inventory_status_code': rng.choice(status), 'dropsonly': rng.choice(['Y', 'N', None]),
+                          'duct_diameter': rng.choice([1, 2, None]), 'shape': walk(point(), rng.randint(1, 6), rng.uniform(200, 1500))}
+                         for i in range(count)]
+    layers['FiberCable'] = []
+    for i in range(count):
+        shape = walk(point(), rng.randint(1, 6), rng.uniform(200, 1500))
+        if rng.random() < 0.3:
+            # runs down a conduit for a few vertices, then leaves it
+            duct = rng.choice(layers['Conduit'])['shape']
+            shape = duct[:rng.randint(2, len(duct))]
+            shape = shape + walk(shape[-1], rng.randint(0, 3), rng.uniform(200, 1500))[1:]
+        layers['FiberCable'].append({'inventory_status_code': rng.choice(status), 'placementtype': rng.choice(['UG', 'AE', None]),
+                                     'fibercount': rng.choice([12, 24, 48, 96, 144, 288]),
+                                     'cable_name': 'CBL-{}'.format(rng.randrange(count // 4)), 'shape': shape})
+    layers['SpliceClosure'] = [{'inventory_status_code': rng.choice(status),
+                                'spliceenclosuretype': rng.choice(['NAP', 'NAPMCA', 'RE', 'MCA', None]),
+                                'splicesize': rng.choice(['G5N', 'G6', None]), 'placementtype': rng.choice(['UG', 'AER', None]),
+                                'cable_size': rng.choice([12, 48, 288, None]), 'hhp_count': rng.choice([4, 8, None]),
+                                'shape': point()} for i in range(count)]
+    layers['FiberEquipment'] = [{'inventory_status_code': rng.choice(['P', 'Planned', None]), 'equipment_type': rng.choice([32, 16]),
+                                 'shape': rng.choice(layers['SpliceClosure'])['shape'] if rng.random() < 0.6 else point()}
+                                for i in range(count)]
+    layers['Structure'] = [{'inventorystatuscode': rng.choice(['P', None]), 'structure_size': rng.choice(['2', '1', None]),
+                            'structuretype': rng.choice(['MP', 'LP', 'SV', 'MV', 'LV', None]), 'shape': point()} for i in range(count)]
+    layers['SlackLoop'] = [{'inventory_status_code': rng.choice(status), 'placement': rng.choice(['AE', 'UG', None]),
+                            'loop_length': rng.choice([50, 100, None]), 'shape': point()} for i in range(count)]
+    layers['Riser'] = [{'inventory_status_code': rng.choice(status), 'shape': point()} for i in range(count)]
+    layers['Proposed_Cabinets'] = [{'comments': rng.choice(['17 RU', '24 RU', None]), 'shape': point()} for i in range(count // 10)]
+    return layers
+def lcpTables(layers, boundary):
+    '''
+    One LCP's tables the way getLCPFeatures() and readLCPTables() build them, overlays done with shapely.
+    :param boundary: shapely polygon of the LCP
+    :return: {layer: DataFrame}
+    '''
+    def planned(name):
+        spec = layerSpecs[name]
+        return [f for f in layers[spec.get('source', name)] if matches(f, spec.get('where'))]
+    def table(name, features, extra=()):
+        fields = layerSpecs[name]['fields']
+        return pd.DataFrame([[f.get(field) for field in fields] + [f[column] for column in extra] for f in features],
+                            columns=fields + list(extra))
+    def within(name):
+        return [f for f in planned(name) if boundary.covers(Point(f['shape']))]
+    def centerIn(name):
+        return [dict(f, LENGTH_GEO=LineString(f['shape']).length) for f in planned(name)
+                if boundary.covers(LineString(f['shape']).interpolate(0.5, normalized=True))]
+    def clipped(features):
+        out = []
+        for f in features:
+            line = f['line'] if 'line' in f else LineString(f['shape'])
+            piece = line.intersection(boundary)
+            if piece.length > 0:
+                out.append(dict(f, LENGTH_GEO=piece.length))
+        return out
+    drops = [LineString(f['shape']) for f in layers['DropFiber']]
+    cbgs = [shapelyPolygon([part]) for part in CBGS]
+    overbuild = shapelyPolygon(OVERBUILD)
+    adds = []
+    for f in within('ServedAddress'):
+        p = Point(f['shape'])
+        adds.append(dict(f, designed=any(d.distance(p) <= TOLERANCE for d in drops),
+                         in_cbg=any(c.covers(p) for c in cbgs), in_overbuild=overbuild.covers(p)))
+    conduit = planned('Conduit')
+    # Plow, planned UG fiber with the planned conduit erased, within the xy tolerance like Erase_analysis
+    ducts = STRtree([LineString(f['shape']).buffer(TOLERANCE) for f in conduit])
+    plow = []
+    for f in planned('Plow'):
+        line = LineString(f['shape'])
+        plow.append(dict(f, line=line.difference(unary_union(ducts.geometries[ducts.query(line)]))))
+    splices = within('SpliceClosure')
+    equipment = within('FiberEquipment')
+    tables = {'ServedAddress': table('ServedAddress', adds, ['designed', 'in_cbg', 'in_overbuild']),
+              'DropFiber': table('DropFiber', centerIn('DropFiber'), ['LENGTH_GEO']),
+              'Conduit': table('Conduit', clipped(conduit), ['LENGTH_GEO']),
+              'FiberCable': table('FiberCable', clipped(planned('FiberCable')), ['LENGTH_GEO']),
+              'Plow': table('Plow', clipped(plow), ['LENGTH_GEO']),
+              'SpliceClosure': table('SpliceClosure', splices, ['shape']).rename(columns={'shape': 'SHAPE@XY'}),
+              'FiberEquipment': table('FiberEquipment', equipment, ['shape']).rename(columns={'shape': 'SHAPE@XY'}),
+              'Structure': table('Structure', within('Structure')),
+              'SlackLoop': table('SlackLoop', within('SlackLoop')),
+              'Riser': table('Riser', within('Riser')),
+              'Proposed_Cabinets': table('Proposed_Cabinets', within('Proposed_Cabinets'))}
+    g5n = tables['SpliceClosure'][tables['SpliceClosure']['splicesize'] == 'G5N']
+    tables['FiberEquipment']['on_g5n'] = coincident(tables['FiberEquipment'], g5n, TOLERANCE)
+    return tables
+def main(count, seed):
+    bad = 0
+    for case, got, expected in geometryCases():
+        ok = got == expected
+        bad += not ok
+        print('{:<44}{:>12}{}'.format(case, str(got), '' if ok else '  <- FAIL, expected {}'.format(expected)))
+    layers = syntheticLayers(count, random.Random(seed))
+    cabIds = list(BOUNDARIES)
+    start = time.time()
+    batch = batchCells(memoryBackend(layers, tolerance=TOLERANCE), cabIds)
+    batchTime = time.time() - start
+    start = time.time()
+    single = dict((cabId, lcpCells(lcpTables(layers, shapelyPolygon(BOUNDARIES[cabId])))) for cabId in cabIds)
+    singleTime = time.time() - start
+    print('{} features per layer, {} LCPs: batch {:.2f} s, per LCP {:.2f} s'.format(count, len(cabIds), batchTime, singleTime))
+    for cabId in cabIds:
+        cells = sorted(set(batch[cabId]) | set(single[cabId]), key=lambda c: (c[0], int(c[1:])))
+        differ = [c for c in cells if batch[cabId].get(c) != single[cabId].get(c)]
+        bad += len(differ)
+        print('{}: {} cells, {} differ'.format(cabId, len(cells), len(differ)))
+        for cell in differ:
+            print('  {} batch {} per LCP {}'.format(cell, batch[cabId].get(cell), single[cabId].get(cell)))
+    print('{} mismatches'.format(bad))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--features', type=int, default=400, help='features per layer')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.features, args.seed))
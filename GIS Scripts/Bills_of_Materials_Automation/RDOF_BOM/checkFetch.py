@@ -0,0 +1,223 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import threading
+import requests
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from driveFetch import findFile, fetchZip
+'''
+Script - checkFetch
+
+Description:
+    Runs driveFetch against a local fake of the Drive files endpoint, no Google account needed.
+        - findFile() on a drive holding --versions copies of the day's zip plus other files, served --page-size at a time.
+          The name and modifiedTime filters have to reach the server in q, every page has to be followed and the latest
+          copy picked.
+        - fetchZip() downloads a synthetic RDOF_Design gdb zip of --size-mb of tables (deflated members with data
+          descriptors like a streamed zip writer makes, and a zip64 member) and extracts it as it arrives. The fake server
+          sends at --mbps, like a download from Drive, and fetchZip() is timed against downloading the zip to disk and then
+          extracting it with zipfile, the old downloadGDB() + unzip() path.
+          A small zip written the usual way (sizes in the local headers, stored and deflated members) is fetched too.
+          Every extracted file is compared with its zip.
+        - a second fetchZip() with the same md5Checksum has to skip the download, and one with a wrong md5Checksum has to
+          fail without installing anything.
+    The script exits 1 on any mismatch.
+
+Usage:
+    python checkFetch.py [--size-mb 256] [--mbps 200] [--versions 250] [--page-size 100] [--chunk-mb 16]
+'''
+NAME = 'RDOF_Design_20210729.zip'
+class Unseekable(io.RawIOBase):
+    '''
+    Write only wrapper, zipfile then writes data descriptors after members like a streamed zip writer.
+    '''
+    def __init__(self, target):
+        self.target = target
+    def writable(self):
+        return True
+    def write(self, data):
+        return self.target.write(data)
+def syntheticZip(sizeMb):
+    '''
+    :return: zip bytes of an RDOF_Design_20210729.gdb folder, written as a stream
+    '''
+    buf = io.BytesIO()
+    block = os.urandom(64 * 1024)
+    with zipfile.ZipFile(Unseekable(buf), 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('RDOF_Design_20210729.gdb/', '')
+        size, i = 0, 0
+        while size < sizeMb * 1024 * 1024:
+            # half random (doesn't compress), half repeated (does), like gdb tables
+            data = block[:1024 * (i % 64 + 1)] * 8 + b'\x00' * 1024 * (i % 64 + 1) * 8
+            z.writestr('RDOF_Design_20210729.gdb/a{:08x}.gdbtable'.format(i), data)
+            size += len(data)
+            i += 1
+        with z.open('RDOF_Design_20210729.gdb/a00000100.spx', 'w', force_zip64=True) as f:
+            f.write(block * 16)
+    return buf.getvalue()
+def seekableZip():
+    '''
+    :return: zip bytes of a small gdb folder written to a seekable file, stored members need that to be streamed
+    '''
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr('RDOF_Small.gdb/gdb', b'\x05\x00\x00\x00' * 2)
+        z.writestr('RDOF_Small.gdb/timestamps', b'')
+        z.writestr(zipfile.ZipInfo('RDOF_Small.gdb/a00000001.gdbtable'), os.urandom(1000) * 50, compress_type=zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+class fakeDrive(BaseHTTPRequestHandler):
+    '''
+    GET /drive/v3/files filters on the name and modifiedTime in q and pages by pageSize, GET /drive/v3/files/<id> streams
+    the file at server.mbps.
+    '''
+    def log_message(self, *args):
+        pass
+    def reply(self, body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        block = 256 * 1024
+        for start in range(0, len(body), block):
+            self.wfile.write(body[start:start + block])
+            if self.server.mbps:
+                time.sleep(block * 8 / (self.server.mbps * 1e6))
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        if url.path == '/drive/v3/files':
+            server.listings.append(params)
+            q = params.get('q', '')
+            files = [f for f in server.files if "name = '{}'".format(f['name']) in q and
+                     ("modifiedTime > '" not in q or f['modifiedTime'] > q.split("modifiedTime > '")[1][:19])]
+            start = int(params.get('pageToken', 0))
+            size = int(params.get('pageSize', 100))
+            body = {'files': files[start:start + size]}
+            if start + size < len(files):
+                body['nextPageToken'] = str(start + size)
+            return self.reply(json.dumps(body).encode())
+        server.downloads += 1
+        self.reply(server.contents[url.path.rsplit('/', 1)[-1]])
+def startServer(content, versions, mbps):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), fakeDrive)
+    md5 = hashlib.md5(content).hexdigest()
+    # older copies of the day's zip, the latest (id 'latest') somewhere in the middle of the listing, and other days' zips
+    server.files = [{'id': 'old{}'.format(i), 'name': NAME, 'md5Checksum': '0' * 32, 'size': '1',
+                     'modifiedTime': '2021-07-{:02d}T{:02d}:00:00.000Z'.format(i % 28 + 1, i % 24)} for i in range(versions)]
+    server.files.insert(versions // 2, {'id': 'latest', 'name': NAME, 'md5Checksum': md5, 'size': str(len(content)),
+                                        'modifiedTime': '2021-07-29T05:00:00.000Z'})
+    server.files += [{'id': 'other{}'.format(i), 'name': 'RDOF_Design_202106{:02d}.zip'.format(i % 30 + 1),
+                      'md5Checksum': '0' * 32, 'size': '1', 'modifiedTime': '2021-07-29T06:00:00.000Z'} for i in range(versions)]
+    server.contents = {'latest': content, 'small': seekableZip()}
+    server.listings, server.downloads, server.mbps = [], 0, mbps
+    worker = threading.Thread(target=server.serve_forever)
+    worker.daemon = True
+    worker.start()
+    return server
+def oldFetch(session, baseUrl, fileId, dest, chunkSize):
+    '''
+    Download to disk, then extract, what downloadGDB() and unzip() did.
+    '''
+    path = os.path.join(dest, NAME)
+    with session.get('{}/drive/v3/files/{}'.format(baseUrl, fileId), params={'alt': 'media'}, stream=True) as r:
+        r.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in r.iter_content(chunkSize):
+                f.write(chunk)
+    with zipfile.ZipFile(path, 'r') as zipref:
+        zipref.extractall(dest)
+def mismatches(content, dest):
+    bad = 0
+    with zipfile.ZipFile(io.BytesIO(content)) as z:
+        for name in z.namelist():
+            if name.endswith('/'):
+                continue
+            path = os.path.join(dest, name)
+            if not os.path.exists(path):
+                bad += 1
+                continue
+            with open(path, 'rb') as f:
+                bad += f.read() != z.read(name)
+    return bad
+def main(sizeMb, mbps, versions, pageSize, chunkMb):
+    content = syntheticZip(sizeMb)
+    server = startServer(content, versions, mbps)
+    baseUrl = 'http://127.0.0.1:{}'.format(server.server_port)
+    session = requests.Session()
+    bad = 0
+
+    file = findFile(session, NAME, driveId='drive', since=datetime(2021, 7, 28), baseUrl=baseUrl, pageSize=pageSize)
+    found = file is not None and file['id'] == 'latest'
+    filtered = all("name = '{}'".format(NAME) in p['q'] and 'modifiedTime >' in p['q'] for p in server.listings)
+    pages = len(server.listings)
+    # without the modifiedTime filter every copy comes back, over several pages
+    unfiltered = findFile(session, NAME, baseUrl=baseUrl, pageSize=pageSize)
+    paged = unfiltered is not None and unfiltered['id'] == 'latest'
+    bad += (not found) + (not filtered) + (not paged)
+    print('findFile: {} ({} listing requests, filters {}), without since: {} ({} listing requests)'.format(
+        'found the latest copy' if found else 'picked {}  <- FAIL'.format(file and file['id']), pages,
+        'sent in q' if filtered else 'missing from q  <- FAIL',
+        'found the latest copy' if paged else 'picked {}  <- FAIL'.format(unfiltered and unfiltered['id']),
+        len(server.listings) - pages))
+
+    chunkSize = int(chunkMb * 1024 * 1024)
+    timings = {}
+    for label in ['old', 'new']:
+        dest = tempfile.mkdtemp(prefix='fetch_check_')
+        start = time.time()
+        if label == 'old':
+            oldFetch(session, baseUrl, 'latest', dest, chunkSize)
+        else:
+            fetchZip(session, file, dest, baseUrl=baseUrl, chunkSize=chunkSize)
+        timings[label] = time.time() - start
+        differ = mismatches(content, dest)
+        bad += differ
+        print('{}: {:.2f} s, {} files differ'.format('download then unzip' if label == 'old' else 'fetchZip, streamed',
+                                                     timings[label], differ))
+    print('{:.1f} MB zip, fetchZip {:.1f}x the old path'.format(len(content) / 1024. / 1024., timings['old'] / max(timings['new'], 1e-9)))
+    small = server.contents['small']
+    smallDest = tempfile.mkdtemp(prefix='fetch_check_')
+    fetchZip(session, {'id': 'small', 'name': 'RDOF_Small.zip', 'md5Checksum': hashlib.md5(small).hexdigest()}, smallDest,
+             baseUrl=baseUrl)
+    differ = mismatches(small, smallDest)
+    bad += differ
+    print('zip with stored members: {} files differ'.format(differ))
+
+    downloads = server.downloads
+    skipped = not fetchZip(session, file, dest, baseUrl=baseUrl,
+                           check=lambda: os.path.isdir(os.path.join(dest, 'RDOF_Design_20210729.gdb')))
+    skipped = skipped and server.downloads == downloads
+    bad += not skipped
+    print('same md5Checksum again: {}'.format('skipped the download' if skipped else 'downloaded again  <- FAIL'))
+
+    corrupt = tempfile.mkdtemp(prefix='fetch_check_')
+    try:
+        fetchZip(session, dict(file, md5Checksum='0' * 32), corrupt, baseUrl=baseUrl, chunkSize=chunkSize)
+        refused = False
+    except ValueError:
+        refused = not os.listdir(corrupt)
+    bad += not refused
+    print('wrong md5Checksum: {}'.format('refused, nothing installed' if refused else 'installed  <- FAIL'))
+    server.shutdown()
+    for folder in [corrupt, smallDest]:
+        shutil.rmtree(folder, ignore_errors=True)
+    print('{} mismatches'.format(bad))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=float, default=256, help='MB of tables in the zip, before compression')
+    parser.add_argument('--mbps', type=float, default=200, help='link speed of the fake server in Mbit/s, 0 for no limit')
+    parser.add_argument('--versions', type=int, default=250, help='older copies of the zip on the drive')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--chunk-mb', type=float, default=16, help='download chunk size')
+    args = parser.parse_args()
+    sys.exit(main(args.size_mb, args.mbps, args.versions, args.page_size, args.chunk_mb))
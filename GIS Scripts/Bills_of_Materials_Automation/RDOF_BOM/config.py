@@ -3,21 +3,23 @@ import pickle
 import os
 import math
 from os.path import join as join
-from googleapiclient.http import MediaIoBaseDownload
 import getpass
-from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import Request, AuthorizedSession
 import io
 import zipfile
 from openpyxl import load_workbook
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
 from openpyxl import Workbook, load_workbook
 from sys import executable
 import traceback
 from logging_decorator import makelogger,logError
+from bomEngine import *
+from scratchCache import *
+from polygonIndex import *
+from driveFetch import *
 
 root = os.path.dirname(os.path.abspath(__file__))
 inputs = join(root, 'input')
@@ -29,6 +31,8 @@ else:
     arcpy.CreateFileGDB_management(root, 'scratch.gdb')
 scratch = join(root, 'scratch.gdb')
 SCOPES = ['https://www.googleapis.com/auth/drive']
+# shared drive the daily RDOF_Design zip is posted to
+driveId = '0ALWJmYKL39C_Uk9PVA'
 date = datetime.now()
 gdb = 'RDOF_Design_{}.zip'.format(date.strftime('%Y%m%d'))
 gdbpath = os.path.join(inputs, gdb).strip('.zip') + '.gdb'
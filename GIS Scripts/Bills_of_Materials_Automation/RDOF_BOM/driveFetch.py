@@ -0,0 +1,277 @@
+import os
+import io
+import json
+import queue
+import shutil
+import struct
+import hashlib
+import threading
+import zlib
+
+'''
+Drive fetch for the daily RDOF_Design zip, without the Drive client library's small-chunk downloader.
+
+findFile() asks Drive for the file by name (and modifiedTime) in the query itself, paging through the results, instead of
+listing the whole shared drive. fetchZip() streams the file down in large chunks on one thread while the zip members are
+extracted as the bytes arrive on another (streamUnzip()), so the zip is never written to disk and read back again.
+The download's md5 is checked against Drive's md5Checksum and recorded next to the extracted copy
+(RDOF_Design_<date>.zip.json), a later run with the same checksum skips the download.
+
+All requests go through a requests session (an AuthorizedSession in RDOF_BOM.downloadGDB()), baseUrl can point at a
+fake Drive server.
+'''
+DRIVE_URL = 'https://www.googleapis.com'
+LOCAL_HEADER = b'PK\x03\x04'
+DATA_DESCRIPTOR = b'PK\x07\x08'
+CENTRAL_HEADER = b'PK\x01\x02'
+END_RECORD = b'PK\x05\x06'
+
+def findFile(session, name, driveId=None, since=None, baseUrl=DRIVE_URL, pageSize=100):
+    '''
+    Finds the latest file with a name on Drive.
+    :param session: requests session with Drive auth
+    :param name: exact file name
+    :param driveId: shared drive to search, None for My Drive
+    :param since: optional datetime (UTC), only files modified after it
+    :param baseUrl: Drive API root
+    :param pageSize: results per page
+    :return: file resource {'id', 'name', 'modifiedTime', 'md5Checksum', 'size'}, None if there is no match
+    '''
+    q = "name = '{}' and trashed = false".format(name.replace("\\", "\\\\").replace("'", "\\'"))
+    if since is not None:
+        q += " and modifiedTime > '{}'".format(since.strftime('%Y-%m-%dT%H:%M:%S'))
+    params = {'q': q, 'pageSize': pageSize, 'orderBy': 'modifiedTime desc', 'supportsAllDrives': 'true',
+              'includeItemsFromAllDrives': 'true', 'fields': 'nextPageToken, files(id, name, modifiedTime, md5Checksum, size)'}
+    if driveId:
+        params.update({'corpora': 'drive', 'driveId': driveId})
+    latest = None
+    while True:
+        r = session.get(baseUrl + '/drive/v3/files', params=params)
+        r.raise_for_status()
+        response = r.json()
+        for file in response.get('files', []):
+            if latest is None or file.get('modifiedTime', '') > latest.get('modifiedTime', ''):
+                latest = file
+        pageToken = response.get('nextPageToken')
+        if pageToken is None:
+            return latest
+        params['pageToken'] = pageToken
+class chunkReader():
+    '''
+    File-like reads over chunks coming off a queue, for streamUnzip(). None on the queue ends the stream, an exception is raised.
+    '''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b''
+        self.pos = 0
+        self.done = False
+    def fill(self):
+        chunk = self.chunks.get()
+        if chunk is None:
+            self.done = True
+        elif isinstance(chunk, Exception):
+            raise chunk
+        else:
+            self.buffer = self.buffer[self.pos:] + chunk
+            self.pos = 0
+    def read(self, n=-1):
+        '''
+        Up to n bytes (the rest of the stream when n is -1), fewer only at the end of the stream.
+        '''
+        while not self.done and (n < 0 or len(self.buffer) - self.pos < n):
+            self.fill()
+        end = len(self.buffer) if n < 0 else self.pos + n
+        data = self.buffer[self.pos:end]
+        self.pos += len(data)
+        return data
+    def readExact(self, n):
+        data = self.read(n)
+        if len(data) < n:
+            raise ValueError('Zip stream ended early')
+        return data
+    def readSome(self, n):
+        '''
+        Up to n of the buffered bytes, or of the next chunk when nothing is buffered.
+        '''
+        if self.pos == len(self.buffer) and not self.done:
+            self.fill()
+        data = self.buffer[self.pos:self.pos + n]
+        self.pos += len(data)
+        return data
+    def unread(self, n):
+        '''
+        Steps back over the last n bytes read.
+        '''
+        self.pos -= n
+def memberPath(dest, name):
+    '''
+    Output path of a zip member, refusing names that point outside dest.
+    '''
+    path = os.path.normpath(os.path.join(dest, name.replace('\\', '/')))
+    if os.path.isabs(name) or not path.startswith(os.path.normpath(dest) + os.sep):
+        raise ValueError('Unsafe path in zip: {}'.format(name))
+    return path
+def copyMember(reader, f, method, flags, compressedSize, blockSize):
+    '''
+    Copies one member's data from the stream to f, inflating deflated members.
+    :return: crc32 of the data written
+    '''
+    check = 0
+    if method == 0:
+        left = compressedSize
+        while left:
+            data = reader.readExact(min(left, blockSize))
+            check = zlib.crc32(data, check)
+            f.write(data)
+            left -= len(data)
+        return check
+    inflater = zlib.decompressobj(-15)
+    # with a data descriptor (flag 8) the sizes come after the data, inflate until the deflate stream ends
+    left = None if flags & 8 else compressedSize
+    while not inflater.eof:
+        data = reader.readSome(blockSize) if left is None else reader.readExact(min(left, blockSize))
+        if not data:
+            raise ValueError('Zip stream ended early')
+        if left is not None:
+            left -= len(data)
+        out = inflater.decompress(data)
+        check = zlib.crc32(out, check)
+        f.write(out)
+    reader.unread(len(inflater.unused_data))
+    return check
+def streamUnzip(reader, dest, blockSize=1024 * 1024):
+    '''
+    Extracts a zip from a forward-only stream by reading local file headers in order, stored and deflated members only.
+    Stored members need their sizes in the local header, deflated ones can have them in a data descriptor.
+    :param reader: chunkReader
+    :param dest: folder to extract to
+    :param blockSize: bytes handed to the decompressor at a time
+    :return: number of files extracted
+    '''
+    members = 0
+    while True:
+        signature = reader.read(4)
+        if signature in (CENTRAL_HEADER, END_RECORD):
+            # every member has been read, drain the central directory
+            reader.read()
+            return members
+        if signature != LOCAL_HEADER:
+            raise ValueError('Not a zip stream, or one streamUnzip() can\'t follow')
+        flags, method, crc, compressedSize, size, nameLen, extraLen = struct.unpack('<2xHH4xIIIHH', reader.readExact(26))
+        name = reader.readExact(nameLen).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = reader.readExact(extraLen)
+        zip64 = False
+        while len(extra) >= 4:
+            tag, length = struct.unpack('<HH', extra[:4])
+            if tag == 1:
+                zip64 = True
+                values = list(struct.unpack('<{}Q'.format(length // 8), extra[4:4 + length - length % 8]))
+                if size == 0xFFFFFFFF and values:
+                    size = values.pop(0)
+                if compressedSize == 0xFFFFFFFF and values:
+                    compressedSize = values.pop(0)
+            extra = extra[4 + length:]
+        path = memberPath(dest, name)
+        if method not in (0, 8) or (method == 0 and flags & 8 and not compressedSize):
+            raise ValueError('Zip member {} can\'t be streamed (method {}, flags {})'.format(name, method, flags))
+        if name.endswith('/'):
+            os.makedirs(path, exist_ok=True)
+            # folders can still carry an (empty) deflate stream
+            check = copyMember(reader, io.BytesIO(), method, flags, compressedSize, blockSize)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                check = copyMember(reader, f, method, flags, compressedSize, blockSize)
+            members += 1
+        if flags & 8:
+            descriptor = reader.readExact(4)
+            if descriptor == DATA_DESCRIPTOR:
+                descriptor = reader.readExact(4)
+            crc = struct.unpack('<I', descriptor)[0]
+            reader.readExact(16 if zip64 else 8)
+        if check != crc:
+            raise ValueError('CRC mismatch in zip member {}'.format(name))
+def download(session, url, chunks, digest, chunkSize=16 * 1024 * 1024, params=None):
+    '''
+    Streams a url onto a queue in chunks, updating digest as it goes. Ends the queue with None, or the exception on failure.
+    '''
+    try:
+        with session.get(url, params=params, stream=True) as r:
+            r.raise_for_status()
+            total = int(r.headers.get('Content-Length') or 0)
+            received, reported = 0, 0
+            for chunk in r.iter_content(chunkSize):
+                digest.update(chunk)
+                chunks.put(chunk)
+                received += len(chunk)
+                if total and received * 10 // total > reported:
+                    reported = received * 10 // total
+                    print('Downloading progress -> %d%% ' % (reported * 10))
+        chunks.put(None)
+    except Exception as e:
+        chunks.put(e)
+def installExtracted(tmp, dest):
+    '''
+    Moves what was extracted into tmp over dest, replacing members that are already there.
+    '''
+    for name in os.listdir(tmp):
+        target = os.path.join(dest, name)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        os.replace(os.path.join(tmp, name), target)
+    os.rmdir(tmp)
+def recordPath(dest, name):
+    return os.path.join(dest, name + '.json')
+def fetchZip(session, file, dest, baseUrl=DRIVE_URL, chunkSize=16 * 1024 * 1024, check=None):
+    '''
+    Downloads a Drive zip and extracts it into dest while it downloads. Skipped when the recorded checksum of the last
+    download of the same name matches Drive's md5Checksum and check(), if given, finds the extracted copy.
+    :param session: requests session with Drive auth
+    :param file: file resource from findFile()
+    :param dest: folder to extract to
+    :param baseUrl: Drive API root
+    :param chunkSize: download chunk size in bytes
+    :param check: optional callable returning True when the extracted copy is in place
+    :return: True if it downloaded, False if the local copy was current
+    '''
+    record = recordPath(dest, file['name'])
+    try:
+        with open(record) as f:
+            local = json.load(f)
+    except (IOError, OSError, ValueError):
+        local = {}
+    if file.get('md5Checksum') and local.get('md5Checksum') == file['md5Checksum'] and (check is None or check()):
+        print('Local copy of {} is current, skipping download'.format(file['name']))
+        return False
+    tmp = os.path.join(dest, file['name'] + '.partial')
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    # bounded so extraction falling behind holds the download back instead of buffering the whole zip in memory
+    chunks, digest = queue.Queue(maxsize=4), hashlib.md5()
+    worker = threading.Thread(target=download, args=(session, '{}/drive/v3/files/{}'.format(baseUrl, file['id']), chunks,
+                                                      digest, chunkSize, {'alt': 'media', 'supportsAllDrives': 'true'}))
+    worker.daemon = True
+    worker.start()
+    try:
+        members = streamUnzip(chunkReader(chunks), tmp)
+    except Exception:
+        # let the download thread finish so it isn't left blocked on a full queue
+        while worker.is_alive():
+            try:
+                chunks.get(timeout=1)
+            except queue.Empty:
+                pass
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    worker.join()
+    if file.get('md5Checksum') and digest.hexdigest() != file['md5Checksum']:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise ValueError('Checksum mismatch downloading {}'.format(file['name']))
+    installExtracted(tmp, dest)
+    with open(record, 'w') as f:
+        json.dump({'id': file['id'], 'md5Checksum': digest.hexdigest(), 'modifiedTime': file.get('modifiedTime')}, f, indent=2)
+    print('Download Complete, {} files extracted \n'.format(members))
+    return True
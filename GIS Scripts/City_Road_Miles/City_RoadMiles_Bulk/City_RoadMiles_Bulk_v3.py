@@ -1,6 +1,3 @@
-from config_bulk import *
-from concat_data import *
-
 '''
 Script - City Road Miles Bulk
 Created by - Colton Luttrell
@@ -12,19 +9,21 @@ Requirements:
 
 I/O:
     Input: xlsx w/ city names and states in separate columns outlined in template.
-    Output: .xlsx for CBs and city boundary road miles/hhps in state specific directory
+    Output: .parquet for CBs and city boundary road miles/hhps in state specific directory, concatenated to .xlsx/.csv at the end
 
 Notes:
     1) Takes in a city/state csv of interest cities. States parsed will create a new csv by state that goes into temp folder
     2) Will break up into different directories in output folder per state. For example if you had 4 cities in TX, and 3 in MO you'd have two directories (TX, MO) where those cities data will live.
     3) Returns data into these directories.
-    4) Once all data has been calculated and stored in their respective directories, concat_data.py runs to merge all gdbs and xlsxs into single files.
+    4) Once all data has been calculated and stored in their respective directories, concat_data.py runs to merge all gdbs and parquet results into single files.
        Removes all state specific directories to save user space.
 
     Script broken up into two sections:
     1) First parses the csv to get states where cities reside. Download all necessary census files by state to temp dir.
     2) Run calculate miles spatial analysis.
     - Loop through (2) until all states have been covered.
+    - (1) runs on a background thread up to two states ahead of (2), each state gets its own dir in temp.
+    - Census block road miles in (2) are sharded by county over blockWorkers processes (roadOverlay.py, needs numpy and shapely 2.x).
 
 
 Version History:
@@ -33,99 +32,76 @@ Version History:
     v3 - 5/25/2021 -> Added newR.close() and r.close() on lines on 63 and 92 respectively. Without this, download speeds were long running and unzipping wasn't functioning properly.
 '''
 ############################################# Start Data Prep Functions #############################################
-def make_csv(fips):
+def make_csv(fips, stateDir):
     '''
     Create parsed csv for cities in specific state
     :param fips: FIPs code for state
+    :param stateDir: state's temp dir
     :return: reduced csv for cities in specific state
     '''
     stateSpecificDF = merged[merged['fip'] == fips]
-    stateSpecificDF.to_csv(temp + '\\' + 'cities.csv', index=False)
-def download_merge_roads(fips):
+    stateSpecificDF.to_csv(os.path.join(stateDir, 'cities.csv'), index=False)
+def download_state(fips):
     '''
-    Downloads all road files for a state, merges them, move final shp to temp
-    :return: Merged road file to temp dir
+    Network half of the data prep, pulls a state's roads, CBs and places zips into the TIGER cache (tiger_cache.py).
+    Doesn't touch arcpy, so main() runs it on a background thread while earlier states are being analysed.
+    :param fips: FIPs code of state
+    :return: {'roads': [county zip paths], 'blocks': extracted dir, 'places': extracted dir}
     '''
-    allRoads = []
-    print('Downloading road shapefiles....')
-    # get all roads for state from census site using bs4 module
-    os.chdir(roadsDir)
+    print('Downloading road, CB and places shapefiles for ' + fips + '...')
+    # get all roads for state from census site using bs4 module, county zips are streamed concurrently (tiger_download.py),
+    # the index is only scraped when the state isn't cached yet
     roadSnip = 'tl_2020_' + fips
-    url = 'https://www2.census.gov/geo/tiger/TIGER2020/ROADS/'
-    r = requests.get(url)
-    soup = BeautifulSoup(r.text, 'html.parser')
-    for link in soup.find_all('a'):
-        if roadSnip in link.get_text():
-            name = link.get('href')
-            fileurl = url + name
-            newR = requests.get(fileurl)
-            open(name, 'wb').write(newR.content)
-            newR.close()
-    # unzip all the files
+    def roadUrls():
+        return [roadsUrl + name for name in list_links(make_session(downloadWorkers), roadsUrl, roadSnip)]
+    return {'roads': tigerStore.get('TIGER2020', 'ROADS', fips, roadUrls, extract=False),
+            'blocks': tigerStore.get('TIGER2010BLKPOPHU', 'TABBLOCK_POPHU', fips, [blocksUrl + 'tabblock2010_' + fips + '_pophu.zip']),
+            'places': tigerStore.get('TIGER2020', 'PLACE', fips, [placesUrl + 'tl_2020_' + fips + '_place.zip'])}
+def release_state(fips):
+    '''
+    Lets the TIGER cache evict a state's downloads again once it has been analysed.
+    '''
+    tigerStore.release('TIGER2020', 'ROADS', fips)
+    tigerStore.release('TIGER2010BLKPOPHU', 'TABBLOCK_POPHU', fips)
+    tigerStore.release('TIGER2020', 'PLACE', fips)
+def merge_roads(fips, stateDir, roadZips):
+    '''
+    Merges all road files for a state into one shp in the state's temp dir
+    :return: Merged road file to state temp dir
+    '''
+    # stream the county zips straight into one shapefile (shp_zip_reader.py), excluded road classes are dropped as they're read
     print('Merging road files, this may take a while...')
-    for shp in os.listdir(roadsDir):
-        if shp.endswith('.zip'):
-            with zipfile.ZipFile(shp, 'r') as zip_ref:
-                zip_ref.extractall(roadsDir)
-    for shp in os.listdir(roadsDir):
-        if shp.endswith('.shp'):
-            allRoads.append(shp)
-    arcpy.env.workspace = temp
-    arcpy.Merge_management(allRoads, 'All_' + fips + '_Roads.shp')
-    # delete files from roads dir once everything has been downloaded and merged
-    for shp in os.listdir(roadsDir):
-        os.remove(shp)
-def download_census_blks_places(fips):
+    dropped = [road for road in exlcudedRoads if road not in dividedClasses]
+    count = zips_to_featureclass(roadZips, os.path.join(stateDir, 'All_' + fips + '_Roads.shp'), 'MTFCC', dropped)
+    print('{} road features merged'.format(count))
+def copy_census_blks_places(stateDir, downloads):
     '''
-    Function uses requests module to download .zip from entered url and filename to output folder
-    :param fips: FIPs code of state
-    :return: files to temp dir
+    Copies the extracted CBs and places shapefiles from the TIGER cache to the state's temp dir.
+    :param stateDir: state's temp dir
+    :param downloads: output of download_state()
+    :return: files to state temp dir
     '''
-    dlDict = {'tabblock2010_' + fips + '_pophu.zip':'https://www2.census.gov/geo/tiger/TIGER2010BLKPOPHU/tabblock2010_'+ fips + '_pophu.zip',
-              'tl_2020_' + fips + '_place.zip':'https://www2.census.gov/geo/tiger/TIGER2020/PLACE/tl_2020_'+ fips + '_place.zip'}
-
-    print('Downloading CBs and places shapefiles to temp folder...')
-    for filename, url in dlDict.items():
-        r = requests.get(url, allow_redirects=True)
-        os.chdir(os.path.join(temp))
-        open(filename, 'wb').write(r.content)
-        r.close()
-        # unzip to temp dir after downloaded
-    for shp in os.listdir(temp):
-        if shp.endswith('.zip'):
-            with zipfile.ZipFile(shp, 'r') as zip_ref:
-                zip_ref.extractall(temp)
-    # Delete XML files from temp
-    for file in os.listdir(temp):
-        if file.endswith('.xml'):
-            os.remove(os.path.join(temp,file))
+    for extracted in [downloads['blocks'], downloads['places']]:
+        # XML files are left out of temp
+        for file in os.listdir(extracted):
+            if not file.endswith('.xml'):
+                shutil.copy2(os.path.join(extracted, file), stateDir)
     print('Files downloaded...\n')
 ############################################# Start Spatial Analysis Functions #############################################
 def clear_gdb():
     '''
-    Clear contents of scratch.gdb.
+    Clear contents of scratch.gdb. Cached copies are kept while their temp files are still around (see scratchCache.py).
     :return: None
     '''
     print('Clearing Workspace\n')
-    fc_list = arcpy.ListFeatureClasses()
-    fc_tables = arcpy.ListTables()
-    try:
-        for fc in fc_list:
-           arcpy.Delete_management(scratch + '\\' + fc)
-        for table in fc_tables:
-            arcpy.Delete_management(scratch + '\\' + table)
-    except TypeError:
-        pass
+    clearScratch(scratch)
 def transfer():
     '''
-    Transfer shapefiles in our directories to scratch.gdb for ease of use.
+    Transfer shapefiles in our directories to scratch.gdb for ease of use. Files already in scratch are only copied again if they changed.
     :return: None
     '''
     print('Transferring input files...\n')
-    shps = [roads['_path'], blocks['_path'], cities['_path']]
-    for shp in shps:
-        arcpy.FeatureClassToGeodatabase_conversion(shp, scratch)
-    arcpy.TableToTable_conversion(interestCities['_path'], scratch, 'Interest_Cities')
+    syncScratch(scratch, [roads['_path'], blocks['_path'], cities['_path'], (interestCities['_path'], 'Interest_Cities')])
     print('\n')
 def get_cities():
     '''
@@ -138,25 +114,21 @@ def get_cities():
     arcpy.FeatureClassToFeatureClass_conversion(joined_city, scratch, 'Cities_Polys')
     arcpy.SpatialJoin_analysis(blocks['_scratch'].strip('.shp'), 'Cities_Polys', 'CBs_in_Cities', 'JOIN_ONE_TO_ONE','KEEP_COMMON', '', 'HAVE_THEIR_CENTER_IN')
 def CleanRoads():
-    # First remove unecessary roads, then integrate S1100 and S1200 roads
-    print('Removing unwanted road/path features and integrating parallel roads...')
+    # First remove unecessary roads, then collapse divided S1100, S1200 and S1400 roads (dividedRoads.py)
+    print('Removing unwanted road/path features and collapsing divided roads...')
     S1100 = arcpy.FeatureClassToFeatureClass_conversion(roads['_scratch'].split('.shp')[0], scratch, 'S1100', "MTFCC = 'S1100'")
-    S1100Int = arcpy.Integrate_management(S1100, '150 FEET')
     S1200 = arcpy.FeatureClassToFeatureClass_conversion(roads['_scratch'].split('.shp')[0], scratch, 'S1200', "MTFCC = 'S1200'")
-    S1200Int = arcpy.Integrate_management(S1200, '80 FEET')
 
-    delCursor = arcpy.da.UpdateCursor(roads['_scratch'].split('.shp')[0], ['MTFCC'])
-    for row in delCursor:
-        for road in exlcudedRoads:
-            if row[0] == road:
-                delCursor.deleteRow()
-    del row, delCursor
-    arcpy.Intersect_analysis([roads['_scratch'].split('.shp')[0], 'Cities_Polys'], 'Roads_City_Polys_Intersect', '', '', 'LINE')
+    # excluded classes are left out with a layer query, the scratch roads aren't edited so their cached copy stays current
+    if arcpy.Exists('Roads_Kept'):
+        arcpy.Delete_management('Roads_Kept')
+    keptRoads = arcpy.MakeFeatureLayer_management(roads['_scratch'].split('.shp')[0], 'Roads_Kept',
+                                                  "MTFCC NOT IN ({})".format(', '.join("'{}'".format(road) for road in exlcudedRoads)))
+    arcpy.Intersect_analysis([keptRoads, 'Cities_Polys'], 'Roads_City_Polys_Intersect', '', '', 'LINE')
     regRoadsMerged = arcpy.Dissolve_management('Roads_City_Polys_Intersect', 'S1400_Merged', ['MTFCC', 'fip'],'','SINGLE_PART')
-    mergedRoads = arcpy.MergeDividedRoads_cartography('S1400_Merged', 'fip', '80 feet', 'regRoadsMerged')
 
-    arcpy.Merge_management([S1100Int, S1200Int, mergedRoads], 'Roads_Merged')
-    # arcpy.Merge_management([S1100Int, S1200Int, roads['_scratch'].split('.shp')[0]], 'Roads_Merged')
+    arcpy.Merge_management([S1100, S1200, regRoadsMerged], 'Roads_Divided')
+    collapseDividedRoads(os.path.join(scratch, 'Roads_Divided'), os.path.join(scratch, 'Roads_Merged'), dividedTolerances)
 def RoadMiles(fips):
     '''
     Intersect roads fc to all cities polygons, get total road miles in a city boundary, and then road miles per cb inside city.
@@ -168,10 +140,11 @@ def RoadMiles(fips):
     arcpy.Dissolve_management('Roads_City_Polys_Intersect_Round2', 'Roads_in_City_Polys', ['NAME'])
     arcpy.AddGeometryAttributes_management('Roads_in_City_Polys', 'LENGTH_GEODESIC', 'MILES_US')
 
-    # roads to CBs in city polygons
-    arcpy.Intersect_analysis(['Roads_Merged', 'CBs_in_Cities'], 'Roads_CBs_Intersect', '', '','LINE')
-    arcpy.Dissolve_management('Roads_CBs_Intersect', 'Roads_CBs_Diss', ['BLOCKID10'])
-    arcpy.AddGeometryAttributes_management('Roads_CBs_Diss', 'LENGTH_GEODESIC', 'MILES_US')
+    # roads to CBs in city polygons, sharded by county across worker processes in memory (roadOverlay.py). Roads_CBs_Diss is
+    # written as a table with the same BLOCKID10 / LENGTH_GEO fields the Intersect -> Dissolve -> AddGeometryAttributes chain left
+    cbMiles = shardedBlockMiles(readLayer(os.path.join(scratch, 'Roads_Merged')),
+                                readLayer(os.path.join(scratch, 'CBs_in_Cities'), 'BLOCKID10'), blockWorkers)
+    writeMilesTable(cbMiles, os.path.join(scratch, 'Roads_CBs_Diss'), 'BLOCKID10')
 
     # join the road miles fcs back to the Cities polygons, and the CBs polygons, make new fcs for deliverables
     joined_city_roads = arcpy.AddJoin_management('Cities_Polys','NAME','Roads_in_City_Polys', 'NAME', 'KEEP_ALL')
@@ -191,36 +164,39 @@ def RoadMiles(fips):
     deliverableFCs = ['Cities_Polygons_RoadMiles', 'CBs_in_Cities_RoadMiles', 'Roads_City_Polys_Intersect_Round2']
     newGDB = arcpy.CreateFileGDB_management(currentDir, 'city_results.gdb')
     arcpy.FeatureClassToGeodatabase_conversion(deliverableFCs, newGDB)
-def create_excel(fips):
+def write_results(fips):
     '''
-    Creates xlsx sheet from fcs
-    :return: xlsx to state dir
+    Writes the deliverable fcs' tables to parquet (concat_data.py), only with the columns that make it into the final sheets
+    :return: parquet files to state dir
     '''
-    print('Creating Excels...')
+    print('Writing results...')
     for state, fip in statesDict.items():
         if fip == fips:
             currentDir = os.path.join(outpath, state)
-    deliverableFCs = ['Cities_Polygons_RoadMiles', 'CBs_in_Cities_RoadMiles']
-    for fc in deliverableFCs:
-        arcpy.TableToExcel_conversion(fc, currentDir + '\\'+ fc + '.xlsx')
+    for fc, drop in [('Cities_Polygons_RoadMiles', cityDrop), ('CBs_in_Cities_RoadMiles', cbDrop)]:
+        write_parquet(fc, os.path.join(currentDir, fc + '.parquet'), drop)
 ############################################# Main Functions #############################################
-def data_prep(fips):
+def data_prep(fips, stateDir, downloads):
     '''
-    Collection of data prep scripts
+    Collection of data prep scripts, run once download_state() has the state's files
     :param fips: state fips
-    :return: all necessary data to temp folder for calculate road miles functions
+    :param stateDir: state's temp dir
+    :param downloads: output of download_state()
+    :return: all necessary data to state temp folder for calculate road miles functions
     '''
-    make_csv(fips)
-    download_merge_roads(fips)
-    download_census_blks_places(fips)
-def calculate_road_miles(fips):
+    make_csv(fips, stateDir)
+    merge_roads(fips, stateDir, downloads['roads'])
+    copy_census_blks_places(stateDir, downloads)
+def calculate_road_miles(fips, stateDir):
     '''
     Collection of scripts that will perform the spatial analysis portion of script.
+    :param fips: state fips
+    :param stateDir: state's temp dir, removed once done
     :return: data to output
     '''
     # set pathing, globals here as  opposed to defining in config since they'd be defined before files are made.
     global roads, blocks, cities, interestCities
-    for file in os.listdir(temp):
+    for file in os.listdir(stateDir):
         if 'Roads.shp' in file:
             roadShp = file
         elif 'pophu.shp' in file:
@@ -230,20 +206,20 @@ def calculate_road_miles(fips):
         elif '.csv' in file:
             cityList = file
     roads = {
-        '_path': os.path.join(temp, roadShp),
+        '_path': os.path.join(stateDir, roadShp),
         '_scratch': os.path.join(scratch, roadShp)
     }
     blocks = {
-        '_path': os.path.join(temp, popBlks),
+        '_path': os.path.join(stateDir, popBlks),
         '_scratch': os.path.join(scratch, popBlks)
     }
     cities = {
-        '_path': os.path.join(temp, places),
+        '_path': os.path.join(stateDir, places),
         '_scratch': os.path.join(scratch, places)
 
     }
     interestCities = {
-        '_path': os.path.join(temp, cityList),
+        '_path': os.path.join(stateDir, cityList),
         '_scratch': os.path.join(scratch, cityList)
     }
     clear_gdb()
@@ -251,28 +227,84 @@ def calculate_road_miles(fips):
     get_cities()
     CleanRoads()
     RoadMiles(fips)
-    create_excel(fips)
-    # once this function has complete, delete out temp dir for next run
-    for result in os.listdir(temp):
-            os.remove(os.path.join(temp, result))
+    write_results(fips)
+    # once this function has complete, delete out state temp dir
+    shutil.rmtree(stateDir, ignore_errors=True)
 def data_clean():
     '''
     Imports from concat_data.py to clean up directories, and produce on dir with all results.
-    :return: One gdb, and two xlsx files of all states results
+    :return: One gdb, and two xlsx/csv files of all states results
     '''
     clear_gdb()
     concat_xlsx()
     merge_gdbs()
-def main():
-    for state, fips in statesDict.items():
+def download_states(states, ready, slots):
+    '''
+    Producer for main(), downloads states in order and hands them over through the ready queue.
+    :param states: list of (state, fips)
+    :param ready: queue.Queue of (state, fips, downloads, error, seconds), None once all states are through
+    :param slots: semaphore bounding how many states can be downloaded ahead of the one being analysed
+    :return: None
+    '''
+    for state, fips in states:
+        slots.acquire()
+        start = time.time()
+        try:
+            ready.put((state, fips, download_state(fips), None, time.time() - start))
+        except Exception as e:
+            ready.put((state, fips, None, e, time.time() - start))
+            break
+    ready.put(None)
+def main(prefetch=2):
+    '''
+    Downloads run on a background thread up to prefetch states ahead of the state being analysed (all arcpy work stays
+    on the main thread), so wall time approaches max(download, compute) rather than their sum.
+    :param prefetch: states to download ahead
+    :return: None
+    '''
+    global merged, statesDict, tigerStore
+    merged, statesDict, tigerStore = setup()
+    start = time.time()
+    ready = queue.Queue()
+    slots = threading.BoundedSemaphore(prefetch + 1)
+    producer = threading.Thread(target=download_states, args=(list(statesDict.items()), ready, slots))
+    producer.daemon = True
+    producer.start()
+    timings = []
+    while True:
+        waitStart = time.time()
+        item = ready.get()
+        if item is None:
+            break
+        state, fips, downloads, error, downloadTime = item
+        if error is not None:
+            raise error
+        waitTime = time.time() - waitStart
         print('-----------------------------------------')
         print('Starting ' + state + ' cities...')
-        data_prep(fips)
+        stateDir = os.path.join(temp, fips)
+        if not os.path.exists(stateDir):
+            os.makedirs(stateDir)
+        prepStart = time.time()
+        data_prep(fips, stateDir, downloads)
         arcpy.env.workspace = scratch
-        calculate_road_miles(fips)
+        computeStart = time.time()
+        calculate_road_miles(fips, stateDir)
+        timings.append((state, downloadTime, waitTime, computeStart - prepStart, time.time() - computeStart))
+        release_state(fips)
+        slots.release()
         print(state + ' finished\n')
         print('-----------------------------------------')
+    producer.join()
     data_clean()
+    print('{:<8}{:>12}{:>12}{:>12}{:>12}'.format('State', 'Download', 'Waited', 'Prep', 'Compute'))
+    for timing in timings:
+        print('{:<8}{:>11.1f}s{:>11.1f}s{:>11.1f}s{:>11.1f}s'.format(*timing))
+    print('Total Script Duration (minutes) = {:.1f}'.format((time.time() - start) / 60))
     print('Done! Please check output folder.')
 if __name__ == '__main__':
+    # the config is imported here rather than at the top. roadOverlay's worker processes re-import this script (as
+    # __mp_main__), and they only need roadOverlay, not arcpy, the config or its setup
+    from config_bulk import *
+    from concat_data import *
     main()
@@ -0,0 +1,111 @@
+import sys
+import time
+import random
+import argparse
+from shapely.geometry import LineString, box
+from roadOverlay import overlayMiles, shardedBlockMiles, shardTasks, blockShard, workerCount
+'''
+Script - benchBlockMiles
+
+Description:
+    Statewide scaling benchmark for the census block road miles in calculate_road_miles(): shardedBlockMiles() at 1, 2, 4 ...
+    up to workerCount() processes against one overlayMiles() over every block, on a synthetic state.
+    The state is a grid of counties, each a grid of blocks keyed like BLOCKID10 (state + county + block), with a road network
+    of highways crossing county lines and short local streets, so shards have to share roads at their edges. Like TIGER edges,
+    a highway is a chain of separate short lines.
+    Miles per block have to match the single overlay, the script exits 1 if any block differs by more than 1e-9 miles.
+    Doesn't need arcpy, workers are spawned the same way RoadMiles() spawns them.
+    Every shard is also timed on its own, and the wall time for --project core counts is worked out from those times the
+    way pool.map hands shards out (biggest first, each to the next free worker) plus the pool overhead measured with one
+    worker. On a box with fewer cores than workers that projection is the only multi-core figure, the measured runs
+    just share the cores.
+
+Usage:
+    python benchBlockMiles.py [--counties 64] [--blocks 2500] [--roads 20000] [--workers 1,2,4,8] [--project 2,4,8,16] [--seed 0]
+'''
+def syntheticState(counties, blocksPerCounty, roads, rng, blockSize=0.004):
+    '''
+    :param counties: counties in the state, laid out on a square grid
+    :param blocksPerCounty: blocks per county, a square grid in each county
+    :param roads: road lines, a tenth of them in highways, the rest local streets
+    :param blockSize: block edge in degrees
+    :return: (roads, [(BLOCKID10, polygon)])
+    '''
+    side = int(counties ** 0.5 + 0.999)
+    blockSide = int(blocksPerCounty ** 0.5 + 0.999)
+    countySize = blockSide * blockSize
+    x0, y0 = -100., 35.
+    blocks = []
+    for county in range(counties):
+        cx, cy = x0 + (county % side) * countySize, y0 + (county // side) * countySize
+        for block in range(blockSide * blockSide):
+            bx, by = cx + (block % blockSide) * blockSize, cy + (block // blockSide) * blockSize
+            blocks.append(('48{:03d}{:010d}'.format(county * 2 + 1, block), box(bx, by, bx + blockSize, by + blockSize)))
+    width = side * countySize
+    lines = []
+    while len(lines) < roads:
+        x, y = rng.uniform(x0, x0 + width), rng.uniform(y0, y0 + width)
+        if len(lines) % 10 == 0:
+            # highway, 20 edges heading the same general way
+            dx, dy = rng.uniform(-1, 1) * blockSize * 3, rng.uniform(-1, 1) * blockSize * 3
+            for k in range(20):
+                nx, ny = x + dx + rng.uniform(-blockSize, blockSize), y + dy + rng.uniform(-blockSize, blockSize)
+                lines.append(LineString([(x, y), (nx, ny)]))
+                x, y = nx, ny
+            continue
+        coords = [(x, y)]
+        for k in range(rng.randint(2, 6)):
+            coords.append((coords[-1][0] + rng.uniform(-blockSize, blockSize), coords[-1][1] + rng.uniform(-blockSize, blockSize)))
+        lines.append(LineString(coords))
+    return lines[:roads], blocks
+def projectedWall(shardTimes, cores):
+    '''
+    Wall time of pool.map over shards on cores idle cores, each shard in order to the first worker that is free.
+    '''
+    free = [0.] * cores
+    for seconds in shardTimes:
+        free[free.index(min(free))] += seconds
+    return max(free)
+def main(counties, blocksPerCounty, roads, workerCounts, projectCounts, seed):
+    rng = random.Random(seed)
+    lines, blocks = syntheticState(counties, blocksPerCounty, roads, rng)
+    print('{} counties, {} blocks, {} roads, {} cores usable'.format(counties, len(blocks), len(lines), workerCount()))
+    start = time.time()
+    single = dict((key, miles) for key, miles in overlayMiles(lines, blocks).items() if miles > 0)
+    singleTime = time.time() - start
+    print('{:<34}{:9.2f} s'.format('overlayMiles, one overlay', singleTime))
+    bad = 0
+    for workers in workerCounts:
+        start = time.time()
+        sharded = shardedBlockMiles(lines, blocks, workers)
+        elapsed = time.time() - start
+        differ = sum(1 for key in set(single) | set(sharded) if abs(single.get(key, 0.) - sharded.get(key, 0.)) > 1e-9)
+        bad += differ
+        print('{:<34}{:9.2f} s  ({:.1f}x)  {} blocks differ'.format('shardedBlockMiles, {} workers'.format(workerCount(workers)),
+                                                                 elapsed, singleTime / max(elapsed, 1e-9), differ))
+    if projectCounts:
+        shardTimes = []
+        for task in shardTasks(lines, blocks):
+            start = time.time()
+            blockShard(task)
+            shardTimes.append(time.time() - start)
+        start = time.time()
+        shardedBlockMiles(lines, blocks, 1)
+        overhead = max(time.time() - start - sum(shardTimes), 0.)
+        print('{} shards, largest {:.2f} s of {:.2f} s, pool overhead {:.2f} s'.format(len(shardTimes), max(shardTimes),
+                                                                                   sum(shardTimes), overhead))
+        for cores in projectCounts:
+            wall = projectedWall(shardTimes, cores) + overhead
+            print('{:<34}{:9.2f} s  ({:.1f}x)'.format('projected, {} cores'.format(cores), wall, singleTime / max(wall, 1e-9)))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counties', type=int, default=64)
+    parser.add_argument('--blocks', type=int, default=2500, help='blocks per county')
+    parser.add_argument('--roads', type=int, default=20000)
+    parser.add_argument('--workers', default=','.join(str(n) for n in sorted(set([1, 2, 4, 8, 16, 32, workerCount()])) if n <= workerCount()))
+    parser.add_argument('--project', default='2,4,8,16', help='core counts to project the sharded wall time for, empty to skip')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.counties, args.blocks, args.roads, [int(n) for n in args.workers.split(',') if n],
+                  [int(n) for n in args.project.split(',') if n], args.seed))
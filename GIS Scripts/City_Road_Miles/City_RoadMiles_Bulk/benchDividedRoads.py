@@ -0,0 +1,122 @@
+import sys
+import math
+import time
+import random
+import argparse
+import numpy as np
+from shapely.geometry import LineString
+from dividedRoads import collapseDivided, TOLERANCES, A
+from roadOverlay import geodesicMiles
+'''
+Script - benchDividedRoads
+
+Description:
+    Synthetic network benchmark for collapseDivided() (CleanRoads()), timed at a few network sizes.
+    A network is a square of side --sizes km near 35N with:
+        S1100 - divided highways, carriageways 20 m apart (tolerance 150 ft = 46 m), gently curving, one per 2 km band
+        S1200 - divided highways running the other way, carriageways 15 m apart (80 ft = 24 m)
+        S1400 - a street grid every 400 m plus divided streets (15 m apart) on the lines between, cut into block long edges
+    Carriageways are cut into edges at different places, like TIGER edges.
+    Checks, the script exits 1 if one fails:
+        - divided classes come out at the miles of one carriageway, within 1 percent (curves make the two differ a little)
+        - grid streets, which cross everything at right angles, keep all their miles
+
+Usage:
+    python benchDividedRoads.py [--sizes 5,10,20] [--seed 0]
+'''
+LAT0 = 35.
+
+def toLonLat(xy):
+    '''
+    Local meters to lon/lat, the inverse of dividedRoads.toMeters() around LAT0.
+    '''
+    xy = np.asarray(xy, dtype=float)
+    return np.degrees(xy / (A * np.array([math.cos(math.radians(LAT0)), 1.]))) + np.array([-100., LAT0])
+
+def edges(xy, rng, low, high):
+    '''
+    A polyline in meters cut into edges of low-high meters, in lon/lat.
+    '''
+    lengths = np.r_[0., np.cumsum(np.hypot(*np.diff(xy, axis=0).T))]
+    cuts = [0.]
+    while cuts[-1] < lengths[-1]:
+        cuts.append(min(cuts[-1] + rng.uniform(low, high), lengths[-1]))
+    pieces = []
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        inside = (lengths > start) & (lengths < end)
+        at = lambda d: [np.interp(d, lengths, xy[:, 0]), np.interp(d, lengths, xy[:, 1])]
+        pieces.append(LineString(toLonLat(np.vstack([at(start), xy[inside], at(end)]))))
+    return pieces
+
+def carriageways(center, offset, rng, low, high):
+    '''
+    Both carriageways of a divided road around a centerline in meters, offset to either side, as edges.
+    '''
+    # vertex normals from the segments on either side, the centerline bends gently enough for that to stay parallel
+    d = np.diff(center, axis=0)
+    d /= np.hypot(d[:, 0], d[:, 1])[:, None]
+    tangent = np.vstack([d[:1], d[:-1] + d[1:], d[-1:]])
+    normal = np.column_stack([-tangent[:, 1], tangent[:, 0]]) / np.hypot(tangent[:, 0], tangent[:, 1])[:, None]
+    sides = [center + normal * offset / 2., center - normal * offset / 2.]
+    return [piece for side in sides for piece in edges(side, rng, low, high)]
+
+def syntheticNetwork(size, rng):
+    '''
+    :param size: side of the network in meters
+    :return: (list of (MTFCC, lon/lat line), label per feature, {label: miles of one carriageway or of the grid}),
+             labels are the class, with S1400 split into 'S1400 grid' and 'S1400 divided'
+    '''
+    features, labels, expected = [], [], {}
+    steps = np.linspace(0, size, int(size / 50) + 1)
+    for band in np.arange(1000., size, 2000.):
+        phase = rng.uniform(0, 2 * math.pi)
+        # S1100 east-west, S1200 north-south, both swinging 200 m either side over 5 km
+        wave = band + 200 * np.sin(steps / 5000. * 2 * math.pi + phase)
+        for cls, center, offset in [('S1100', np.column_stack([steps, wave]), 20.), ('S1200', np.column_stack([wave, steps]), 15.)]:
+            pieces = carriageways(center, offset, rng, 300, 800)
+            features.extend((cls, piece) for piece in pieces)
+            labels.extend([cls] * len(pieces))
+            expected[cls] = expected.get(cls, 0.) + geodesicMiles(LineString(toLonLat(center)))
+    grid = 0.
+    for line in np.arange(0., size + 1, 400.):
+        for center in [np.array([[0., line], [size, line]]), np.array([[line, 0.], [line, size]])]:
+            pieces = edges(center, rng, 400, 400)
+            features.extend(('S1400', piece) for piece in pieces)
+            labels.extend(['S1400 grid'] * len(pieces))
+            grid += sum(geodesicMiles(piece) for piece in pieces)
+        if line + 200 < size:
+            center = np.array([[0., line + 200], [size, line + 200]])
+            pieces = carriageways(center, 15., rng, 150, 400)
+            features.extend(('S1400', piece) for piece in pieces)
+            labels.extend(['S1400 divided'] * len(pieces))
+            expected['S1400 divided'] = expected.get('S1400 divided', 0.) + geodesicMiles(LineString(toLonLat(center)))
+    expected['S1400 grid'] = grid
+    return features, labels, expected
+
+def main(sizes, seed):
+    rng = random.Random(seed)
+    bad = 0
+    for size in sizes:
+        features, labels, expected = syntheticNetwork(size * 1000., rng)
+        segments = sum(len(geom.coords) - 1 for cls, geom in features)
+        start = time.time()
+        collapsed = collapseDivided(features, TOLERANCES)
+        elapsed = time.time() - start
+        print('{} km network, {} edges, {} segments: {:.2f} s'.format(size, len(features), segments, elapsed))
+        miles = {}
+        for label, kept in zip(labels, collapsed):
+            miles[label] = miles.get(label, 0.) + (geodesicMiles(kept) if kept is not None else 0.)
+        for cls in sorted(expected):
+            off = abs(miles.get(cls, 0.) - expected[cls]) / expected[cls]
+            ok = off < 1e-9 if cls == 'S1400 grid' else off < 0.01
+            bad += not ok
+            print('  {:<14} {:9.2f} mi kept, expected {:9.2f} mi ({:.2%} off){}'.format(cls, miles.get(cls, 0.), expected[cls],
+                                                                                      off, '' if ok else '  <- FAIL'))
+    return 1 if bad else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='5,10,20', help='network sides in km')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main([float(n) for n in args.sizes.split(',') if n], args.seed))
@@ -0,0 +1,153 @@
+import io
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tiger_download import make_session, list_links, download_file, download_all
+'''
+Script - checkDownload
+
+Description:
+    Runs tiger_download.py against a local stand-in for the census TIGER directory, no network needed.
+        - list_links() on a ROADS listing with --files Texas county zips and as many California ones, only the Texas ones
+          (tl_2020_48) have to come back.
+        - download_all() fetches the Texas zips one at a time and then with --workers threads, timing both. The stand-in
+          holds every request for --latency seconds, like a request to www2.census.gov.
+        - the zips are fetched again with some requests failing: a connection dropped half way through a zip, 503s before
+          a zip is sent and a 404. The dropped and 503 zips have to be retried, the 404 must not be, no .part file may be
+          left behind, and progress has to count each zip's bytes once, not the bytes of failed attempts.
+    The zips are synthetic (random shp/dbf/shx/prj members), every downloaded file is compared byte for byte with the
+    served one. The script exits 1 on any mismatch.
+
+Usage:
+    python checkDownload.py [--files 12] [--size-mb 2] [--workers 4] [--latency 0.2]
+'''
+ROADS = '/geo/tiger/TIGER2020/ROADS/'
+def syntheticZip(name, sizeMb):
+    '''
+    :return: zip bytes of a TIGER roads shapefile, random members (they don't compress, like real shp files barely do)
+    '''
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        stem = name[:-len('.zip')]
+        z.writestr(stem + '.shp', os.urandom(int(sizeMb * 1024 * 1024 * 0.7)))
+        z.writestr(stem + '.dbf', os.urandom(int(sizeMb * 1024 * 1024 * 0.25)))
+        z.writestr(stem + '.shx', os.urandom(int(sizeMb * 1024 * 1024 * 0.05)))
+        z.writestr(stem + '.prj', 'GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983"]]')
+    return buf.getvalue()
+class fakeCensus(BaseHTTPRequestHandler):
+    '''
+    GET on the ROADS folder answers an apache style listing, GET on a zip sends it. server.faults maps a zip name to what
+    its next requests get, one entry used up per request: 'drop' (half the zip, then the connection closes) or an http
+    status.
+    '''
+    def log_message(self, *args):
+        pass
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        name = self.path.rsplit('/', 1)[-1]
+        with server.lock:
+            server.requests[name] = server.requests.get(name, 0) + 1
+            fault = server.faults.get(name, []).pop(0) if server.faults.get(name) else None
+        if self.path == ROADS:
+            body = ''.join('<tr><td><a href="{0}">{0}</a></td></tr>\n'.format(n) for n in sorted(server.contents)).encode()
+            body = b'<html><body><table>\n' + body + b'</table></body></html>'
+        elif (name in server.contents and fault is None) or fault == 'drop':
+            body = server.contents[name]
+        else:
+            self.send_response(fault or 404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if fault == 'drop':
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+def startServer(contents, latency):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), fakeCensus)
+    server.contents, server.latency = contents, latency
+    server.faults, server.requests, server.lock = {}, {}, threading.Lock()
+    worker = threading.Thread(target=server.serve_forever)
+    worker.daemon = True
+    worker.start()
+    return server
+def mismatches(contents, paths):
+    bad = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            bad += f.read() != contents[os.path.basename(path)]
+    return bad
+def main(files, sizeMb, workers, latency):
+    texas = ['tl_2020_48{:03d}_roads.zip'.format(2 * i + 1) for i in range(files)]
+    california = ['tl_2020_06{:03d}_roads.zip'.format(2 * i + 1) for i in range(files)]
+    contents = dict((name, syntheticZip(name, sizeMb)) for name in texas)
+    contents.update((name, b'not a texas county') for name in california)
+    server = startServer(contents, latency)
+    roadsUrl = 'http://127.0.0.1:{}{}'.format(server.server_port, ROADS)
+    bad = 0
+
+    names = list_links(make_session(workers), roadsUrl, 'tl_2020_48')
+    listed = sorted(names) == texas
+    bad += not listed
+    print('list_links: {} links, {}'.format(len(names), 'the Texas zips' if listed else 'not the Texas zips  <- FAIL'))
+
+    urls = [roadsUrl + name for name in names]
+    timings = {}
+    for count in [1, workers]:
+        outDir = tempfile.mkdtemp(prefix='download_check_')
+        start = time.time()
+        paths = download_all(urls, outDir, workers=count)
+        timings[count] = time.time() - start
+        differ = mismatches(contents, paths)
+        bad += differ
+        print('{} worker(s): {:.2f} s, {} files differ'.format(count, timings[count], differ))
+        shutil.rmtree(outDir, ignore_errors=True)
+    print('{} zips of {:.1f} MB: {:.1f}x with {} workers'.format(len(urls), sizeMb, timings[1] / max(timings[workers], 1e-9), workers))
+
+    # failed attempts, retried with backoff
+    server.latency = 0
+    server.faults = {texas[0]: ['drop'], texas[1]: ['drop', 503], texas[2]: [503, 503]}
+    server.requests = {}
+    outDir = tempfile.mkdtemp(prefix='download_check_')
+    counted = []
+    paths = [download_file(make_session(1), url, os.path.join(outDir, name), backoff=0.01, progress=counted.append)
+             for url, name in zip(urls[:3], names[:3])]
+    differ = mismatches(contents, paths)
+    once = sum(counted) == sum(len(contents[name]) for name in names[:3])
+    retried = [server.requests.get(name) for name in names[:3]] == [2, 3, 3]
+    bad += differ + (not once) + (not retried)
+    print('dropped and 503 zips: {} files differ, retried {}, {} MB counted for {} MB of zips{}'.format(
+        differ, 'as expected' if retried else '{} times  <- FAIL'.format([server.requests.get(name) for name in names[:3]]),
+        round(sum(counted) / 1e6, 2), round(sum(len(contents[name]) for name in names[:3]) / 1e6, 2),
+        '' if once else '  <- FAIL'))
+    try:
+        download_file(make_session(1), roadsUrl + 'tl_2020_48999_roads.zip', os.path.join(outDir, 'tl_2020_48999_roads.zip'),
+                      backoff=0.01)
+        refused = False
+    except Exception:
+        refused = server.requests.get('tl_2020_48999_roads.zip') == 1
+    leftovers = [name for name in os.listdir(outDir) if name.endswith('.part')]
+    bad += (not refused) + len(leftovers)
+    print('404: {}, {} .part files left'.format('given up without a retry' if refused else 'retried  <- FAIL', len(leftovers)))
+    server.shutdown()
+    shutil.rmtree(outDir, ignore_errors=True)
+    print('{} mismatches'.format(bad))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=12, help='county zips in the listing, per state')
+    parser.add_argument('--size-mb', type=float, default=2, help='MB per zip')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds the stand-in holds each request')
+    args = parser.parse_args()
+    sys.exit(main(args.files, args.size_mb, args.workers, args.latency))
@@ -0,0 +1,198 @@
+import sys
+import argparse
+from shapely.geometry import LineString, MultiLineString, Polygon, box
+from roadOverlay import overlayMiles, shardedBlockMiles, vincenty, METERS_PER_MILE_US
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+'''
+Script - checkOverlay
+
+Description:
+    Runs a small fixture through the in memory road miles (roadOverlay.py) and checks them per key against expected miles
+    worked out without shapely: every road segment is clipped to the fixture's boxes by hand (Liang-Barsky, holes cut out),
+    overlapping pieces on the same line are merged like Dissolve merges them, and what is left is measured with Vincenty
+    (within 5e-11 of geographiclib). Where arcpy is available the Intersect -> Dissolve -> AddGeometryAttributes(LENGTH_GEODESIC,
+    MILES_US) chain it replaces is run and compared as well.
+    Fixture (NAD83 lon/lat, near Dallas):
+        polygons - two cities sharing an edge, one with a hole
+        blocks   - a grid of blocks over both cities in two counties (so shardedBlockMiles() makes two shards)
+        roads    - a meridian road crossing both cities, the same stretch of road twice (Dissolve counts it once), a road
+                   along the shared city edge, a multipart road, a diagonal and a road that stops inside a block
+    The script exits 1 if a key differs from the expected miles by more than 1e-9 miles, or with arcpy from the arcpy
+    miles by more than 1e-4 (relative), or is missing on one side.
+    Each road miles folder keeps its own copy next to its own roadOverlay.py, the same way scratchCache.py is kept, so the
+    check runs against the copy that folder uses.
+
+Usage:
+    python checkOverlay.py [--workers 2] [--no-arcpy]
+'''
+def fixture():
+    '''
+    :return: (roads, [(NAME, polygon)], [(BLOCKID10, polygon)])
+    '''
+    west = Polygon([(-96.90, 32.70), (-96.80, 32.70), (-96.80, 32.80), (-96.90, 32.80)],
+                   [[(-96.87, 32.73), (-96.84, 32.73), (-96.84, 32.76), (-96.87, 32.76)]])
+    east = box(-96.80, 32.70, -96.70, 32.80)
+    polys = [('West City', west), ('East City', east)]
+    blocks = []
+    for i in range(8):
+        for j in range(4):
+            x, y = -96.90 + i * 0.025, 32.70 + j * 0.025
+            # west half in county 113, east half in 085
+            blocks.append(('48{}{:04d}{:04d}'.format('113' if i < 4 else '085', i, j), box(x, y, x + 0.025, y + 0.025)))
+    roads = [LineString([(-96.855, 32.65), (-96.855, 32.85)]),
+             LineString([(-96.95, 32.71), (-96.65, 32.71)]),
+             LineString([(-96.85, 32.71), (-96.75, 32.71)]),
+             LineString([(-96.80, 32.72), (-96.80, 32.78)]),
+             MultiLineString([[(-96.89, 32.79), (-96.86, 32.79)], [(-96.78, 32.79), (-96.72, 32.79)]]),
+             LineString([(-96.90, 32.70), (-96.70, 32.80)]),
+             LineString([(-96.76, 32.74), (-96.735, 32.74), (-96.735, 32.765)])]
+    return roads, polys, blocks
+def segments(road):
+    '''
+    Straight segments of a (multi)line, ((x1, y1), (x2, y2)) each.
+    '''
+    parts = road.geoms if hasattr(road, 'geoms') else [road]
+    return [(p, q) for part in parts for p, q in zip(list(part.coords), list(part.coords)[1:])]
+def clip(p, q, bounds):
+    '''
+    Liang-Barsky, the (t0, t1) stretch of p -> q inside the closed box bounds (xmin, ymin, xmax, ymax), None if it misses.
+    '''
+    t0, t1 = 0., 1.
+    for d, low, high, start in [(q[0] - p[0], bounds[0], bounds[2], p[0]), (q[1] - p[1], bounds[1], bounds[3], p[1])]:
+        if d == 0:
+            if start < low or start > high:
+                return None
+            continue
+        a, b = (low - start) / d, (high - start) / d
+        t0, t1 = max(t0, min(a, b)), min(t1, max(a, b))
+    return (t0, t1) if t0 < t1 else None
+def crossing(p, q, r, s):
+    '''
+    :return: the point where p -> q crosses or touches r -> s, None for parallel or missing segments
+    '''
+    d1, d2 = (q[0] - p[0], q[1] - p[1]), (s[0] - r[0], s[1] - r[1])
+    den = d1[0] * d2[1] - d1[1] * d2[0]
+    if den == 0:
+        return None
+    t = ((r[0] - p[0]) * d2[1] - (r[1] - p[1]) * d2[0]) / den
+    u = ((r[0] - p[0]) * d1[1] - (r[1] - p[1]) * d1[0]) / den
+    return (p[0] + d1[0] * t, p[1] + d1[1] * t) if 0 <= t <= 1 and 0 <= u <= 1 else None
+def expectedMiles(roads, zones):
+    '''
+    Road miles per key without shapely. The fixture's polygons are boxes with box holes, so each is its exterior's bounds
+    minus its holes' bounds. The geodesic between two points is not the straight lon/lat line between them, so merged
+    stretches are measured between the same nodes unary_union (or Intersect) puts in: the piece ends and where pieces cross.
+    :return: {key: miles} for keys with road in them
+    '''
+    pieces = {}
+    for key, polygon in zones:
+        holes = [ring.bounds for ring in polygon.interiors]
+        for road in roads:
+            for p, q in segments(road):
+                inside = clip(p, q, polygon.exterior.bounds)
+                spans = [inside] if inside else []
+                for hole in holes:
+                    cut = clip(p, q, hole)
+                    if cut:
+                        spans = [part for t0, t1 in spans for part in [(t0, min(t1, cut[0])), (max(t0, cut[1]), t1)] if part[0] < part[1]]
+                for t0, t1 in spans:
+                    piece = tuple((p[0] + (q[0] - p[0]) * t, p[1] + (q[1] - p[1]) * t) for t in (t0, t1))
+                    # a road along a box edge can leave a piece too short to have two distinct ends
+                    if piece[0] != piece[1]:
+                        pieces.setdefault(key, []).append(piece)
+    miles = {}
+    for key, keyPieces in pieces.items():
+        # pieces on the same line are merged where they overlap, Dissolve counts a stretch of road once
+        lines = {}
+        for p, q in keyPieces:
+            length = ((q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2) ** 0.5
+            ux, uy = (q[0] - p[0]) / length, (q[1] - p[1]) / length
+            if ux < 0 or (ux == 0 and uy < 0):
+                ux, uy = -ux, -uy
+            line = (round(ux, 12), round(uy, 12), round(ux * p[1] - uy * p[0], 12))
+            lines.setdefault(line, {'along': (ux, uy), 'spans': [], 'nodes': []})
+            lines[line]['spans'].append(sorted([(ux * p[0] + uy * p[1], p), (ux * q[0] + uy * q[1], q)]))
+            for r, s in keyPieces:
+                node = crossing(p, q, r, s)
+                if node is not None:
+                    lines[line]['nodes'].append((ux * node[0] + uy * node[1], node))
+        total = 0.
+        for line in lines.values():
+            spans = sorted(line['spans'])
+            merged = [list(spans[0])]
+            for start, end in spans[1:]:
+                if start[0] <= merged[-1][1][0]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            nodes = line['nodes'] + [end for span in spans for end in span]
+            for start, end in merged:
+                points = sorted(set([start, end] + [node for node in nodes if start[0] < node[0] < end[0]]))
+                total += sum(float(vincenty(p[0], p[1], q[0], q[1])) for (s, p), (e, q) in zip(points, points[1:]))
+        miles[key] = total / METERS_PER_MILE_US
+    return miles
+def arcpyMiles(roads, zones, keyField):
+    '''
+    The old chain on the fixture in in_memory: Intersect, Dissolve on the key, AddGeometryAttributes LENGTH_GEODESIC MILES_US.
+    :return: {key: miles}
+    '''
+    sr = arcpy.SpatialReference(4269)
+    arcpy.env.overwriteOutput = True
+    arcpy.CreateFeatureclass_management('in_memory', 'check_roads', 'POLYLINE', spatial_reference=sr)
+    with arcpy.da.InsertCursor('in_memory\\check_roads', ['SHAPE@WKT']) as cursor:
+        for road in roads:
+            cursor.insertRow([road.wkt])
+    arcpy.CreateFeatureclass_management('in_memory', 'check_zones', 'POLYGON', spatial_reference=sr)
+    arcpy.AddField_management('in_memory\\check_zones', keyField, 'TEXT')
+    with arcpy.da.InsertCursor('in_memory\\check_zones', ['SHAPE@WKT', keyField]) as cursor:
+        for key, polygon in zones:
+            cursor.insertRow([polygon.wkt, key])
+    arcpy.Intersect_analysis(['in_memory\\check_roads', 'in_memory\\check_zones'], 'in_memory\\check_intersect', '', '', 'LINE')
+    arcpy.Dissolve_management('in_memory\\check_intersect', 'in_memory\\check_diss', [keyField])
+    arcpy.AddGeometryAttributes_management('in_memory\\check_diss', 'LENGTH_GEODESIC', 'MILES_US')
+    return dict(arcpy.da.SearchCursor('in_memory\\check_diss', [keyField, 'LENGTH_GEO']))
+def report(title, native, expected, reference):
+    '''
+    Prints roadOverlay, expected and arcpy miles per key. Keys without road count as 0 against the expected miles.
+    :return: number of keys that differ
+    '''
+    print(title)
+    print('  {:<16}{:>14}{:>14}{:>12}{:>14}{:>12}'.format('key', 'roadOverlay', 'expected', 'diff', 'arcpy', 'diff'))
+    def show(value):
+        return '-' if value is None else '{:.6f}'.format(value)
+    bad = 0
+    for key in sorted(set(native) | set(expected) | set(reference or {})):
+        mine, want = native.get(key), expected.get(key, 0.)
+        off = mine is None or abs(mine - want) > 1e-9
+        theirs = reference.get(key) if reference is not None else None
+        if reference is not None:
+            off = off or theirs is None or abs(mine - theirs) > 1e-4 * max(abs(theirs), 1e-6)
+        bad += off
+        print('  {:<16}{:>14}{:>14}{:>12}{:>14}{:>12}{}'.format(key, show(mine), show(want),
+                                                             '-' if mine is None else '{:.2e}'.format(mine - want), show(theirs),
+                                                             '-' if mine is None or theirs is None else '{:.2e}'.format(mine - theirs),
+                                                             '  <- differs' if off else ''))
+    return bad
+def main(workers, useArcpy):
+    roads, polys, blocks = fixture()
+    cities = overlayMiles(roads, polys)
+    cbs = shardedBlockMiles(roads, blocks, workers)
+    if useArcpy and arcpy is None:
+        print('arcpy is not available, checking roadOverlay against the expected miles only\n')
+        useArcpy = False
+    bad = report('Road miles per city (overlayMiles)', cities, expectedMiles(roads, polys),
+                 arcpyMiles(roads, polys, 'NAME') if useArcpy else None)
+    print('')
+    bad += report('Road miles per census block (shardedBlockMiles)', cbs, expectedMiles(roads, blocks),
+                  arcpyMiles(roads, blocks, 'BLOCKID10') if useArcpy else None)
+    print('\n{} keys differ'.format(bad))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--no-arcpy', action='store_true', help='only run roadOverlay')
+    args = parser.parse_args()
+    sys.exit(main(args.workers, not args.no_arcpy))
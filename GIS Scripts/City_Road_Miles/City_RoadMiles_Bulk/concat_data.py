@@ -4,6 +4,8 @@ import arcpy
 import getpass
 import time
 import shutil
+import pyarrow.parquet as pq
+from openpyxl import Workbook
 
 '''
 Script - concat_data
@@ -15,10 +17,12 @@ Requirements:
     
 I/O:
     Input: data within root/output
-    Output: concats .xlsxs and gdbs within state dirs
+    Output: concats .parquets and gdbs within state dirs
 
 Version History:
     v1 - 4/2/2021 - CL
+    State results come in as parquet (only the deliverable columns) instead of xlsx, and are streamed into the final
+    csv/xlsx (openpyxl write only mode) instead of read_excel + concat.
     
 
 '''
@@ -43,72 +47,74 @@ def clear_gdb():
     except TypeError:
         pass
 
+# Columns left out of the deliverable sheets, never written to the per state parquet files
+cityDrop = ['OBJECTID_12', 'NAMELSAD', 'LSAD', 'CLASSFP', 'PCICBSA', 'PCINECTA', 'MTFCC', 'FUNCSTAT', 'INTPTLAT', 'INTPTLON',
+            'stname', 'fip', 'state_abbr', 'OBJECTID_1', 'Shape_Length', 'Shape_Area']
+cbDrop = ['OBJECTID_12', 'TARGET_FID', 'stname', 'fip', 'state_abbr', 'Shape_Area_1', 'Shape_Length_12', 'Shape_Length',
+          'Shape_Area']
+renamed = {'LENGTH_GEO': 'RoadMiles'}
+# Rows a sheet can hold, bigger outputs only get the csv
+excelRows = 1048575
+
+def write_parquet(fc, parquetPath, drop):
+    '''
+    Writes a fc's attribute table to parquet, without geometry and the dropped columns.
+    :param fc: fc/table path
+    :param parquetPath: output .parquet path
+    :param drop: field names to leave out
+    :return: number of rows written
+    '''
+    fields = [f.name for f in arcpy.ListFields(fc) if f.type not in ('Geometry', 'Blob', 'Raster') and f.name not in drop]
+    with arcpy.da.SearchCursor(fc, fields) as cursor:
+        df = pd.DataFrame([row for row in cursor], columns=fields)
+    df.rename(columns=renamed).to_parquet(parquetPath, index=False)
+    return len(df)
+def write_table(parquetPaths, outName):
+    '''
+    Streams per state parquet files into one csv and (when it fits in a sheet) one xlsx, a file at a time.
+    :param parquetPaths: parquet files, all with the same columns
+    :param outName: output path without extension
+    :return: None
+    '''
+    total = sum(pq.ParquetFile(path).metadata.num_rows for path in parquetPaths)
+    book = Workbook(write_only=True) if total <= excelRows else None
+    sheet = book.create_sheet() if book else None
+    columns = None
+    with open(outName + '.csv', 'w', newline='', encoding='utf-8') as f:
+        for path in parquetPaths:
+            df = pd.read_parquet(path, columns=columns)
+            if columns is None:
+                columns = list(df.columns)
+                if sheet:
+                    sheet.append(columns)
+            df.to_csv(f, index=False, header=path == parquetPaths[0])
+            if sheet:
+                for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+                    sheet.append(row)
+    if book:
+        book.save(outName + '.xlsx')
+    else:
+        print('{} has {} rows, too many for excel, csv only'.format(os.path.basename(outName), total))
 def concat_xlsx():
     '''
-    Navigates through each state dir in ouput, and concats it.
+    Navigates through each state dir in ouput, and concats the parquet files written by write_results() in City_RoadMiles_Bulk_v3.py.
     :return:
-    xlsx with all data in output
+    xlsx and csv with all data in output
     '''
 
-    print('Concatenating excels...')
+    print('Concatenating state results...')
     totCity = []
     totCBs = []
-    totDFCity = []
-    totDFCBs =[]
-
-    for folder in os.listdir(outpath):
-        if '.xlsx' not in folder:
-            stateDir = os.path.join(outpath, folder)
-            os.chdir(stateDir)
-            cityPath = os.path.join(stateDir, 'Cities_Polygons_RoadMiles.xlsx')
-            cbsPath = os.path.join(stateDir, 'CBs_in_Cities_RoadMiles.xlsx')
-            totCity.append(cityPath)
-            totCBs.append(cbsPath)
-    for xl in totCity:
-        readCity = pd.read_excel(xl)
-        dfCity = pd.DataFrame(readCity)
-        totDFCity.append(dfCity)
-    for xl in totCBs:
-        readCBs = pd.read_excel(xl)
-        dfCBs = pd.DataFrame(readCBs)
-        totDFCBs.append(dfCBs)
+    for folder in sorted(os.listdir(outpath)):
+        stateDir = os.path.join(outpath, folder)
+        if os.path.isfile(os.path.join(stateDir, 'Cities_Polygons_RoadMiles.parquet')):
+            totCity.append(os.path.join(stateDir, 'Cities_Polygons_RoadMiles.parquet'))
+            totCBs.append(os.path.join(stateDir, 'CBs_in_Cities_RoadMiles.parquet'))
 
     concat_dir = os.path.join(outpath, 'All_Muni_Deliverable_Data')
     os.mkdir(concat_dir)
-    os.chdir(concat_dir)
-    totalCity = pd.concat(totDFCity)
-    # clean up sheets
-    del totalCity['OBJECTID_12']
-    del totalCity['NAMELSAD']
-    del totalCity['LSAD']
-    del totalCity['CLASSFP']
-    del totalCity['PCICBSA']
-    del totalCity['PCINECTA']
-    del totalCity['MTFCC']
-    del totalCity['FUNCSTAT']
-    del totalCity['INTPTLAT']
-    del totalCity['INTPTLON']
-    del totalCity['stname']
-    del totalCity['fip']
-    del totalCity['state_abbr']
-    del totalCity['OBJECTID_1']
-    del totalCity['Shape_Length']
-    del totalCity['Shape_Area']
-    totalCity.rename(columns={'LENGTH_GEO': 'RoadMiles'})
-    totalCity.to_excel('All_Muni_Cities_Miles.xlsx', index=False)
-
-    totalCBs = pd.concat(totDFCBs)
-    del totalCBs['OBJECTID_12']
-    del totalCBs['TARGET_FID']
-    del totalCBs['stname']
-    del totalCBs['fip']
-    del totalCBs['state_abbr']
-    del totalCBs['Shape_Area_1']
-    del totalCBs['Shape_Length_12']
-    del totalCBs['Shape_Length']
-    del totalCBs['Shape_Area']
-    totalCBs.rename(columns={'LENGTH_GEO': 'RoadMiles'})
-    totalCBs.to_excel('All_Muni_CBs_Miles.xlsx', index=False)
+    write_table(totCity, os.path.join(concat_dir, 'All_Muni_Cities_Miles'))
+    write_table(totCBs, os.path.join(concat_dir, 'All_Muni_CBs_Miles'))
 
 def merge_gdbs():
     '''
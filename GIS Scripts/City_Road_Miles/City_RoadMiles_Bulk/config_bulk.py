@@ -4,38 +4,69 @@ import requests
 import os
 import getpass
 import zipfile
+import shutil
+import time
+import queue
+import threading
 from bs4 import BeautifulSoup
+from scratchCache import *
+from tiger_download import *
+from tiger_cache import *
+from shp_zip_reader import *
+from roadOverlay import *
+from dividedRoads import *
 
 # Dirs
 root = os.path.dirname(os.path.abspath(__file__))
 inputs = os.path.join(root, 'input')
 outpath = os.path.join(root, 'output')
 temp = os.path.join(root, 'temp')
-roadsDir = os.path.join(root, 'roads')
 scratch = os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb')
 
-# Create DFs of input cities and the fips codes
+# TIGER downloads, see tiger_download.py
+roadsUrl = 'https://www2.census.gov/geo/tiger/TIGER2020/ROADS/'
+blocksUrl = 'https://www2.census.gov/geo/tiger/TIGER2010BLKPOPHU/'
+placesUrl = 'https://www2.census.gov/geo/tiger/TIGER2020/PLACE/'
+downloadWorkers = 8
+# Persistent TIGER cache, keyed by (vintage, layer, fips). Least recently used states are evicted past the size cap.
+tigerCacheDir = os.path.join(root, 'tiger_cache')
+tigerCacheGB = 20
+# Processes for the census block road miles (RoadMiles), blocks are sharded by county. workerCount() caps it at 61 for Windows
+blockWorkers = workerCount()
+
 citiesList = os.path.join(inputs, 'cities_bulk.xlsx')
-readList = pd.read_excel(citiesList, engine='openpyxl')
-cityDF = pd.DataFrame(readList)
 fipsList = os.path.join(inputs, 'us-state-ansi-fips.xlsx')
-readFips = pd.read_excel(fipsList, converters={'fip': lambda x:str(x)}, engine='openpyxl') # keeps leading zeros
-fipsDF = pd.DataFrame(readFips)
+# Filled in by setup(), which main() calls. Pool workers re-import the config, so nothing is read or created at import
+merged = None
+statesDict = {}
+tigerStore = None
 
-cityDF.State = cityDF.State.str.strip()
-fipsDF.state_abbr = fipsDF.state_abbr.str.strip()
+def setup():
+    '''
+    Reads the input cities and fips sheets, makes a state dir in output per state and opens the TIGER cache.
+    :return: (merged cities/fips DataFrame, {state: fips}, tigerCache)
+    '''
+    # Create DFs of input cities and the fips codes
+    readList = pd.read_excel(citiesList, engine='openpyxl')
+    cityDF = pd.DataFrame(readList)
+    readFips = pd.read_excel(fipsList, converters={'fip': lambda x:str(x)}, engine='openpyxl') # keeps leading zeros
+    fipsDF = pd.DataFrame(readFips)
 
-# create a merged file to get fips, create dict after
-statesDict = {}
-merged = pd.merge(cityDF, fipsDF, how='left', left_on=['State'], right_on=['state_abbr'])
+    cityDF.State = cityDF.State.str.strip()
+    fipsDF.state_abbr = fipsDF.state_abbr.str.strip()
+
+    # create a merged file to get fips, create dict after
+    states = {}
+    merged = pd.merge(cityDF, fipsDF, how='left', left_on=['State'], right_on=['state_abbr'])
 
-if not os.listdir(outpath):
-    for state, fip in zip(merged['State'].drop_duplicates(), merged['fip'].drop_duplicates()):
-        statesDict[state] = fip
-        path = os.path.join(str(outpath), str(state))
-        os.mkdir(path)
-else:
-    print('Output folder is not empty, please remove all folders in output before running...')
+    if not os.listdir(outpath):
+        for state, fip in zip(merged['State'].drop_duplicates(), merged['fip'].drop_duplicates()):
+            states[state] = fip
+            path = os.path.join(str(outpath), str(state))
+            os.mkdir(path)
+    else:
+        print('Output folder is not empty, please remove all folders in output before running...')
+    return merged, states, tigerCache(tigerCacheDir, tigerCacheGB * 1024 ** 3, downloadWorkers)
 
 # List of road features to remove
 exlcudedRoads = [
@@ -51,4 +82,9 @@ exlcudedRoads = [
         'S1780',
         'S1820',
         'S1830'
-    ]
\ No newline at end of file
+    ]
+# Excluded classes CleanRoads() still pulls out on its own, for the divided road collapse (dividedRoads.py), before
+# removing them from the roads. Every other excluded class is dropped while the county zips are read
+dividedClasses = ['S1100', 'S1200']
+# Divided road collapse tolerances in feet per MTFCC (dividedRoads.py), other classes are left as they are
+dividedTolerances = {'S1100': 150, 'S1200': 80, 'S1400': 80}
\ No newline at end of file
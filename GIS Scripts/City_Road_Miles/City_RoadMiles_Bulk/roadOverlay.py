@@ -0,0 +1,180 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from shapely import wkb, box
+from shapely.ops import unary_union
+from shapely.strtree import STRtree
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+'''
+Script - roadOverlay
+
+Description:
+    Road mile overlay without geoprocessing, an alternative to the Intersect -> Dissolve -> AddGeometryAttributes(LENGTH_GEODESIC)
+    chain in roadCalcs.RoadMiles() (Generic_Road_Calcs) and RoadMiles() here. Roads are clipped to polygons through an STR-tree, clipped pieces are unioned per key
+    (what Dissolve does, so overlapping roads only count once) and measured with vectorized Vincenty on the NAD83 ellipsoid.
+    Needs numpy and shapely 2.x, arcpy only for reading layers (readLayer), so the engine itself runs and can be checked on Linux.
+
+    Coordinates must be geographic (lon/lat), readLayer() asks arcpy for NAD83 (TIGER's own coordinate system).
+
+    shardedBlockMiles() splits census blocks into shards by county (first 5 characters of BLOCKID10) and runs each shard in a
+    worker process with only the roads touching its bounding box. Blocks don't overlap, so merging the shard results gives the
+    same miles as one big overlay.
+'''
+# GRS80 / NAD83
+A = 6378137.0
+F = 1 / 298.257222101
+B = A * (1 - F)
+METERS_PER_MILE_US = 1609.347218694
+# ProcessPoolExecutor raises ValueError for more than 61 workers on Windows
+MAX_WORKERS = 61
+
+def vincenty(lon1, lat1, lon2, lat2, maxIter=200, tol=1e-12):
+    '''
+    Vectorized Vincenty inverse, geodesic distance in meters between arrays of points in degrees.
+    :return: array of distances
+    '''
+    L = np.radians(np.asarray(lon2, dtype=float) - np.asarray(lon1, dtype=float))
+    U1 = np.arctan((1 - F) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - F) * np.tan(np.radians(lat2)))
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+    lam = L
+    for i in range(maxIter):
+        sinLam, cosLam = np.sin(lam), np.cos(lam)
+        sinSigma = np.hypot(cosU2 * sinLam, cosU1 * sinU2 - sinU1 * cosU2 * cosLam)
+        cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLam
+        sigma = np.arctan2(sinSigma, cosSigma)
+        sinAlpha = np.where(sinSigma == 0, 0., cosU1 * cosU2 * sinLam / np.where(sinSigma == 0, 1., sinSigma))
+        cos2Alpha = 1 - sinAlpha ** 2
+        # equatorial lines have cos2Alpha = 0
+        cos2SigmaM = np.where(cos2Alpha == 0, 0., cosSigma - 2 * sinU1 * sinU2 / np.where(cos2Alpha == 0, 1., cos2Alpha))
+        C = F / 16 * cos2Alpha * (4 + F * (4 - 3 * cos2Alpha))
+        lamPrev = lam
+        lam = L + (1 - C) * F * sinAlpha * (sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM ** 2)))
+        if not np.size(lam) or np.max(np.abs(lam - lamPrev)) < tol:
+            break
+    u2 = cos2Alpha * (A ** 2 - B ** 2) / B ** 2
+    bigA = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    bigB = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    deltaSigma = bigB * sinSigma * (cos2SigmaM + bigB / 4 * (cosSigma * (-1 + 2 * cos2SigmaM ** 2) - bigB / 6 * cos2SigmaM *
+                                                            (-3 + 4 * sinSigma ** 2) * (-3 + 4 * cos2SigmaM ** 2)))
+    return B * bigA * (sigma - deltaSigma)
+def geodesicMiles(geom):
+    '''
+    Geodesic length of a (multi)line in US survey miles, same units as LENGTH_GEODESIC / MILES_US.
+    :param geom: shapely geometry, non line parts (points left over from clipping) count as 0
+    :return: miles
+    '''
+    if geom.is_empty:
+        return 0.
+    if geom.geom_type == 'LineString':
+        coords = np.asarray(geom.coords)
+        return float(vincenty(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1]).sum()) / METERS_PER_MILE_US
+    if hasattr(geom, 'geoms'):
+        return sum(geodesicMiles(part) for part in geom.geoms)
+    return 0.
+def overlayMiles(roads, zones, tree=None):
+    '''
+    Road miles per zone key, in memory.
+    :param roads: list of shapely (multi)lines in lon/lat
+    :param zones: list of (key, shapely polygon) in lon/lat, zones sharing a key are summed as one (like Dissolve)
+    :param tree: optional STRtree(roads), so several overlays on the same roads share one index
+    :return: {key: miles}
+    '''
+    tree = STRtree(roads) if tree is None else tree
+    pieces = {}
+    for key, polygon in zones:
+        for i in tree.query(polygon, predicate='intersects'):
+            piece = roads[i].intersection(polygon)
+            if not piece.is_empty:
+                pieces.setdefault(key, []).append(piece)
+    miles = dict((key, 0.) for key, polygon in zones)
+    for key, parts in pieces.items():
+        miles[key] = geodesicMiles(unary_union(parts))
+    return miles
+def blockShard(args):
+    '''
+    Worker for shardedBlockMiles(), overlays one shard.
+    :param args: (roads, blocks) for overlayMiles()
+    :return: {key: miles} for blocks with road in them
+    '''
+    roads, blocks = args
+    return dict((key, miles) for key, miles in overlayMiles(roads, blocks).items() if miles > 0)
+def workerCount(workers=None):
+    '''
+    Worker processes to start, the number of cores when workers is None, never more than MAX_WORKERS.
+    '''
+    return max(1, min(workers or os.cpu_count() or 1, MAX_WORKERS))
+def shardTasks(roads, blocks, prefixLen=5, tree=None):
+    '''
+    Splits the blocks into shards by block id prefix, each with the roads near it.
+    :return: list of (roads, blocks) blockShard() arguments, biggest shard first
+    '''
+    shards = {}
+    for key, geom in blocks:
+        shards.setdefault(str(key)[:prefixLen], []).append((key, geom))
+    tree = STRtree(roads) if tree is None else tree
+    tasks = []
+    for shard in shards.values():
+        bounds = np.array([geom.bounds for key, geom in shard])
+        near = tree.query(box(bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max()))
+        tasks.append(([roads[i] for i in near], shard))
+    # biggest shards first so a large county doesn't start last
+    tasks.sort(key=lambda task: len(task[0]) * len(task[1]), reverse=True)
+    return tasks
+def shardedBlockMiles(roads, blocks, workers=None, prefixLen=5, tree=None, pool=None):
+    '''
+    Road miles per census block, sharded by county across worker processes.
+    :param roads: list of shapely lines in lon/lat
+    :param blocks: list of (BLOCKID10, shapely polygon) in lon/lat
+    :param workers: worker processes, defaults to the number of cores (workerCount())
+    :param prefixLen: characters of the block id a shard is keyed on, 5 = state + county, 11 = tract
+    :param tree: optional STRtree(roads) to reuse
+    :param pool: optional running ProcessPoolExecutor to reuse (workers is ignored then)
+    :return: {BLOCKID10: miles}, blocks without road in them are left out (same as the Intersect -> Dissolve output)
+    '''
+    tasks = shardTasks(roads, blocks, prefixLen, tree)
+    miles = {}
+    ownPool = pool is None
+    pool = ProcessPoolExecutor(max_workers=workerCount(workers)) if ownPool else pool
+    try:
+        for result in pool.map(blockShard, tasks):
+            miles.update(result)
+    finally:
+        if ownPool:
+            pool.shutdown()
+    return miles
+def writeMilesTable(miles, outTable, keyField, lengthField='LENGTH_GEO'):
+    '''
+    Writes {key: miles} to a gdb table with the same fields a Dissolve + AddGeometryAttributes(LENGTH_GEODESIC) would leave,
+    so it can be joined back the same way.
+    :param miles: {key: miles}
+    :param outTable: output table path, replaced if it exists
+    :param keyField: key field name, e.g. 'BLOCKID10'
+    :param lengthField: miles field name
+    :return: None
+    '''
+    width = max([len(str(key)) for key in miles] or [1])
+    array = np.array([(str(key), value) for key, value in miles.items()],
+                     dtype=[(keyField, '<U{}'.format(width)), (lengthField, '<f8')])
+    if arcpy.Exists(outTable):
+        arcpy.Delete_management(outTable)
+    arcpy.da.NumPyArrayToTable(array, outTable)
+def readLayer(path, keyField=None):
+    '''
+    Reads a layer with arcpy in NAD83 lon/lat.
+    :param path: path to fc/shapefile
+    :param keyField: optional field to read along with the shape
+    :return: list of shapely geometries, or (key, geometry) pairs when keyField is given
+    '''
+    fields = (['SHAPE@WKB', keyField] if keyField else ['SHAPE@WKB'])
+    rows = []
+    with arcpy.da.SearchCursor(path, fields, spatial_reference=arcpy.SpatialReference(4269)) as cursor:
+        for row in cursor:
+            if row[0] is None:
+                continue
+            geom = wkb.loads(bytes(row[0]))
+            rows.append((row[1], geom) if keyField else geom)
+    return rows
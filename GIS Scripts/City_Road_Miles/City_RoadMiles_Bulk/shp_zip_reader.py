@@ -0,0 +1,163 @@
+import os
+import struct
+import zipfile
+import datetime
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+
+'''
+Script - shp_zip_reader
+
+Requirements:
+    1) Nothing for reading, arcpy for zips_to_featureclass()
+
+I/O:
+    Input: zipped shapefiles (TIGER county roads zips)
+    Output: features as (attributes, parts) straight out of the zips, or one merged feature class
+
+Notes:
+    1) Reads the .dbf and .shp members of a zip in lockstep as streams, nothing is extracted to disk.
+    2) Rows can be filtered on their attributes before their geometry is parsed, e.g. dropping excluded MTFCC classes,
+       so those roads are never materialized.
+    3) Handles null, polyline and polygon shapes (plus their Z/M variants, only XY is kept).
+'''
+
+LINE_TYPES = (3, 5, 13, 15, 23, 25)
+
+def zip_member(zf, ext):
+    names = [n for n in zf.namelist() if n.lower().endswith(ext)]
+    return names[0] if names else None
+def read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise EOFError('Shapefile ended early')
+    return data
+def dbf_fields(f):
+    '''
+    Reads a dbf header.
+    :param f: stream positioned at the start of the dbf
+    :return: (record count, record length, [(name, type, length, decimals)])
+    '''
+    header = read_exact(f, 32)
+    count, headerLen, recordLen = struct.unpack('<IHH', header[4:12])
+    fields = []
+    raw = read_exact(f, headerLen - 32)
+    for pos in range(0, len(raw) - 1, 32):
+        desc = raw[pos:pos + 32]
+        if desc[0:1] == b'\r':
+            break
+        name = desc[:11].split(b'\x00')[0].decode('ascii')
+        fields.append((name, desc[11:12].decode('ascii'), desc[16], desc[17]))
+    return count, recordLen, fields
+def dbf_value(raw, ftype, decimals, encoding):
+    '''
+    One dbf field value: numbers as int/float, logicals as bool, dates (YYYYMMDD) as datetime for the DATE fields
+    zips_to_featureclass() creates, text as str. Blank (or unparseable) numbers, logicals and dates are None.
+    '''
+    text = raw.decode(encoding).strip()
+    if ftype in 'NF':
+        if not text or text.startswith('*'):
+            return None
+        return float(text) if decimals or '.' in text else int(text)
+    if ftype == 'L':
+        return text.upper() in ('Y', 'T') if text not in ('', '?') else None
+    if ftype == 'D':
+        try:
+            return datetime.datetime.strptime(text, '%Y%m%d')
+        except ValueError:
+            # blank, or 00000000 as some writers leave unset dates
+            return None
+    return text
+def shp_parts(content):
+    '''
+    Parses a .shp record's content into parts.
+    :param content: record bytes after the record header
+    :return: list of parts, each a list of (x, y), empty for null shapes
+    '''
+    shapeType = struct.unpack('<i', content[:4])[0]
+    if shapeType == 0:
+        return []
+    if shapeType not in LINE_TYPES:
+        raise ValueError('Unsupported shape type {}'.format(shapeType))
+    numParts, numPoints = struct.unpack('<ii', content[36:44])
+    starts = list(struct.unpack('<{}i'.format(numParts), content[44:44 + 4 * numParts]))
+    base = 44 + 4 * numParts
+    coords = struct.unpack('<{}d'.format(2 * numPoints), content[base:base + 16 * numPoints])
+    starts.append(numPoints)
+    return [[(coords[2 * i], coords[2 * i + 1]) for i in range(starts[p], starts[p + 1])] for p in range(numParts)]
+def iter_zip_features(zipPath, keep=None):
+    '''
+    Iterates the features of a zipped shapefile without extracting it.
+    :param zipPath: path to .zip holding one shapefile
+    :param keep: optional callable taking the attribute dict, rows it returns False for are skipped before their geometry is parsed
+    :return: generator of (attributes dict, parts)
+    '''
+    with zipfile.ZipFile(zipPath, 'r') as zf:
+        cpg = zip_member(zf, '.cpg')
+        encoding = zf.read(cpg).decode('ascii').strip() if cpg else 'latin-1'
+        encoding = 'utf-8' if encoding.upper().replace('-', '') == 'UTF8' else encoding
+        with zf.open(zip_member(zf, '.dbf')) as dbf, zf.open(zip_member(zf, '.shp')) as shp:
+            count, recordLen, fields = dbf_fields(dbf)
+            read_exact(shp, 100)
+            for n in range(count):
+                record = read_exact(dbf, recordLen)
+                contentLen = struct.unpack('>ii', read_exact(shp, 8))[1] * 2
+                content = read_exact(shp, contentLen)
+                if record[0:1] == b'*':
+                    continue
+                attrs, pos = {}, 1
+                for name, ftype, length, decimals in fields:
+                    attrs[name] = dbf_value(record[pos:pos + length], ftype, decimals, encoding)
+                    pos += length
+                if keep is not None and not keep(attrs):
+                    continue
+                yield attrs, shp_parts(content)
+def zip_schema(zipPath):
+    '''
+    Field definitions and .prj text of a zipped shapefile.
+    :return: ([(name, type, length, decimals)], prj text or None)
+    '''
+    with zipfile.ZipFile(zipPath, 'r') as zf:
+        with zf.open(zip_member(zf, '.dbf')) as dbf:
+            fields = dbf_fields(dbf)[2]
+        prj = zip_member(zf, '.prj')
+        return fields, zf.read(prj).decode('latin-1') if prj else None
+def parts_wkt(parts):
+    return 'MULTILINESTRING ({})'.format(', '.join('({})'.format(', '.join('{!r} {!r}'.format(x, y) for x, y in part))
+                                                    for part in parts))
+def zips_to_featureclass(zipPaths, outFC, skipField=None, skipValues=()):
+    '''
+    Streams the features of several zipped line shapefiles (same schema) into one new feature class,
+    replacing extract + Merge. Rows whose skipField is in skipValues are never written.
+    :param zipPaths: list of zip paths
+    :param outFC: output feature class or shapefile path
+    :param skipField: field to filter on, e.g. 'MTFCC'
+    :param skipValues: values of skipField to leave out
+    :return: number of features written
+    '''
+    fields, prj = zip_schema(zipPaths[0])
+    sr = arcpy.SpatialReference()
+    if prj:
+        sr.loadFromString(prj)
+    outDir, outName = os.path.split(outFC)
+    arcpy.CreateFeatureclass_management(outDir, outName, 'POLYLINE', spatial_reference=sr)
+    for name, ftype, length, decimals in fields:
+        if ftype in 'NF':
+            fieldType = 'DOUBLE' if decimals or length > 9 else 'LONG'
+        elif ftype == 'D':
+            fieldType = 'DATE'
+        else:
+            fieldType = 'TEXT'
+        arcpy.AddField_management(outFC, name, fieldType, field_length=length if fieldType == 'TEXT' else None)
+    names = [name for name, ftype, length, decimals in fields]
+    skip = set(skipValues)
+    keep = (lambda attrs: attrs.get(skipField) not in skip) if skipField else None
+    written = 0
+    with arcpy.da.InsertCursor(outFC, names + ['SHAPE@WKT']) as cursor:
+        for zipPath in zipPaths:
+            for attrs, parts in iter_zip_features(zipPath, keep):
+                cursor.insertRow([attrs[name] for name in names] + [parts_wkt(parts) if parts else None])
+                written += 1
+    return written
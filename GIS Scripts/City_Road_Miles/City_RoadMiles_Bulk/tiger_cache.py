@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import threading
+from tiger_download import download_all
+
+'''
+Script - tiger_cache
+
+Requirements:
+    1) tiger_download.py
+
+I/O:
+    Input: (vintage, layer, fips) of a TIGER/Line download and the urls of its zips
+    Output: path to a folder holding the extracted shapefiles (or the cached zips), from local disk whenever possible
+
+Notes:
+    1) TIGER vintages never change, so a download is kept across runs and keyed by (vintage, layer, fips),
+       e.g. ('TIGER2020', 'ROADS', '48').
+    2) Zips are stored content addressed under objects/<sha256>.zip, the index records each key's zips, checksums,
+       extracted folder (only made when asked for), size on disk and when it was last used.
+    3) When the cache grows past its size cap the least recently used keys are evicted. Keys handed out by get() are
+       pinned (never evicted) until release(), so a state still being analysed keeps its files while later states download.
+
+    cache_dir/
+        index.json
+        objects/<sha256>.zip
+        extracted/<vintage>_<layer>_<fips>/
+'''
+
+class tigerCache():
+    def __init__(self, cacheDir, maxBytes=20 * 1024 ** 3, workers=8):
+        '''
+        :param cacheDir: folder for the cache, created if missing
+        :param maxBytes: size cap, least recently used keys are evicted past it
+        :param workers: download threads for misses
+        '''
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.workers = workers
+        self.objects = os.path.join(cacheDir, 'objects')
+        self.extracted = os.path.join(cacheDir, 'extracted')
+        self.indexPath = os.path.join(cacheDir, 'index.json')
+        self.pinned = set()
+        self.lock = threading.RLock()
+        for folder in [self.objects, self.extracted]:
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+        try:
+            with open(self.indexPath) as f:
+                self.index = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.index = {}
+    def save(self):
+        with open(self.indexPath + '.tmp', 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(self.indexPath + '.tmp', self.indexPath)
+    @staticmethod
+    def key(vintage, layer, fips):
+        return '{}_{}_{}'.format(vintage, layer, fips)
+    @staticmethod
+    def sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    @staticmethod
+    def folderSize(folder):
+        return sum(os.path.getsize(os.path.join(path, f)) for path, dirs, files in os.walk(folder) for f in files)
+    def zips(self, entry):
+        return [os.path.join(self.objects, entry['sha256'][name] + '.zip') for name in sorted(entry['sha256'])]
+    def valid(self, entry):
+        '''
+        An entry is usable if all of its zips are still on disk.
+        '''
+        return all(os.path.exists(path) for path in self.zips(entry))
+    def get(self, vintage, layer, fips, urls, extract=True):
+        '''
+        Returns the extracted folder for a TIGER download, downloading and extracting it only on a miss.
+        :param vintage: e.g. 'TIGER2020'
+        :param layer: e.g. 'ROADS', 'PLACE', 'TABBLOCK_POPHU'
+        :param fips: state fips
+        :param urls: zip urls for the key, or a callable returning them so the index page is only scraped on a miss
+        :param extract: False skips extraction and returns the cached zips instead, for reading with shp_zip_reader.py
+        :return: path to folder with the extracted files, or list of zip paths when extract is False
+        '''
+        with self.lock:
+            key = self.key(vintage, layer, fips)
+            self.pinned.add(key)
+            return self.load(key, vintage, layer, fips, urls, extract)
+    def release(self, vintage, layer, fips):
+        '''
+        Unpins a key from get(), letting evict() remove it again. Doesn't wait on the lock, which get() holds for a whole download.
+        '''
+        self.pinned.discard(self.key(vintage, layer, fips))
+    def load(self, key, vintage, layer, fips, urls, extract):
+        entry = self.index.get(key)
+        if entry and self.valid(entry):
+            print('Using cached {} ({:.1f} MB)'.format(key, entry['bytes'] / 1e6))
+        else:
+            entry = self.index[key] = {'vintage': vintage, 'layer': layer, 'fips': fips, 'extracted': None,
+                                       'sha256': self.fetch(urls() if callable(urls) else urls)}
+        if extract and not (entry['extracted'] and os.path.isdir(entry['extracted'])):
+            entry['extracted'] = os.path.join(self.extracted, key)
+            if os.path.exists(entry['extracted']):
+                shutil.rmtree(entry['extracted'])
+            os.makedirs(entry['extracted'])
+            for path in self.zips(entry):
+                with zipfile.ZipFile(path, 'r') as zip_ref:
+                    zip_ref.extractall(entry['extracted'])
+        entry['bytes'] = (self.folderSize(entry['extracted']) if entry['extracted'] else 0) + \
+                         sum(os.path.getsize(path) for path in set(self.zips(entry)))
+        entry['last_used'] = time.time()
+        self.evict(keep=key)
+        self.save()
+        return entry['extracted'] if extract else self.zips(entry)
+    def fetch(self, urls):
+        '''
+        Downloads zips into objects/ under their checksum.
+        :param urls: zip urls
+        :return: {zip name: sha256}
+        '''
+        staging = tempfile.mkdtemp(dir=self.cacheDir)
+        checksums = {}
+        try:
+            for path in download_all(urls, staging, workers=self.workers):
+                sha = self.sha256(path)
+                checksums[os.path.basename(path)] = sha
+                obj = os.path.join(self.objects, sha + '.zip')
+                if os.path.exists(obj):
+                    os.remove(path)
+                else:
+                    os.replace(path, obj)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return checksums
+    def evict(self, keep=None):
+        '''
+        Removes least recently used keys until the cache is under maxBytes. Zips still used by another key are kept.
+        :param keep: key that must not be evicted (the one just fetched), pinned keys are never evicted either
+        :return: list of evicted keys
+        '''
+        evicted = []
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_used']):
+            if sum(entry['bytes'] for entry in self.index.values()) <= self.maxBytes:
+                break
+            if key == keep or key in self.pinned:
+                continue
+            entry = self.index.pop(key)
+            if entry['extracted']:
+                shutil.rmtree(entry['extracted'], ignore_errors=True)
+            inUse = set(sha for other in self.index.values() for sha in other['sha256'].values())
+            for sha in set(entry['sha256'].values()) - inUse:
+                obj = os.path.join(self.objects, sha + '.zip')
+                if os.path.exists(obj):
+                    os.remove(obj)
+            print('Evicted {} from TIGER cache'.format(key))
+            evicted.append(key)
+        return evicted
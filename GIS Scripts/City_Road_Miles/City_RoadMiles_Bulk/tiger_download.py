@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bs4 import BeautifulSoup
+
+'''
+Script - tiger_download
+
+Requirements:
+    1) requests and bs4, same as City_RoadMiles_Bulk_v3.py
+
+I/O:
+    Input: census TIGER directory urls, or any url to a file
+    Output: files streamed to disk in the directory given
+
+Notes:
+    1) One pooled requests.Session is shared by a bounded thread pool, so connections to www2.census.gov are reused.
+    2) Files are streamed to disk in chunks (never held in memory whole), written to a .part file first and renamed once complete.
+    3) Failed downloads are retried with exponential backoff.
+    4) Base urls are arguments, so the functions can be pointed at a local http server serving fixture zips.
+'''
+
+def make_session(workers=8):
+    '''
+    Creates a requests session with a connection pool big enough for the download threads.
+    :param workers: number of download threads that will share the session
+    :return: requests.Session
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+def list_links(session, url, snip):
+    '''
+    Scrapes a TIGER directory listing for file links.
+    :param session: requests.Session
+    :param url: directory url, e.g. https://www2.census.gov/geo/tiger/TIGER2020/ROADS/
+    :param snip: text the link must contain, e.g. 'tl_2020_48'
+    :return: list of file names (hrefs)
+    '''
+    r = session.get(url)
+    r.raise_for_status()
+    soup = BeautifulSoup(r.text, 'html.parser')
+    return [link.get('href') for link in soup.find_all('a') if snip in link.get_text()]
+def download_file(session, url, dest, chunk_size=1 << 20, retries=4, backoff=1.0, progress=None):
+    '''
+    Streams one file to disk, retrying with exponential backoff. Client errors (404 etc.) other than 429 are not retried.
+    :param session: requests.Session
+    :param url: file url
+    :param dest: output file path
+    :param chunk_size: bytes per chunk written
+    :param retries: attempts after the first one
+    :param backoff: seconds to wait before the first retry, doubled every retry after
+    :param progress: optional callable taking the number of bytes written, called once the file is complete so bytes from
+                     failed attempts are never counted
+    :return: dest
+    '''
+    part = dest + '.part'
+    for attempt in range(retries + 1):
+        try:
+            written = 0
+            with session.get(url, stream=True, timeout=60) as r:
+                r.raise_for_status()
+                with open(part, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+            os.replace(part, dest)
+            if progress:
+                progress(written)
+            return dest
+        except (requests.RequestException, IOError) as e:
+            if os.path.exists(part):
+                os.remove(part)
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            if attempt == retries or (status and 400 <= status < 500 and status != 429):
+                raise
+            wait = backoff * 2 ** attempt
+            print('Retrying {} in {}s ({})'.format(url, wait, e))
+            time.sleep(wait)
+class downloadProgress():
+    def __init__(self, total):
+        '''
+        Thread safe counters for download_all(), prints a line per finished file.
+        :param total: number of files being downloaded
+        '''
+        self.total = total
+        self.files = 0
+        self.bytes = 0
+        self.start = time.time()
+        self.lock = threading.Lock()
+    def add_bytes(self, n):
+        with self.lock:
+            self.bytes += n
+    def file_done(self, name):
+        with self.lock:
+            self.files += 1
+            elapsed = max(time.time() - self.start, 1e-6)
+            print('Downloaded {} ({}/{} files, {:.1f} MB, {:.1f} MB/s)'.format(name, self.files, self.total, self.bytes / 1e6,
+                                                                                self.bytes / 1e6 / elapsed))
+def download_all(urls, outDir, workers=8, session=None, **kwargs):
+    '''
+    Downloads files concurrently with a bounded thread pool and one shared session.
+    :param urls: file urls, files are saved under their url's base name
+    :param outDir: output directory
+    :param workers: max concurrent downloads
+    :param session: optional requests.Session, one is made if not given
+    :param kwargs: passed on to download_file() (chunk_size, retries, backoff)
+    :return: list of downloaded file paths, in the order of urls
+    '''
+    session = session or make_session(workers)
+    progress = downloadProgress(len(urls))
+    paths = [os.path.join(outDir, url.rstrip('/').split('/')[-1]) for url in urls]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(download_file, session, url, path, progress=progress.add_bytes, **kwargs): path
+                   for url, path in zip(urls, paths)}
+        for future in as_completed(futures):
+            future.result()
+            progress.file_done(os.path.basename(futures[future]))
+    return paths
@@ -1,6 +1,8 @@
 import arcpy
 import os
 import getpass
+from roadOverlay import *
+from dividedRoads import *
 '''
 Script - CityRoadCalcs
 Created by - Colton Luttrell
@@ -13,44 +15,47 @@ Version History:
     v1 - 5/20/2021 --> CL
 '''
 class roadCalcs():
-    def __init__(self, roadsPath, cbsPath, polyPath, outpath, scratch=os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb')):
+    def __init__(self, roadsPath, cbsPath, polyPath, outpath, scratch=os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb'), workers=None,
+                 tolerances=TOLERANCES):
         '''
         :param roadsPath: path to all roads in scratch.gdb
         :param cbsPath: path to all roads census block in scratch.gdb
         :param polyPath: path to boundary in scratch.gdb
         :param scratch: path to scratch.gdb
+        :param workers: processes for the census block road miles, defaults to the number of cores
+        :param tolerances: divided road collapse tolerances in feet per MTFCC, see dividedRoads.py
         '''
         self.roadsPath = roadsPath
         self.cbsPath = cbsPath
         self.polyPath = polyPath
         self.scratch = scratch
         self.outpath = outpath
+        self.workers = workers
+        self.tolerances = tolerances
     def CleanRoads(self):
         '''
         Removes road features that are not specifically road types from census data (sidewalks, private roads, etc.)
-        After removal of features, integrates highway features to remove any 'parallel' roads.
+        After removal of features, collapses divided highway and S1400 roads to one line (dividedRoads.py).
         :return: None.
         '''
-        # First remove unecessary roads, then integrate S1100 and S1200 roads
-        print('Removing unwanted road/path features and integrating parallel roads...')
+        # First remove unecessary roads, then collapse divided roads
+        print('Removing unwanted road/path features and collapsing divided roads...')
         arcpy.env.workspace = self.scratch
 
         S1100 = arcpy.FeatureClassToFeatureClass_conversion(self.roadsPath, self.scratch, 'S1100',"MTFCC = 'S1100'")
-        S1100Int = arcpy.Integrate_management(S1100, '150 FEET')
         S1200 = arcpy.FeatureClassToFeatureClass_conversion(self.roadsPath, self.scratch, 'S1200',"MTFCC = 'S1200'")
-        S1200Int = arcpy.Integrate_management(S1200, '80 FEET')
-        delCursor = arcpy.da.UpdateCursor(self.roadsPath, ['MTFCC'])
         exlcudedRoads = ['S1100', 'S1200', 'S1630', 'S1500', 'S1710', 'S1720', 'S1730', 'S1740', 'S1750', 'S1780', 'S1820', 'S1830']
-        for row in delCursor:
-            for road in exlcudedRoads:
-                if row[0] == road:
-                    delCursor.deleteRow()
-        del row, delCursor
+        # excluded classes are left out with a layer query, self.roadsPath isn't edited so it can be reused for other boundaries
+        if arcpy.Exists('Roads_Kept'):
+            arcpy.Delete_management('Roads_Kept')
+        keptRoads = arcpy.MakeFeatureLayer_management(self.roadsPath, 'Roads_Kept', "MTFCC NOT IN ({})".format(
+            ', '.join("'{}'".format(road) for road in exlcudedRoads)))
         # Get S1400 roads merged
-        regRoadsMerged = arcpy.Dissolve_management(self.roadsPath, 'S1400_Merged', ['MTFCC', 'fip'])
-        mergedRoads = arcpy.MergeDividedRoads_cartography('S1400_Merged', 'fip', '80 feet', 'regRoadsMerged')
+        regRoadsMerged = arcpy.Dissolve_management(keptRoads, 'S1400_Merged', ['MTFCC', 'fip'], '', 'SINGLE_PART')
 
-        arcpy.Merge_management([S1100Int, S1200Int, mergedRoads], 'Roads_Merged')
+        arcpy.Merge_management([S1100, S1200, regRoadsMerged], 'Roads_Divided')
+        collapseDividedRoads(os.path.join(self.scratch, 'Roads_Divided'), os.path.join(self.scratch, 'Roads_Merged'),
+                             self.tolerances)
     def RoadMiles(self):
         '''
             Intersect roads fc to all cities polygons, get total road miles in a city boundary, and then road miles per cb inside city.
@@ -66,9 +71,11 @@ class roadCalcs():
         # roads to CBs in city polygons
         arcpy.SpatialJoin_analysis(self.cbsPath, self.polyPath, 'CBs_in_poly', 'JOIN_ONE_TO_ONE',
                                    'KEEP_COMMON', '', 'HAVE_THEIR_CENTER_IN')
-        arcpy.Intersect_analysis(['Roads_Merged', 'CBs_in_poly'], 'Roads_CBs_Intersect', '', '', 'LINE')
-        arcpy.Dissolve_management('Roads_CBs_Intersect', 'Roads_CBs_Diss', ['BLOCKID10'])
-        arcpy.AddGeometryAttributes_management('Roads_CBs_Diss', 'LENGTH_GEODESIC', 'MILES_US')
+        # sharded by county across worker processes in memory (roadOverlay.py), Roads_CBs_Diss is written as a table with the
+        # same BLOCKID10 / LENGTH_GEO fields the Intersect -> Dissolve -> AddGeometryAttributes chain left
+        cbMiles = shardedBlockMiles(readLayer(os.path.join(self.scratch, 'Roads_Merged')),
+                                    readLayer(os.path.join(self.scratch, 'CBs_in_poly'), 'BLOCKID10'), self.workers)
+        writeMilesTable(cbMiles, os.path.join(self.scratch, 'Roads_CBs_Diss'), 'BLOCKID10')
 
         # join the road miles fcs back to the Cities polygons, and the CBs polygons, make new fcs for deliverables
         joined_city_roads = arcpy.AddJoin_management(self.polyPath, 'NAME', 'Roads_in_Polys', 'NAME', 'KEEP_ALL')
@@ -87,6 +94,75 @@ class roadCalcs():
         deliverableFCs = ['Polygon_RoadMiles', 'CBs_in_Poly_RoadMiles', 'Roads_Polys_Intersect']
         newGDB = arcpy.CreateFileGDB_management(self.outpath, 'PolygonRoadMiles.gdb')
         arcpy.FeatureClassToGeodatabase_conversion(deliverableFCs, newGDB)
+    def RoadMilesBatch(self, polyPaths, gdbName='PolygonRoadMiles'):
+        '''
+        Road miles for many boundaries in one session, run after CleanRoads(). The cleaned roads, census blocks, their STR-trees
+        and the worker processes are set up once and reused for every boundary (roadOverlay.py).
+        :param polyPaths: {boundary name: path to boundary polygon fc with a NAME field}
+        :param gdbName: name of the output gdb/xlsxs
+        :return: None, writes <gdbName>.gdb with Polygon_RoadMiles and CBs_in_Poly_RoadMiles (BOUNDARY = boundary name),
+                 and an xlsx of each. Both keep their source's fields, self.polyPath and self.cbsPath are the templates.
+        '''
+        print('Getting road miles for {} boundaries...'.format(len(polyPaths)))
+        roads = readLayer(os.path.join(self.scratch, 'Roads_Merged'))
+        roadTree = STRtree(roads)
+        def attributeFields(fc):
+            return [f.name for f in arcpy.ListFields(fc) if f.type not in ('OID', 'Geometry') and
+                    f.name.lower() not in ('shape_length', 'shape_area', 'shape_leng', 'boundary', 'length_geo')]
+        cbFields = attributeFields(self.cbsPath)
+        polyFields = attributeFields(self.polyPath)
+        cbs = []
+        with arcpy.da.SearchCursor(self.cbsPath, ['SHAPE@WKB'] + cbFields, spatial_reference=arcpy.SpatialReference(4269)) as cursor:
+            for row in cursor:
+                if row[0] is not None:
+                    cbs.append((wkb.loads(bytes(row[0])), list(row[1:])))
+        cbCenters = STRtree([geom.centroid for geom, attrs in cbs])
+        keyIdx = cbFields.index('BLOCKID10')
+
+        polyRows, cbRows = [], []
+        with ProcessPoolExecutor(max_workers=workerCount(self.workers)) as pool:
+            for boundary, polyPath in polyPaths.items():
+                print('  ' + boundary)
+                polys = readLayer(polyPath, 'NAME')
+                # attributes of the first polygon per NAME, fields the template has and this boundary doesn't stay null
+                present = [f for f in polyFields if f in set(field.name for field in arcpy.ListFields(polyPath))]
+                attrs = {}
+                with arcpy.da.SearchCursor(polyPath, present) as cursor:
+                    for row in cursor:
+                        values = dict(zip(present, row))
+                        attrs.setdefault(values['NAME'], [values.get(f) for f in polyFields])
+                for name, miles in overlayMiles(roads, polys, roadTree).items():
+                    polyRows.append([boundary] + attrs[name] + [miles, unary_union([geom for key, geom in polys if key == name])])
+                # CBs with their center in the boundary, like SpatialJoin HAVE_THEIR_CENTER_IN
+                inside = sorted(set(i for name, geom in polys for i in cbCenters.query(geom, predicate='contains')))
+                cbMiles = shardedBlockMiles(roads, [(cbs[i][1][keyIdx], cbs[i][0]) for i in inside], tree=roadTree, pool=pool)
+                for i in inside:
+                    cbRows.append([boundary] + cbs[i][1] + [cbMiles.get(cbs[i][1][keyIdx]), cbs[i][0]])
+
+        newGDB = os.path.join(self.outpath, gdbName + '.gdb')
+        if not arcpy.Exists(newGDB):
+            arcpy.CreateFileGDB_management(self.outpath, gdbName + '.gdb')
+        sr = arcpy.SpatialReference(4269)
+        for fc in ['Polygon_RoadMiles', 'CBs_in_Poly_RoadMiles']:
+            if arcpy.Exists(os.path.join(newGDB, fc)):
+                arcpy.Delete_management(os.path.join(newGDB, fc))
+        polyFC = arcpy.CreateFeatureclass_management(newGDB, 'Polygon_RoadMiles', 'POLYGON', self.polyPath,
+                                                     spatial_reference=sr)
+        cbFC = arcpy.CreateFeatureclass_management(newGDB, 'CBs_in_Poly_RoadMiles', 'POLYGON', self.cbsPath,
+                                                   spatial_reference=sr)
+        for fc in [polyFC, cbFC]:
+            existing = [f.name.lower() for f in arcpy.ListFields(fc)]
+            if 'boundary' not in existing:
+                arcpy.AddField_management(fc, 'BOUNDARY', 'TEXT', field_length=255)
+            if 'length_geo' not in existing:
+                arcpy.AddField_management(fc, 'LENGTH_GEO', 'DOUBLE')
+        for fc, fields, rows in [(polyFC, polyFields, polyRows), (cbFC, cbFields, cbRows)]:
+            with arcpy.da.InsertCursor(fc, ['BOUNDARY'] + fields + ['LENGTH_GEO', 'SHAPE@WKT']) as cursor:
+                for row in rows:
+                    cursor.insertRow(row[:-1] + [row[-1].wkt])
+        print('Creating Excels...')
+        for fc in ['Polygon_RoadMiles', 'CBs_in_Poly_RoadMiles']:
+            arcpy.TableToExcel_conversion(os.path.join(newGDB, fc), os.path.join(self.outpath, gdbName + '_' + fc + '.xlsx'))
     def create_excel(self):
         '''
         Creates xlsx sheet from fcs
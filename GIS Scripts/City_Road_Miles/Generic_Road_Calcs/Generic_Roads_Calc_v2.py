@@ -1,5 +1,3 @@
-from config_generic import *
-
 '''
 Script - Generic_Roads_Calc
 Created by - Colton Luttrell
@@ -13,6 +11,10 @@ Version History:
     v1 - 4/20/2021 --> CL
     v2 - 5/20/2021 - Rewrote all functions here to be classes in separate python files at an attempt for 
     resuability --> CL
+
+Notes:
+    1) With more than one *Polygon.shp in input, batch() runs instead of main(). Roads are cleaned once for the state and
+       every boundary goes into one PolygonRoadMiles.gdb (plus xlsxs), keyed by boundary name in a BOUNDARY field.
 '''
 def main():
     print('Starting Calculations...')
@@ -26,5 +28,22 @@ def main():
     roadClass.create_excel()
     print('------------------------')
     print('Finished!')
+def batch():
+    print('Starting Batch Calculations...')
+    print('------------------------')
+    prep = scratchPrep()
+    prep.clear_gdb()
+    prep.transfer(dictList=[roads, blocks] + polys)
+    roadClass = roadCalcs(roads['_scratch'], blocks['_scratch'], polys[0]['_scratch'], outpath=outpath)
+    roadClass.CleanRoads()
+    roadClass.RoadMilesBatch(dict((p['_name'], p['_scratch']) for p in polys))
+    print('------------------------')
+    print('Finished!')
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # the config is imported here rather than at the top. roadOverlay's worker processes re-import this script (as
+    # __mp_main__), and they only need roadOverlay, not arcpy and the scan of input
+    from config_generic import *
+    if len(polys) > 1:
+        batch()
+    else:
+        main()
\ No newline at end of file
@@ -12,7 +12,10 @@ outpath = os.path.join(root, 'output')
 temp = os.path.join(root, 'temp')
 scratch = os.path.join(r'C:\Users', getpass.getuser(), 'Documents', 'ArcGIS','scratch.gdb')
 
+polyShps = []
 for file in os.listdir(inputs):
+    if file.endswith('Polygon.shp'):
+        polyShps.append(file)
     if 'Roads.shp' in file:
         roadShp = file
     elif 'pophu.shp' in file:
@@ -31,4 +34,10 @@ poly = {
     '_path': os.path.join(inputs, poly),
     '_scratch': os.path.join(scratch, poly.split('.')[0])
 }
+# Every *Polygon.shp in input, for running a batch of boundaries in the same state (see batch() in Generic_Roads_Calc_v2.py)
+polys = [{
+    '_name': shp.split('.')[0],
+    '_path': os.path.join(inputs, shp),
+    '_scratch': os.path.join(scratch, shp.split('.')[0])
+} for shp in sorted(polyShps)]
 
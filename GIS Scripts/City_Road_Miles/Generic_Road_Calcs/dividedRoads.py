@@ -0,0 +1,200 @@
+import os
+import numpy as np
+import shapely
+from shapely.geometry import LineString, MultiLineString
+from shapely.strtree import STRtree
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+'''
+Script - dividedRoads
+
+Description:
+    Divided road collapse without geoprocessing, replaces Integrate (S1100 at 150 ft, S1200 at 80 ft) and
+    MergeDividedRoads (S1400 at 80 ft) in CleanRoads(), which edit data in place and need an Advanced license.
+    Roads are exploded into 2 point segments and put in an STR-tree. Segments of the same road class that are within the
+    class tolerance of each other, close to parallel (heading) and alongside each other (offset, overlap along the segment)
+    are carriageway pairs. The preferred carriageway (the longer line) is kept as the centerline, the stretch of the other
+    one that runs alongside it is cut out, so road miles count a divided road once.
+    Needs numpy and shapely 2.x, arcpy only for collapseDividedRoads(), so the engine itself runs and can be checked on Linux.
+
+    Coordinates must be geographic (lon/lat), tolerances are in feet and are measured on an equirectangular projection
+    around the data's mean latitude (a few percent off at the edges of a large state, fine for a matching tolerance).
+'''
+A = 6378137.0
+FEET_PER_METER = 3.280833333
+# Tolerances in feet per MTFCC, the distances CleanRoads() used with Integrate and MergeDividedRoads.
+# Classes not listed are passed through untouched.
+TOLERANCES = {'S1100': 150, 'S1200': 80, 'S1400': 80}
+
+def lineParts(geom):
+    '''
+    Single part lines of a (multi)line, anything else is dropped.
+    '''
+    if geom is None or geom.is_empty:
+        return []
+    if geom.geom_type == 'LineString':
+        return [geom]
+    if hasattr(geom, 'geoms'):
+        return [line for part in geom.geoms for line in lineParts(part)]
+    return []
+def toMeters(coords, lat0):
+    return np.radians(coords) * A * np.array([np.cos(np.radians(lat0)), 1.])
+def coveredPieces(p1, p2, rank, tol, maxAngle=20., minOverlap=1.):
+    '''
+    Finds the stretches of segments that run alongside a preferred (lower rank) segment.
+    :param p1: (n, 2) segment start points in meters
+    :param p2: (n, 2) segment end points in meters
+    :param rank: (n,) preference of each segment, lower is kept
+    :param tol: max offset between carriageways in meters
+    :param maxAngle: max heading difference in degrees, direction of travel is ignored
+    :param minOverlap: min length in meters a pair has to run alongside each other
+    :return: (segment, start, end) arrays, start/end as fractions along the segment
+    '''
+    tree = STRtree(shapely.linestrings(np.stack([p1, p2], axis=1)))
+    a, b = tree.query(tree.geometries, predicate='dwithin', distance=tol)
+    pair = (a != b) & (rank[b] < rank[a])
+    a, b = a[pair], b[pair]
+    da, db = p2[a] - p1[a], p2[b] - p1[b]
+    la, lb = np.hypot(da[:, 0], da[:, 1]), np.hypot(db[:, 0], db[:, 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # heading
+        parallel = np.abs(da[:, 0] * db[:, 1] - da[:, 1] * db[:, 0]) / (la * lb) <= np.sin(np.radians(maxAngle))
+        # where b lies along a
+        ua = da / la[:, None]
+        t1 = ((p1[b] - p1[a]) * ua).sum(1) / la
+        t2 = ((p2[b] - p1[a]) * ua).sum(1) / la
+        start, end = np.clip(np.minimum(t1, t2), 0, 1), np.clip(np.maximum(t1, t2), 0, 1)
+        # offset of a from b's line is linear along a, keep the part within tol
+        nb = np.stack([-db[:, 1], db[:, 0]], axis=1) / lb[:, None]
+        s0 = ((p1[a] - p1[b]) * nb).sum(1)
+        ds = ((p2[a] - p1[b]) * nb).sum(1) - s0
+        flat = np.abs(ds) < 1e-9
+        u1, u2 = (-tol - s0) / np.where(flat, 1., ds), (tol - s0) / np.where(flat, 1., ds)
+        start = np.where(flat, np.where(np.abs(s0) <= tol, start, 1.), np.maximum(start, np.minimum(u1, u2)))
+        end = np.where(flat, end, np.minimum(end, np.maximum(u1, u2)))
+        keep = (la > 0) & (lb > 0) & parallel & ((end - start) * la >= minOverlap)
+    return a[keep], start[keep], end[keep]
+def keptIntervals(intervals, length, minPiece):
+    '''
+    What is left of a segment after its covered intervals are cut out.
+    :param intervals: list of (start, end) fractions
+    :param length: segment length in meters
+    :param minPiece: leftovers shorter than this (meters) are dropped
+    :return: list of (start, end) fractions
+    '''
+    kept, pos = [], 0.
+    for start, end in sorted(intervals):
+        if start > pos:
+            kept.append((pos, start))
+        pos = max(pos, end)
+    if pos < 1:
+        kept.append((pos, 1.))
+    return [(start, end) for start, end in kept if (end - start) * length >= minPiece]
+def collapseLines(lines, tolerance, maxAngle=20., minOverlap=1.):
+    '''
+    Collapses parallel carriageways in a set of lines of one road class to a single line.
+    :param lines: list of shapely LineStrings in lon/lat
+    :param tolerance: max offset between carriageways in feet
+    :param maxAngle: max heading difference in degrees
+    :param minOverlap: min length in meters a pair has to run alongside each other, also the shortest piece kept
+    :return: list with a list of LineStrings per input line, the line itself when nothing was cut, empty when all of it was
+    '''
+    coords = [np.asarray(line.coords)[:, :2] for line in lines]
+    coords = [xy if len(xy) > 1 else np.zeros((0, 2)) for xy in coords]
+    if not any(len(xy) for xy in coords):
+        return [[line] for line in lines]
+    lat0 = np.mean(np.concatenate(coords)[:, 1])
+    ll1 = np.concatenate([xy[:-1] for xy in coords if len(xy)])
+    ll2 = np.concatenate([xy[1:] for xy in coords if len(xy)])
+    part = np.concatenate([np.full(max(len(xy) - 1, 0), i) for i, xy in enumerate(coords)])
+    p1, p2 = toMeters(ll1, lat0), toMeters(ll2, lat0)
+    segLength = np.hypot(*(p2 - p1).T)
+    # longer lines are kept, ties go to the first line, then to the first segment of a line
+    partLength = np.bincount(part, segLength, minlength=len(lines))
+    rank = np.empty(len(part), dtype=np.int64)
+    rank[np.lexsort((np.arange(len(part)), part, -partLength[part]))] = np.arange(len(part))
+    seg, start, end = coveredPieces(p1, p2, rank, tolerance / FEET_PER_METER, maxAngle, minOverlap)
+    covered = {}
+    for k, s, e in zip(seg.tolist(), start.tolist(), end.tolist()):
+        covered.setdefault(k, []).append((s, e))
+    result = [[line] for line in lines]
+    first = np.searchsorted(part, np.arange(len(lines) + 1))
+    for i in sorted(set(part[list(covered)].tolist())):
+        pieces, current = [], None
+        for k in range(first[i], first[i + 1]):
+            intervals = keptIntervals(covered[k], segLength[k], minOverlap) if k in covered else [(0., 1.)]
+            if not intervals and current:
+                # a fully covered segment breaks the line
+                pieces.append(current)
+                current = None
+            for s, e in intervals:
+                if current is None or s > 0:
+                    if current:
+                        pieces.append(current)
+                    current = [ll1[k] + (ll2[k] - ll1[k]) * s]
+                current.append(ll1[k] + (ll2[k] - ll1[k]) * e)
+                if e < 1:
+                    pieces.append(current)
+                    current = None
+        if current:
+            pieces.append(current)
+        result[i] = [LineString(piece) for piece in pieces if len(piece) > 1]
+    return result
+def collapseDivided(features, tolerances=TOLERANCES, maxAngle=20., minOverlap=1.):
+    '''
+    Collapses divided roads class by class.
+    :param features: list of (road class, shapely (multi)line) in lon/lat
+    :param tolerances: {road class: tolerance in feet}, classes not in it are passed through
+    :param maxAngle: max heading difference in degrees
+    :param minOverlap: min length in meters a pair has to run alongside each other
+    :return: list of geometries in the order of features, None for features collapsed away entirely
+    '''
+    result = [geom for roadClass, geom in features]
+    for roadClass, tolerance in tolerances.items():
+        idx, lines = [], []
+        for i, (cls, geom) in enumerate(features):
+            if cls == roadClass:
+                for line in lineParts(geom):
+                    idx.append(i)
+                    lines.append(line)
+        if not lines:
+            continue
+        kept = {}
+        for i, pieces in zip(idx, collapseLines(lines, tolerance, maxAngle, minOverlap)):
+            kept.setdefault(i, []).extend(pieces)
+        for i, pieces in kept.items():
+            result[i] = (pieces[0] if len(pieces) == 1 else MultiLineString(pieces)) if pieces else None
+    return result
+def collapseDividedRoads(inFC, outFC, tolerances=TOLERANCES, classField='MTFCC', where=None):
+    '''
+    Writes a copy of a roads feature class with its divided roads collapsed, the input is left as is.
+    :param inFC: roads fc/shapefile
+    :param outFC: output fc, same fields as inFC, replaced if it exists
+    :param tolerances: {road class: tolerance in feet}
+    :param classField: road class field
+    :param where: optional where clause on inFC
+    :return: number of features written
+    '''
+    sr = arcpy.SpatialReference(4269)
+    fields = [f.name for f in arcpy.ListFields(inFC) if f.type not in ('OID', 'Geometry') and f.name.lower() not in
+              ('shape_length', 'shape_area', 'shape_leng')]
+    features, rows = [], []
+    with arcpy.da.SearchCursor(inFC, ['SHAPE@WKB'] + fields, where, sr) as cursor:
+        for row in cursor:
+            geom = shapely.from_wkb(bytes(row[0])) if row[0] is not None else None
+            features.append((row[1 + fields.index(classField)], geom))
+            rows.append(list(row[1:]))
+    if arcpy.Exists(outFC):
+        arcpy.Delete_management(outFC)
+    outDir, outName = os.path.split(outFC)
+    arcpy.CreateFeatureclass_management(outDir, outName, 'POLYLINE', inFC, spatial_reference=sr)
+    written = 0
+    with arcpy.da.InsertCursor(outFC, ['SHAPE@WKT'] + fields) as cursor:
+        for geom, row in zip(collapseDivided(features, tolerances), rows):
+            if geom is None or geom.is_empty:
+                continue
+            cursor.insertRow([geom.wkt] + row)
+            written += 1
+    return written
@@ -0,0 +1,144 @@
+import arcpy
+import os
+import json
+import hashlib
+from glob import glob
+
+'''
+Persistent scratch.gdb cache. Source layers are copied into scratch once and only re-copied when they go stale, instead
+of clearing scratch and copying everything again on every run.
+
+A manifest next to the gdb (scratch.gdb_cache.json) records, per scratch layer, a fingerprint of its source
+(path, mtime, row count, schema hash) and the state of the copy when it was made (row count, schema hash, extent and the
+mtime of the table files the copy wrote in scratch). A copy is reused only when both still match, so a layer edited in
+place in scratch (rows deleted, fields added, values or shapes changed) is copied again on the next run. None of this
+reads the rows, a cache hit costs a Describe, a GetCount and a stat of the table files.
+
+Each script folder keeps its own copy of this module, the same way logging_decorator.py is shared.
+'''
+
+def manifestPath(scratch):
+    return os.path.normpath(scratch) + '_cache.json'
+def loadManifest(scratch):
+    '''
+    Reads the cache manifest for a scratch gdb.
+    :param scratch: path to scratch.gdb
+    :return: {layer name: {'source': fingerprint, 'copy': state}}, empty if there is no manifest yet
+    '''
+    try:
+        with open(manifestPath(scratch)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+def saveManifest(scratch, manifest):
+    with open(manifestPath(scratch), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+def sourceMtime(path):
+    '''
+    Latest modified time of the files behind a layer. Shapefiles use all of their sidecar files, gdb layers use the whole
+    .gdb folder (minus .lock files, which ArcGIS touches just by reading), anything else the file itself.
+    :param path: path to source layer
+    :return: mtime, 0 if nothing was found
+    '''
+    parts = os.path.normpath(path).split(os.sep)
+    gdbs = [i for i, part in enumerate(parts) if part.lower().endswith('.gdb')]
+    if gdbs:
+        folder = os.sep.join(parts[:gdbs[-1] + 1])
+        files = [os.path.join(folder, f) for f in os.listdir(folder) if not f.endswith('.lock')]
+    elif path.lower().endswith('.shp'):
+        files = glob(os.path.splitext(path)[0] + '.*')
+    else:
+        files = [path]
+    return max([os.path.getmtime(f) for f in files if os.path.exists(f)] or [0])
+def gdbFiles(scratch):
+    '''
+    :param scratch: path to scratch.gdb
+    :return: {file name: mtime} of the files in the gdb folder, .lock files left out
+    '''
+    return dict((f, os.path.getmtime(os.path.join(scratch, f))) for f in os.listdir(scratch) if not f.endswith('.lock'))
+def layerState(layer):
+    '''
+    Row count, schema hash and extent of a layer. Used for both the source fingerprint and the scratch copy.
+    :param layer: path to layer
+    :return: dict
+    '''
+    desc = arcpy.Describe(layer)
+    fields = [[f.name, f.type, f.length] for f in arcpy.ListFields(layer)]
+    schema = json.dumps([fields, getattr(desc, 'shapeType', None), getattr(getattr(desc, 'spatialReference', None), 'name', None)])
+    extent = getattr(desc, 'extent', None)
+    state = {'rows': int(arcpy.GetCount_management(layer)[0]),
+             'schema': hashlib.md5(schema.encode('utf-8')).hexdigest(),
+             'extent': [extent.XMin, extent.YMin, extent.XMax, extent.YMax] if extent else None}
+    return state
+def copyState(scratch, name, files):
+    '''
+    State of a scratch copy: layerState() plus the latest mtime of the table files the copy wrote. Edits to the copy
+    rewrite those files, intermediate outputs written to scratch since don't touch them.
+    :param scratch: path to scratch.gdb
+    :param name: scratch layer name
+    :param files: names of the files in scratch that make up the copy's table
+    :return: dict
+    '''
+    state = layerState(os.path.join(scratch, name))
+    paths = [os.path.join(scratch, f) for f in files]
+    state['files'] = sorted(files)
+    state['mtime'] = max([os.path.getmtime(p) if os.path.exists(p) else -1 for p in paths] or [0])
+    return state
+def fingerprint(path):
+    '''
+    Fingerprint of a source layer: path, mtime, row count and schema hash.
+    :param path: path to source layer
+    :return: dict
+    '''
+    state = layerState(path)
+    return {'path': os.path.normcase(os.path.abspath(path)), 'mtime': sourceMtime(path), 'rows': state['rows'],
+            'schema': state['schema']}
+def syncScratch(scratch, sources):
+    '''
+    Copies source layers into scratch, skipping the ones whose cached copy is still current.
+    :param scratch: path to scratch.gdb
+    :param sources: list of source paths, or (path, name) pairs to give the scratch copy a different name.
+                    Copies are named after the source (minus .shp/.csv), same as FeatureClassToGeodatabase.
+    :return: list of scratch layer names that were (re)copied
+    '''
+    manifest = loadManifest(scratch)
+    copied = []
+    for source in sources:
+        path, name = source if isinstance(source, (tuple, list)) else (source, None)
+        name = arcpy.ValidateTableName(name or os.path.splitext(os.path.basename(path))[0], scratch)
+        target = os.path.join(scratch, name)
+        current = fingerprint(path)
+        entry = manifest.get(name)
+        if (entry and entry['source'] == current and arcpy.Exists(target) and
+                entry['copy'] == copyState(scratch, name, entry['copy'].get('files', []))):
+            print('{} is current in scratch, skipping copy'.format(name))
+            continue
+        if arcpy.Exists(target):
+            arcpy.Delete_management(target)
+        # the files that appear in scratch with the copy are its table, their mtime tells later runs if it was edited
+        before = gdbFiles(scratch)
+        if hasattr(arcpy.Describe(path), 'shapeType'):
+            arcpy.FeatureClassToFeatureClass_conversion(path, scratch, name)
+        else:
+            arcpy.TableToTable_conversion(path, scratch, name)
+        after = gdbFiles(scratch)
+        manifest[name] = {'source': current, 'copy': copyState(scratch, name, [f for f in after if f not in before])}
+        saveManifest(scratch, manifest)
+        copied.append(name)
+    return copied
+def clearScratch(scratch, keepCached=True):
+    '''
+    Deletes feature classes and tables from scratch. Cached copies are kept while their source still exists, so
+    syncScratch() can reuse them, everything else (intermediate outputs from earlier runs) is removed.
+    :param scratch: path to scratch.gdb
+    :param keepCached: False clears the cache too
+    :return: None
+    '''
+    manifest = loadManifest(scratch)
+    keep = set(name.lower() for name, entry in manifest.items()
+               if keepCached and arcpy.Exists(entry['source']['path']))
+    arcpy.env.workspace = scratch
+    for layer in (arcpy.ListFeatureClasses() or []) + (arcpy.ListTables() or []):
+        if layer.lower() not in keep:
+            arcpy.Delete_management(os.path.join(scratch, layer))
+    saveManifest(scratch, dict((name, entry) for name, entry in manifest.items() if name.lower() in keep))
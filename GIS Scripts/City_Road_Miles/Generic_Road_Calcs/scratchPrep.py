@@ -1,6 +1,7 @@
 import arcpy
 import os
 import getpass
+from scratchCache import *
 # from config_generic import *
 
 '''
@@ -16,23 +17,15 @@ class scratchPrep():
         self.scratch = scratch
     def clear_gdb(self):
         '''
-        Clear contents of scratch.gdb.
+        Clear contents of scratch.gdb, keeping cached copies of the input shapefiles (see scratchCache.py).
         :return: None.
         '''
         print('Clearing Workspace\n')
-        arcpy.env.workspace = self.scratch
-        fc_list = arcpy.ListFeatureClasses()
-        fc_tables = arcpy.ListTables()
-        try:
-            for fc in fc_list:
-                arcpy.Delete_management(self.scratch + '\\' + fc)
-            for table in fc_tables:
-                arcpy.Delete_management(self.scratch + '\\' + table)
-        except TypeError:
-            pass
+        clearScratch(self.scratch)
     def transfer(self, dictList = []):
         '''
-        Transfer shapefiles in our directories to scratch.gdb for ease of use.
+        Transfer shapefiles in our directories to scratch.gdb for ease of use. Shapefiles already in scratch are only
+        copied again if they changed.
         :return: None.
         '''
         print('Transferring input files...\n')
@@ -43,8 +36,7 @@ class scratchPrep():
                     shps.append(path)
                 else:
                     pass
-        for shp in shps:
-            arcpy.FeatureClassToGeodatabase_conversion(shp, self.scratch)
+        syncScratch(self.scratch, shps)
         print('\n')
 
 
@@ -14,13 +14,37 @@ I/O:
 Version History:
     v1 - 4/28/2021
     v2 - Added cbgPoints() to calculate number of points within CBGs, and total CBG points. Added calculation of lifetime num of points per fielder.
+    v3 - downloadSDE() syncs only changed rows into a local gdb that is kept between runs (sdeSync.py), lifetime points are running totals.
+         getFielderPoints() counts daily/lifetime points in one attribute pass per fc, and can backfill a date range.
+         getCBGPoints() classifies points against an index of the CBGs (polygonIndex.py) instead of spatial joins.
+         Output uploads to Drive concurrently over one authenticated session and resume if interrupted (driveV3_dl.py).
 '''
 def downloadSDE():
     '''
-    Creates a local .gdb of collector db to work from.
+    Creates a local .gdb of collector db to work from. With incremental on, the gdb is kept between runs and only rows
+    created/edited since the last run are pulled into it (sdeSync.py), refreshLayers are copied whole every run.
     :return: None
     '''
+    tracker = sdeSync(syncState)
+    if incremental and arcpy.Exists(gdb) and tracker.state:
+        print('Syncing sde changes to local GDB...')
+        sources = findSources(sde_con, syncLayers + refreshLayers)
+        for layer in syncLayers:
+            replica = os.path.join(gdb, layer)
+            fields = syncFieldNames(replica)
+            synced, new = tracker.sync(layer, arcpyRows(sources[layer], fields, tracker.since(layer)),
+                                       arcpyUpsert(replica, fields))
+            print('{}: {} rows synced, {} new'.format(layer, synced, new))
+        for layer in refreshLayers:
+            replica = os.path.join(gdb, layer)
+            if arcpy.Exists(replica):
+                arcpy.Delete_management(replica)
+            arcpy.Copy_management(sources[layer], replica)
+            print('{}: copied'.format(layer))
+        return
     print('Transferring sde data to local GDB...')
+    if arcpy.Exists(gdb):
+        arcpy.Delete_management(gdb)
     arcpy.env.workspace = gdb
     arcpy.CreateFileGDB_management(inputPath, genName)
     for path, datasets, fcs in arcpy.da.Walk(os.path.join(sde_con)):
@@ -30,49 +54,90 @@ def downloadSDE():
             except Exception as e:
                 exe_type, exe_obj, exe_tb = sys.exc_info()
                 print(exe_type, exe_obj, exe_tb)
-def getFielderPoints():
+    if incremental:
+        # seed marks and running totals from the full copy, editor tracking is turned off so synced rows keep their own
+        if os.path.exists(syncState):
+            os.remove(syncState)
+        tracker = sdeSync(syncState)
+        for layer in syncLayers:
+            replica = os.path.join(gdb, layer)
+            arcpy.DisableEditorTracking_management(replica)
+            tracker.sync(layer, arcpyRows(replica, syncFieldNames(replica)))
+def fielderCounts(fc, first, last, lifetime=None):
     '''
-    Gather point fcs and list out count by created_user, export to csv.
+    One attribute only pass over a point fc: points created per user per day from first to last, and each user's lifetime
+    points as of the end of that day.
+    :param fc: point fc
+    :param first: first day (pd.Timestamp at midnight)
+    :param last: last day
+    :param lifetime: {user: lifetime points} running totals from the incremental sync, only rows from first on are read
+                     then. When None the whole fc is read and lifetime points come from the same pass.
+    Rows without a created_user are not counted. Rows without a created_date still count toward their user's lifetime
+    points (like the Dissolve on created_user did), they only have no day to be counted on.
+    :return: DataFrame of User, Date, Count_Created_Features, Lifetime_Points_Created
+    '''
+    where = None if lifetime is None else "created_date >= timestamp '{}'".format(first.strftime('%Y-%m-%d %H:%M:%S'))
+    with arcpy.da.SearchCursor(fc, ['created_user', 'created_date'], where) as cursor:
+        df = pd.DataFrame([row for row in cursor], columns=['User', 'Date'])
+    df = df[df['User'].notna()]
+    if lifetime is None:
+        lifetime = df.groupby('User').size()
+    df = df[df['Date'].notna()].assign(Date=lambda d: pd.to_datetime(d['Date']).dt.normalize())
+    perDay = df.groupby(['User', 'Date']).size().rename('Count_Created_Features').reset_index()
+    # lifetime as of a day = lifetime now - points created after that day
+    perDay = perDay.sort_values(['User', 'Date'], ascending=[True, False])
+    after = perDay.groupby('User')['Count_Created_Features'].cumsum() - perDay['Count_Created_Features']
+    perDay['Lifetime_Points_Created'] = perDay['User'].map(pd.Series(lifetime, dtype='float64')).fillna(0).astype('int64') - after
+    return perDay[(perDay['Date'] >= first) & (perDay['Date'] <= last)]
+def getFielderPoints(first=None, last=None):
+    '''
+    Count of points created by created_user per point fc, for today or every day of a backfill range, export to xlsx.
+    :param first: first day of a backfill, default today
+    :param last: last day of a backfill, default first
     :return: None
     '''
     try:
         print('Gathering fielder points...')
         arcpy.env.workspace = gdb
-        exp = "created_date > timestamp '{}' And created_date < timestamp '{}'".format(start, end)
-        for fc, val in fcsDict.items():
-            arcpy.FeatureClassToFeatureClass_conversion(os.path.join(gdb, fc), gdb, val[0], exp)
-            arcpy.Dissolve_management(val[0],  val[1], ['created_user'], [['created_user', 'COUNT']])
-            arcpy.Dissolve_management(fc, val[4], ['created_user'], [['created_user', 'COUNT']])
-            cur = arcpy.da.SearchCursor(val[1], ['created_user', 'COUNT_created_user'])
-            curTot = arcpy.da.SearchCursor(val[4], ['created_user', 'COUNT_created_user'])
-            for row in cur:
-                userList.append([row[0], fc, row[1]])
-            for rowTot in curTot:
-                userListTot.append([rowTot[0], fc, rowTot[1]])
-        del cur, row, rowTot, curTot
-        df = pd.DataFrame(userList, columns=['User', 'Point_FC', 'Count_Created_Features'])
-        dfTot = pd.DataFrame(userListTot, columns=['User', 'Point_FC', 'Lifetime_Points_Created'])
-        piv = pd.pivot_table(df, index=['User', 'Point_FC'])
-        pivTot = pd.pivot_table(dfTot, index=['User', 'Point_FC'])
-        concat = pd.merge(piv, pivTot, how='left', left_on=['User', 'Point_FC'], right_on=['User', 'Point_FC'])
+        first = pd.Timestamp(first or date).normalize()
+        last = pd.Timestamp(last or first).normalize()
+        tracker = sdeSync(syncState) if incremental else None
+        frames = []
+        for fc in fcsDict:
+            counts = fielderCounts(os.path.join(gdb, fc), first, last, tracker.lifetime(fc) if tracker else None)
+            counts.insert(1, 'Point_FC', fc)
+            frames.append(counts)
+        df = pd.concat(frames)
+        if df.empty:
+            raise ValueError('no points created from {} to {}'.format(first.date(), last.date()))
+        index = ['User', 'Point_FC'] if first == last else ['User', 'Point_FC', 'Date']
+        concat = df.set_index(index).sort_index()[['Count_Created_Features', 'Lifetime_Points_Created']]
         concat.to_excel(writer, sheet_name='FielderPoints')
         writer.save()
     except Exception as e:
         print('An error has been encountered when extracting fielder points, please check that there is data for todays run.')
         print(f'Error: {e}')
-def getCBGPoints():
+def getCBGPoints(keyField=None):
     '''
-    Gathers point counts within CBGs.
+    Gathers point counts within CBGs. The CBGs are indexed once and every point fc is classified against them
+    (polygonIndex.py), no spatial joins.
+    :param keyField: optional Won_CBGs field to also break the counts down by, written to a CBG_Breakdown sheet
     :return: None
     '''
     print('Gathering points within CBGs...')
     arcpy.env.workspace = gdb
-    for fc, val in fcsDict.items():
-        arcpy.SpatialJoin_analysis(fc, 'Won_CBGs', val[2], 'JOIN_ONE_TO_ONE', 'KEEP_COMMON', '', 'WITHIN')
-        countDict[fc] = [str(arcpy.GetCount_management(val[2]))]
-        countDict[fc].append(str(arcpy.GetCount_management(fc)))
+    cbgs = polygonIndex.fromLayer(os.path.join(gdb, 'Won_CBGs'), keyField)
+    breakdown = []
+    for fc in fcsDict:
+        xy = layerXY(os.path.join(gdb, fc), cbgs.sr)
+        countDict[fc] = [str(int(cbgs.contains(xy).sum())), str(len(xy))]
+        if keyField:
+            for key, count in cbgs.counts(xy).items():
+                breakdown.append([fc, key, count])
     df = pd.DataFrame.from_dict(countDict, orient='index', columns=['Points_in_CBGs', 'Total_Points'])
     df.to_excel(writer, sheet_name='CBGs_Points')
+    if keyField:
+        pd.DataFrame(breakdown, columns=['Point_FC', keyField, 'Points']).to_excel(writer, sheet_name='CBG_Breakdown', index=False)
     writer.save()
 def getHLDMiles():
     '''
@@ -94,25 +159,34 @@ def getHLDMiles():
     writer.close()
 def clearDirs():
     '''
-    Simply delete files in inputGDB, and output folder for next days run.
+    Simply delete files in inputGDB, and output folder for next days run. With incremental on the synced gdb is kept,
+    only this run's outputs are removed from it.
     :return: None
     '''
-    try:
-        gdbPath = os.path.join(inputPath, 'RDOF_FieldTracker.gdb')
-        arcpy.Delete_management(gdbPath)
-    except PermissionError:
-        pass
+    if incremental:
+        arcpy.env.workspace = gdb
+        derived = set(name for val in fcsDict.values() for name in val) | set(['HLD_Fiber_dissolved'])
+        for fc in arcpy.ListFeatureClasses() or []:
+            if fc in derived:
+                arcpy.Delete_management(os.path.join(gdb, fc))
+    else:
+        try:
+            gdbPath = os.path.join(inputPath, 'RDOF_FieldTracker.gdb')
+            arcpy.Delete_management(gdbPath)
+        except PermissionError:
+            pass
     for xl in os.listdir(output):
         path = os.path.join(output, xl)
         os.remove(path)
-def main():
+def main(first=None, last=None):
     downloadSDE()
-    getFielderPoints()
+    getFielderPoints(first, last)
     getCBGPoints()
     getHLDMiles()
-    for file in os.listdir(r'C:\Scripts\RDOF_FieldTracking\output'):
-        filepath = os.path.join(output, file)
-        authenticate(filepath, r'1jnEZPl0KJA0siezz-056SwK0Ltx9_Lq3')
+    # authenticates once, interrupted uploads resume on the next run
+    uploader = driveUploader(workers=uploadWorkers)
+    uploader.upload_all([os.path.join(output, file) for file in os.listdir(output)], driveFolder)
     clearDirs()
 if __name__ == '__main__':
-    main()
+    # backfill: RDOF_FieldTracking.py 2021-05-01 2021-05-31
+    main(*sys.argv[1:3])
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from sdeSync import sdeSync, sqliteRows, trackingFields
+'''
+Script - checkSync
+
+Description:
+    Runs sdeSync against a SQLite stand-in of the collector sde for --days days of field work, no arcpy needed.
+        - every day --points new points come in from --users users, a share of older points gets edited, and editor
+          tracking dates carry fractions of a second (like SQL Server's). A few points land on the second of the mark.
+        - each day the replica is synced incrementally (only rows since the mark) and compared with a full copy of the
+          stand-in, and the running lifetime totals with a full recount per created_user
+        - the rows each sync reads are printed next to the rows a full copy reads, the first follow the day's new points
+          and edits, the second the whole history
+    The script exits 1 if the replica or the totals differ from the full copy on any day.
+
+Usage:
+    python checkSync.py [--days 30] [--points 2000] [--users 12] [--edits 0.02] [--seed 0]
+'''
+FIELDS = trackingFields + ['status']
+def stamp(day, rng):
+    return (day + timedelta(seconds=rng.uniform(8 * 3600, 18 * 3600))).strftime('%Y-%m-%d %H:%M:%S.%f')
+def fieldDay(conn, day, points, users, edits, rng):
+    '''
+    One day of collecting into the stand-in: new points, edits to older ones and two points stamped on the same second.
+    '''
+    count = conn.execute('SELECT COUNT(*) FROM AddressVerification').fetchone()[0]
+    rows = []
+    for i in range(points):
+        created = stamp(day, rng)
+        rows.append(('{{{:08d}}}'.format(count + i), 'user{}'.format(rng.randrange(users)), created, created, 'new'))
+    # two points on the last second of the day, the next mark falls between them
+    last = (day + timedelta(hours=23, minutes=59, seconds=59)).strftime('%Y-%m-%d %H:%M:%S')
+    rows.append(('{{{:08d}}}'.format(count + points), 'user0', last + '.250000', last + '.250000', 'new'))
+    rows.append(('{{{:08d}}}'.format(count + points + 1), 'user1', last + '.750000', last + '.750000', 'new'))
+    conn.executemany('INSERT INTO AddressVerification VALUES (?, ?, ?, ?, ?)', rows)
+    for i in rng.sample(range(count), min(count, int(count * edits))):
+        conn.execute('UPDATE AddressVerification SET last_edited_date = ?, status = ? WHERE GlobalID = ?',
+                     (stamp(day, rng), 'edited {}'.format(day.date()), '{{{:08d}}}'.format(i)))
+    conn.commit()
+def main(days, points, users, edits, seed):
+    rng = random.Random(seed)
+    folder = tempfile.mkdtemp(prefix='sync_check_')
+    dbPath = os.path.join(folder, 'RDOFCollector.gpkg')
+    conn = sqlite3.connect(dbPath)
+    conn.execute('CREATE TABLE AddressVerification (GlobalID TEXT, created_user TEXT, created_date TEXT, '
+                 'last_edited_date TEXT, status TEXT)')
+    statePath = os.path.join(folder, 'sync_state.json')
+    replica = {}
+    def upsert(rows):
+        for row in rows:
+            replica[row[0]] = tuple(row)
+    bad = 0
+    start = datetime(2021, 5, 3)
+    print('{:<12}{:>10}{:>10}{:>12}{:>12}{:>10}'.format('day', 'total', 'synced', 'sync s', 'full s', 'check'))
+    for n in range(days):
+        fieldDay(conn, start + timedelta(days=n), points, users, edits, rng)
+        begin = time.time()
+        sync = sdeSync(statePath)
+        synced = sync.sync('AddressVerification', sqliteRows(dbPath, 'AddressVerification', FIELDS,
+                                                                  sync.since('AddressVerification')), upsert)[0]
+        syncTime = time.time() - begin
+        begin = time.time()
+        full = dict((row[0], tuple(row)) for row in sqliteRows(dbPath, 'AddressVerification', FIELDS))
+        fullTime = time.time() - begin
+        counts = {}
+        for row in full.values():
+            counts[row[1]] = counts.get(row[1], 0) + 1
+        ok = replica == full and sync.lifetime('AddressVerification') == counts
+        bad += not ok
+        print('{:<12}{:>10}{:>10}{:>12.3f}{:>12.3f}{:>10}'.format(str((start + timedelta(days=n)).date()), len(full), synced,
+                                                                 syncTime, fullTime, 'ok' if ok else 'FAIL'))
+    conn.close()
+    print('{} days differ from a full copy'.format(bad))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--points', type=int, default=2000, help='new points per day')
+    parser.add_argument('--users', type=int, default=12)
+    parser.add_argument('--edits', type=float, default=0.02, help='share of existing points edited per day')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.days, args.points, args.users, args.edits, args.seed))
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from driveV3_dl import driveUploader, CHUNK_UNIT
+'''
+Script - checkUpload
+
+Description:
+    Runs driveUploader against a local fake of Drive's resumable upload endpoint, no Google account needed.
+        - uploads --files files one at a time (workers=1) and then concurrently (--workers), timing both. The fake server
+          holds every chunk for --latency seconds, like a slow link, so the concurrent run shows what overlapping buys.
+        - uploads them again with every third chunk failing with 503 and only 2 retries allowed, the uploader has to retry
+          from the offset the server reports, and the failures spread over the upload must not add up to give up on it
+        - an upload is interrupted half way and run again, it has to resume its saved session instead of starting over
+    Every uploaded file is compared byte for byte with the local one, the script exits 1 on any mismatch.
+
+Usage:
+    python checkUpload.py [--files 6] [--size-mb 4] [--workers 4] [--latency 0.2]
+'''
+class fakeDrive(BaseHTTPRequestHandler):
+    '''
+    POST opens a session, PUT takes chunks (308 with the Range received) and answers 200 with the file resource at the end.
+    '''
+    def log_message(self, *args):
+        pass
+    def reply(self, status, headers=None, body=b''):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def do_POST(self):
+        meta = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            sid = str(len(server.files))
+            server.files[sid] = {'name': meta['name'], 'size': int(self.headers['X-Upload-Content-Length']), 'data': b''}
+        self.reply(200, {'Location': 'http://127.0.0.1:{}/upload/session/{}'.format(server.server_port, sid)})
+    def do_PUT(self):
+        server = self.server
+        entry = server.files.get(self.path.rsplit('/', 1)[-1])
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if entry is None:
+            return self.reply(404)
+        if body:
+            time.sleep(server.latency)
+            with server.lock:
+                server.chunks += 1
+                fail = server.failEvery and server.chunks % server.failEvery == 0
+            if fail:
+                return self.reply(503)
+            start = int(self.headers['Content-Range'].split(' ')[1].split('-')[0])
+            entry['data'] = entry['data'][:start] + body
+        if len(entry['data']) == entry['size']:
+            return self.reply(200, body=json.dumps({'id': self.path.rsplit('/', 1)[-1], 'name': entry['name']}).encode())
+        self.reply(308, {'Range': 'bytes=0-{}'.format(len(entry['data']) - 1)} if entry['data'] else {})
+def startServer(latency, failEvery):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), fakeDrive)
+    server.files, server.lock, server.chunks = {}, threading.Lock(), 0
+    server.latency, server.failEvery = latency, failEvery
+    worker = threading.Thread(target=server.serve_forever)
+    worker.daemon = True
+    worker.start()
+    return server
+def uploader(server, stateDir, workers, retries=8):
+    return driveUploader(session=requests.Session(), baseUrl='http://127.0.0.1:{}'.format(server.server_port), workers=workers,
+                         chunkSize=CHUNK_UNIT * 4, stateDir=stateDir, retries=retries)
+def mismatches(server, paths, results):
+    bad = 0
+    for path, result in zip(paths, results):
+        with open(path, 'rb') as f:
+            bad += server.files[result['id']]['data'] != f.read()
+    return bad
+def main(files, sizeMb, workers, latency):
+    stateDir = tempfile.mkdtemp(prefix='upload_check_')
+    paths = []
+    for i in range(files):
+        paths.append(os.path.join(stateDir, 'output_{}.xlsx'.format(i)))
+        with open(paths[-1], 'wb') as f:
+            f.write(os.urandom(int(sizeMb * 1024 * 1024) + i * 1000))
+    bad = 0
+    timings = {}
+    for count in [1, workers]:
+        server = startServer(latency, 0)
+        start = time.time()
+        results = uploader(server, stateDir, count).upload_all(paths, 'folder')
+        timings[count] = time.time() - start
+        bad += mismatches(server, paths, results)
+        server.shutdown()
+    print('{} files of {} MB: {:.1f} s with 1 worker, {:.1f} s with {} ({:.1f}x)'.format(
+        files, sizeMb, timings[1], timings[workers], workers, timings[1] / max(timings[workers], 1e-9)))
+
+    # failing chunks, retried with backoff, more failures per file than retries but never more than one in a row
+    server = startServer(0, 3)
+    try:
+        results = uploader(server, stateDir, workers, retries=2).upload_all(paths[:2], 'folder')
+        failed = mismatches(server, paths[:2], results)
+        print('{} chunks sent with every third failing, {} files differ'.format(server.chunks, failed))
+    except requests.HTTPError as e:
+        failed = 1
+        print('{} chunks sent with every third failing, gave up ({})  <- FAIL'.format(server.chunks, e))
+    bad += failed
+    server.shutdown()
+
+    # interrupted upload, then the same upload again
+    server = startServer(0, 0)
+    first = uploader(server, stateDir, 1)
+    put, sent = first.session.put, []
+    def interrupted(*args, **kwargs):
+        if kwargs.get('data'):
+            sent.append(len(kwargs['data']))
+            if len(sent) == 2:
+                raise KeyboardInterrupt
+        return put(*args, **kwargs)
+    first.session.put = interrupted
+    try:
+        first.upload(paths[0], 'folder')
+    except KeyboardInterrupt:
+        pass
+    opened = len(server.files)
+    result = uploader(server, stateDir, 1).upload(paths[0], 'folder')
+    resumed = len(server.files) == opened
+    bad += mismatches(server, paths[:1], [result]) + (not resumed)
+    print('interrupted upload {}'.format('resumed its saved session' if resumed else 'started over  <- FAIL'))
+    server.shutdown()
+    print('{} mismatches'.format(bad))
+    return 1 if bad else 0
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=6)
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds the fake server holds each chunk')
+    args = parser.parse_args()
+    sys.exit(main(args.files, args.size_mb, args.workers, args.latency))
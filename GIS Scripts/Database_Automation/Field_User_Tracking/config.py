@@ -1,6 +1,9 @@
 import arcpy
 import os
-from driveV3_dl import authenticate
+import sys
+from driveV3_dl import driveUploader
+from sdeSync import *
+from polygonIndex import *
 from datetime import datetime
 import pandas as pd
 import shutil
@@ -10,11 +13,14 @@ inputPath = os.path.join(root, 'inputGDB')
 date = datetime.now()
 print(f'Run Date: {date.strftime("%m/%d/%Y")}')
 print('------------------')
-start, end = str(date.strftime('%Y-%m-%d')) + ' 00:00:00', str(date.strftime('%Y-%m-%d')) + ' 23:59:00'
 output = os.path.join(root, 'output')
 genName = 'RDOF_FieldTracker'
 gdb = os.path.join(inputPath, genName + '.gdb')
 sde_con = r'C:\GISMO\AEG\RDOF\Collector\RDOFCollector\RDOFCollector.sde'
+# Keep the local gdb between runs and only pull rows created/edited since the last run (sdeSync.py).
+# Delete the gdb and the sync state file to force a full copy.
+incremental = True
+syncState = os.path.join(inputPath, genName + '_sync.json')
 # fcs to use
 fcsDict = {
 'AddressVerification': ['AddressVerification_Today','AddressVerification_NameDissolve', 'AddressVerification_CBGs', 'AddressVerification_CBGs_Counts', 'AddressVerification_Lifetime'],
@@ -22,9 +28,13 @@ fcsDict = {
 'RoadPoints': ['RoadPoints_Today','RoadPoints_NameDissolve', 'RoadPoints_CBGs', 'RoadPoints_CBGs_Counts', 'RoadPoints_Lifetime'],
 'UtilityPoint': ['UtilityPoint_Today','UtilityPoint_NameDissolve', 'UtilityPoint_CBGs', 'UtilityPoint_CBGs_Counts', 'UtilityPoint_Lifetime']
 }
+syncLayers = list(fcsDict)
+# the sync doesn't see deletes, layers that get edited/deleted from are copied whole every run instead
+refreshLayers = ['HLD_Fiber', 'Won_CBGs']
+# Google Drive folder the output goes to, files upload concurrently over one session (driveV3_dl.py)
+driveFolder = r'1jnEZPl0KJA0siezz-056SwK0Ltx9_Lq3'
+uploadWorkers = 4
 countDict = {}
-userList = []
-userListTot =[]
 # Initialize xl
 writer = pd.ExcelWriter(os.path.join(output, 'Fielders_Point_Counts_{}.xlsx').format(date.strftime('%m%d%Y')))
 
@@ -1,54 +1,196 @@
 import pickle
 import os.path
+import json
+import time
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import Request, AuthorizedSession
 
+'''
+Script - driveV3_dl
 
-def authenticate(_file, drive_path):
+Description:
+    Google Drive uploads for RDOF_FieldTracking. driveUploader authenticates once per run and uploads files concurrently with
+    Drive's resumable upload protocol over one authorized requests session. Chunk size adapts to how fast chunks go through,
+    and each upload's session uri is saved (upload_sessions.json) until the upload completes, so an interrupted upload picks
+    up where it stopped instead of starting over.
+    baseUrl/session can point it at a local fake Drive endpoint.
+'''
+# If modifying these scopes, delete the file token.pickle.
+SCOPES = ['https://www.googleapis.com/auth/drive']
+scriptDir = r'C:\Scripts\RDOF_FieldTracking'
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# chunks have to be multiples of 256 KiB
+CHUNK_UNIT = 256 * 1024
+
+def loadCredentials(tokenPath=os.path.join(scriptDir, 'token.pickle'), credentialsPath=os.path.join(scriptDir, 'credentials.json')):
     '''
-    Uploads files from _files path to drive
-    :param _file: path to file to upload
-    :param drive_path: drive ids
-    :return: None
+    Loads the stored OAuth token, refreshing it (or running the consent flow) when needed.
+    :return: google credentials
     '''
-    print('Uploading output to Google Drive...')
-    # If modifying these scopes, delete the file token.pickle.
-    SCOPES = ['https://www.googleapis.com/auth/drive']
-    """Shows basic usage of the Drive v3 API.
-    Prints the names and ids of the first 10 files the user has access to.
-    """
     creds = None
     # The file token.pickle stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
     # time.
-    if os.path.exists('token.pickle'):
-        with open(r'C:\Scripts\RDOF_FieldTracking\token.pickle', 'rb') as token:
+    if os.path.exists(tokenPath):
+        with open(tokenPath, 'rb') as token:
             creds = pickle.load(token, encoding='latin1')
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(r'C:\Scripts\RDOF_FieldTracking\credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0) 
+            flow = InstalledAppFlow.from_client_secrets_file(credentialsPath, SCOPES)
+            creds = flow.run_local_server(port=0)
         # Save the credentials for the next run
-        with open(r'C:\Scripts\RDOF_FieldTracking\token.pickle', 'wb') as token:
+        with open(tokenPath, 'wb') as token:
             pickle.dump(creds, token)
-    service = build('drive', 'v3', credentials=creds)
-    fname = os.path.basename(_file)
-    file_metadata = {'name': fname, 'parents': [drive_path]}
-    media = MediaFileUpload(_file, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', chunksize=1024*1024, resumable=True)
-    request = service.files().create(body=file_metadata,
-                                     supportsAllDrives=True,
-                                     media_body=media)
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-        if status:
-            print("Uploaded %d%%." % int(status.progress() * 100))
-    print("Upload complete.")
-
-
+    return creds
+class driveUploader():
+    def __init__(self, creds=None, session=None, baseUrl='https://www.googleapis.com', workers=4, chunkSize=8 * 1024 * 1024,
+                 maxChunkSize=64 * 1024 * 1024, stateDir=scriptDir, retries=5):
+        '''
+        :param creds: google credentials, loadCredentials() when neither creds nor session is given
+        :param session: optional requests session to use as is (e.g. against a fake endpoint)
+        :param baseUrl: Drive API root
+        :param workers: concurrent uploads
+        :param chunkSize: first chunk size in bytes, doubled while chunks are quick and halved when they're slow or fail
+        :param maxChunkSize: largest chunk size
+        :param stateDir: folder for upload_sessions.json
+        :param retries: attempts per chunk before an upload is given up (its session uri is kept for the next run)
+        '''
+        self.creds = creds if creds or session else loadCredentials()
+        self.session = session or AuthorizedSession(self.creds)
+        self.baseUrl = baseUrl.rstrip('/')
+        self.workers = workers
+        self.chunkSize = chunkSize
+        self.maxChunkSize = maxChunkSize
+        self.retries = retries
+        self.stateDir = stateDir
+        self.sessionsPath = os.path.join(stateDir, 'upload_sessions.json')
+        self.lock = threading.Lock()
+    def loadSessions(self):
+        try:
+            with open(self.sessionsPath) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+    def saveSession(self, key, entry):
+        '''
+        Records (or with entry None removes) an upload's session uri.
+        '''
+        with self.lock:
+            sessions = self.loadSessions()
+            if entry is None:
+                sessions.pop(key, None)
+            else:
+                sessions[key] = entry
+            with open(self.sessionsPath + '.tmp', 'w') as f:
+                json.dump(sessions, f, indent=2)
+            os.replace(self.sessionsPath + '.tmp', self.sessionsPath)
+    def startSession(self, path, parent, mimetype, size):
+        '''
+        Opens a resumable upload session.
+        :return: session uri
+        '''
+        r = self.session.post(self.baseUrl + '/upload/drive/v3/files', params={'uploadType': 'resumable', 'supportsAllDrives': 'true'},
+                              json={'name': os.path.basename(path), 'parents': [parent]},
+                              headers={'X-Upload-Content-Type': mimetype, 'X-Upload-Content-Length': str(size)})
+        r.raise_for_status()
+        return r.headers['Location']
+    def uploaded(self, uri, size):
+        '''
+        Asks a session how much of the file it already has.
+        :return: bytes received, None if the session is gone (expired or unknown)
+        '''
+        r = self.session.put(uri, headers={'Content-Range': 'bytes */{}'.format(size)})
+        if r.status_code in (200, 201):
+            return size
+        if r.status_code == 308:
+            received = r.headers.get('Range')
+            return int(received.split('-')[-1]) + 1 if received else 0
+        if r.status_code in (404, 410):
+            return None
+        r.raise_for_status()
+    def upload(self, path, parent, mimetype=None):
+        '''
+        Uploads one file, resuming a saved session for it when there is one.
+        :param path: file to upload
+        :param parent: drive folder id
+        :param mimetype: defaults to a guess from the extension, xlsx if there is none
+        :return: Drive file resource (dict)
+        '''
+        mimetype = mimetype or mimetypes.guess_type(path)[0] or XLSX
+        size = os.path.getsize(path)
+        key = '{}|{}'.format(os.path.abspath(path), parent)
+        entry = self.loadSessions().get(key)
+        offset = None
+        if entry and entry['size'] == size and entry['mtime'] == os.path.getmtime(path):
+            offset = self.uploaded(entry['uri'], size)
+            if offset is not None:
+                print('Resuming {} at {}%'.format(os.path.basename(path), int(offset * 100 / max(size, 1))))
+        if offset is None:
+            entry = {'uri': self.startSession(path, parent, mimetype, size), 'size': size, 'mtime': os.path.getmtime(path)}
+            self.saveSession(key, entry)
+            offset = 0
+        chunk, failures, response = self.chunkSize, 0, None
+        with open(path, 'rb') as f:
+            while response is None:
+                f.seek(offset)
+                data = f.read(chunk)
+                end = offset + len(data) - 1
+                started = time.time()
+                try:
+                    r = self.session.put(entry['uri'], data=data, headers={'Content-Range': 'bytes {}-{}/{}'.format(offset, end, size) if data else 'bytes */{}'.format(size)})
+                    if r.status_code >= 500 or r.status_code == 429:
+                        r.raise_for_status()
+                except Exception as e:
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    chunk = max(CHUNK_UNIT, chunk // 2)
+                    print('Retrying {} ({})'.format(os.path.basename(path), e))
+                    time.sleep(2 ** failures)
+                    offset = self.uploaded(entry['uri'], size)
+                    if offset is None:
+                        raise
+                    continue
+                # the chunk went through, only back to back failures count against retries
+                failures = 0
+                if r.status_code == 308:
+                    received = r.headers.get('Range')
+                    offset = int(received.split('-')[-1]) + 1 if received else 0
+                    # aim for chunks that take 2-10 seconds
+                    elapsed = time.time() - started
+                    if elapsed < 2 and chunk < self.maxChunkSize:
+                        chunk = min(self.maxChunkSize, chunk * 2)
+                    elif elapsed > 10 and chunk > CHUNK_UNIT:
+                        chunk = max(CHUNK_UNIT, chunk // 2)
+                    print('Uploaded {} {}%.'.format(os.path.basename(path), int(offset * 100 / max(size, 1))))
+                    continue
+                r.raise_for_status()
+                response = r.json()
+        self.saveSession(key, None)
+        print('Upload complete: {}'.format(os.path.basename(path)))
+        return response
+    def upload_all(self, paths, parent):
+        '''
+        Uploads files concurrently.
+        :param paths: files to upload
+        :param parent: drive folder id
+        :return: list of Drive file resources, in the order of paths
+        '''
+        print('Uploading output to Google Drive...')
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda path: self.upload(path, parent), paths))
+def authenticate(_file, drive_path):
+    '''
+    Uploads files from _files path to drive
+    :param _file: path to file to upload
+    :param drive_path: drive ids
+    :return: None
+    '''
+    driveUploader(workers=1).upload_all([_file], drive_path)
@@ -0,0 +1,110 @@
+import numpy as np
+import shapely
+from shapely import wkb
+from shapely.strtree import STRtree
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+'''
+Script - polygonIndex
+
+Description:
+    Point in polygon counts without SpatialJoin/GetCount. The polygons of a layer go into an STR-tree once, point layers
+    are read as coordinate arrays and classified in vectorized batches (shapely checks candidates against prepared
+    polygons), so a run only pays for the polygons once however many point layers it classifies.
+    Points exactly on a polygon edge count as inside (covered_by), same as SpatialJoin WITHIN, which includes the boundary.
+
+    Needs numpy and shapely 2.x, arcpy only for reading layers (fromLayer, cachedIndex, layerXY).
+    Each script folder that uses it keeps its own copy, the same way logging_decorator.py is shared.
+'''
+
+# indexes built by cachedIndex(), one per (layer, keyField, where) for the whole run
+indexCache = {}
+
+class polygonIndex():
+    def __init__(self, polygons, keys=None, sr=None):
+        '''
+        :param polygons: list of shapely polygons
+        :param keys: optional key per polygon for counts(), defaults to the polygon's position
+        :param sr: spatial reference of the polygons, points are read in it (layerXY)
+        '''
+        self.polygons = polygons
+        self.keys = list(keys) if keys is not None else list(range(len(polygons)))
+        self.sr = sr
+        self.tree = STRtree(polygons)
+    @classmethod
+    def fromLayer(cls, layer, keyField=None, where=None):
+        '''
+        Builds the index from a polygon fc.
+        :param layer: polygon fc/shapefile
+        :param keyField: optional field to key counts() on
+        :param where: optional where clause
+        :return: polygonIndex
+        '''
+        sr = arcpy.Describe(layer).spatialReference
+        polygons, keys = [], []
+        with arcpy.da.SearchCursor(layer, ['SHAPE@WKB'] + ([keyField] if keyField else []), where) as cursor:
+            for row in cursor:
+                if row[0] is None:
+                    continue
+                polygons.append(wkb.loads(bytes(row[0])))
+                keys.append(row[1] if keyField else len(keys))
+        return cls(polygons, keys, sr)
+    def classify(self, xy, batch=100000):
+        '''
+        Polygon each point falls in.
+        :param xy: (n, 2) array of point coordinates, nan for null points
+        :param batch: points per vectorized query
+        :return: (n,) array of polygon positions, -1 for points outside every polygon (first polygon wins on overlaps)
+        '''
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        result = np.full(len(xy), -1, dtype=np.int64)
+        for start in range(0, len(xy), batch):
+            chunk = xy[start:start + batch]
+            valid = np.flatnonzero(~np.isnan(chunk).any(axis=1))
+            points, polys = self.tree.query(shapely.points(chunk[valid]), predicate='covered_by')
+            # first (lowest position) polygon per point
+            order = np.lexsort((polys, points))
+            points, polys = points[order], polys[order]
+            first = np.r_[True, points[1:] != points[:-1]]
+            result[start + valid[points[first]]] = polys[first]
+        return result
+    def contains(self, xy):
+        '''
+        :return: (n,) bool array, True for points inside any polygon
+        '''
+        return self.classify(xy) >= 0
+    def counts(self, xy):
+        '''
+        Points per polygon key.
+        :return: {key: count} for polygons with at least one point
+        '''
+        which = self.classify(xy)
+        positions, counts = np.unique(which[which >= 0], return_counts=True)
+        result = {}
+        for position, count in zip(positions.tolist(), counts.tolist()):
+            key = self.keys[position]
+            result[key] = result.get(key, 0) + count
+        return result
+def cachedIndex(layer, keyField=None, where=None):
+    '''
+    polygonIndex.fromLayer(), built on first use and reused after, e.g. once per run across all LCPs.
+    :param layer: full path to the polygon layer (relative names would be ambiguous across workspaces)
+    :return: polygonIndex
+    '''
+    key = (layer, keyField, where)
+    if key not in indexCache:
+        indexCache[key] = polygonIndex.fromLayer(layer, keyField, where)
+    return indexCache[key]
+def layerXY(layer, sr=None, where=None):
+    '''
+    Point coordinates of a layer.
+    :param layer: point fc/shapefile
+    :param sr: spatial reference to read the points in, e.g. polygonIndex.sr
+    :param where: optional where clause
+    :return: (n, 2) array, one row per feature, nan for null geometry
+    '''
+    with arcpy.da.SearchCursor(layer, ['SHAPE@XY'], where, sr) as cursor:
+        xy = [row[0] if row[0] is not None and row[0][0] is not None else (np.nan, np.nan) for row in cursor]
+    return np.array(xy, dtype=float).reshape(-1, 2)
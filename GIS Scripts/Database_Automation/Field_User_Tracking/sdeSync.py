@@ -0,0 +1,168 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+'''
+Script - sdeSync
+
+Description:
+    Incremental sync of the collector layers into a local replica gdb, instead of copying the whole sde every run.
+    Per layer a high-water mark (latest created_date/last_edited_date seen) is kept in a json state file next to the replica.
+    Each run only pulls rows created or edited since the mark and upserts them into the replica by GlobalID.
+    Lifetime points per created_user are kept as running totals in the same state file, counted as new rows come in, so
+    the daily run doesn't scale with the whole collector history.
+
+    Rows come from a reader, arcpyRows() for the sde/gdb or sqliteRows() for a SQLite/GeoPackage stand-in, and go to an
+    upsert callable, so the sync itself can be run and checked without arcpy.
+
+    Marks are kept to the microsecond, SQL Server editor tracking dates carry fractions of a second and a mark rounded to
+    the second would count the rows at the mark as new again on every run.
+
+    Rows deleted in the sde aren't seen (no archiving on the collector db), so only layers that are only ever added to
+    belong in the sync, layers where deletes matter are copied whole (RDOF_FieldTracking.downloadSDE()). Delete the
+    replica gdb and state file for a full resync.
+'''
+# editor tracking fields every synced layer needs, in this order at the start of the fields given to sync()
+trackingFields = ['GlobalID', 'created_user', 'created_date', 'last_edited_date']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+def toDate(value):
+    '''
+    Dates come back from arcpy as datetimes and from sqlite as text, with or without fractions of a second.
+    '''
+    if value is None or isinstance(value, datetime):
+        return value
+    seconds, fraction = (str(value).replace('T', ' ') + '.').split('.')[:2]
+    fraction = ''.join(c for c in fraction if c.isdigit())[:6]
+    return datetime.strptime(seconds[:19] + '.' + fraction.ljust(6, '0'), DATE_FORMAT)
+class sdeSync():
+    def __init__(self, statePath):
+        '''
+        :param statePath: json file holding the marks and running totals, created on the first save
+        '''
+        self.statePath = statePath
+        try:
+            with open(statePath) as f:
+                self.state = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.state = {}
+    def save(self):
+        with open(self.statePath + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(self.statePath + '.tmp', self.statePath)
+    def since(self, layer, literal="'{}'"):
+        '''
+        Where clause for rows created or edited since the layer's mark. The mark is floored to the second so the literal
+        works for datetime as well as datetime2 columns, rows between that and the mark are matched in sync().
+        :param layer: layer name
+        :param literal: date literal format of the source db, "'{}'" works for SQL Server and SQLite, "timestamp '{}'" for a file gdb
+        :return: where clause, None if the layer was never synced
+        '''
+        mark = self.state.get(layer, {}).get('mark')
+        if mark is None:
+            return None
+        return "created_date >= {0} OR last_edited_date >= {0}".format(literal.format(toDate(mark).strftime('%Y-%m-%d %H:%M:%S')))
+    def lifetime(self, layer):
+        '''
+        :return: {created_user: points created}
+        '''
+        return dict(self.state.get(layer, {}).get('lifetime', {}))
+    def sync(self, layer, rows, upsert=None, chunk=1000):
+        '''
+        Upserts changed rows and adds the new ones to the running totals. Dates are compared to the microsecond and rows
+        at the mark are matched on GlobalID, so querying with >= (since()) doesn't count a row twice.
+        :param layer: layer name
+        :param rows: iterable of rows changed since the mark, starting with trackingFields
+        :param upsert: callable taking a list of rows to write to the replica, None to only count (seeding from a full copy)
+        :param chunk: rows per upsert call
+        :return: (rows synced, new rows)
+        '''
+        entry = self.state.setdefault(layer, {'mark': None, 'atMark': [], 'lifetime': {}})
+        mark = toDate(entry['mark'])
+        atMark = set(entry['atMark'])
+        newMark, newAtMark = mark, set(atMark)
+        lifetime = entry['lifetime']
+        synced, new, batch = 0, 0, []
+        for row in rows:
+            globalId, user, created = row[0], row[1], toDate(row[2])
+            changed = max(d for d in [created, toDate(row[3]), datetime.min] if d is not None)
+            if mark is None or (created is not None and (created > mark or (created == mark and globalId not in atMark))):
+                new += 1
+                if user is not None:
+                    lifetime[user] = lifetime.get(user, 0) + 1
+            if newMark is None or changed > newMark:
+                newMark, newAtMark = changed, set()
+            if changed == newMark:
+                newAtMark.add(globalId)
+            synced += 1
+            if upsert:
+                batch.append(row)
+                if len(batch) >= chunk:
+                    upsert(batch)
+                    batch = []
+        if upsert and batch:
+            upsert(batch)
+        entry['mark'] = newMark.strftime(DATE_FORMAT) if newMark else None
+        entry['atMark'] = sorted(newAtMark)
+        self.save()
+        return synced, new
+def findSources(sde, names):
+    '''
+    Full paths of layers in an sde/gdb by their unqualified name, e.g. 'RDOFCollector.DBO.AddressVerification' for 'AddressVerification'.
+    :param sde: path to .sde connection file or gdb
+    :param names: layer names to find
+    :return: {name: path}
+    '''
+    sources = {}
+    for path, dirs, fcs in arcpy.da.Walk(sde, datatype=['FeatureClass', 'Table']):
+        for fc in fcs:
+            name = fc.split('.')[-1]
+            if name in names:
+                sources[name] = os.path.join(path, fc)
+    return sources
+def syncFieldNames(layer):
+    '''
+    trackingFields followed by the layer's other editable fields and SHAPE@, with the layer's own spelling of the names.
+    '''
+    fields = [f.name for f in arcpy.ListFields(layer) if f.type not in ('OID', 'Geometry') and
+              f.name.lower() not in ('shape_length', 'shape_area', 'shape.stlength()', 'shape.starea()')]
+    lookup = dict((f.lower(), f) for f in fields)
+    tracking = [lookup[f.lower()] for f in trackingFields]
+    return tracking + [f for f in fields if f not in tracking] + ['SHAPE@']
+def arcpyRows(source, fields, where=None):
+    with arcpy.da.SearchCursor(source, fields, where) as cursor:
+        for row in cursor:
+            yield row
+def arcpyUpsert(replica, fields):
+    '''
+    Upsert callable for sdeSync.sync(), replaces replica rows with the same GlobalID then inserts. Editor tracking has to
+    be off on the replica (or the insert would stamp the rows with this run's user/date).
+    :param replica: replica fc
+    :param fields: fields of the rows, GlobalID first
+    :return: callable taking a list of rows
+    '''
+    def upsert(rows):
+        ids = ', '.join("'{}'".format(row[0]) for row in rows)
+        with arcpy.da.UpdateCursor(replica, [fields[0]], '{} IN ({})'.format(fields[0], ids)) as cursor:
+            for row in cursor:
+                cursor.deleteRow()
+        arcpy.env.preserveGlobalIds = True
+        with arcpy.da.InsertCursor(replica, fields) as cursor:
+            for row in rows:
+                cursor.insertRow(row)
+    return upsert
+def sqliteRows(dbPath, table, fields, where=None):
+    '''
+    Reader for a SQLite/GeoPackage stand-in of the sde, same rows as arcpyRows() minus geometry.
+    '''
+    conn = sqlite3.connect(dbPath)
+    try:
+        sql = 'SELECT {} FROM "{}"'.format(', '.join(fields), table) + (' WHERE ' + where if where else '')
+        for row in conn.execute(sql):
+            yield row
+    finally:
+        conn.close()